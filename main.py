@@ -1,12 +1,17 @@
 from PyQt6.QtWidgets import QApplication
 from src.gui import MainWindow
+from src import metrics
+import multiprocessing
 import sys
 
 def main():
+    metrics.start_exporters()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
     sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # Downloads run in worker processes; needed for frozen (e.g. PyInstaller) builds
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
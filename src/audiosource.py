@@ -0,0 +1,87 @@
+from typing import List, Optional, Tuple
+from . import config
+from .estimate import format_bytes
+from .postprocess import COPYABLE_CODECS
+
+# Output-equivalent kbps per source kbps: Opus at 96k holds up about as well as AAC at 128k
+CODEC_EFFICIENCY = {
+    'opus': 1.4,
+    'vorbis': 1.2,
+    'mp4a': 1.0,
+    'aac': 1.0,
+    'mp3': 0.9
+}
+
+def audio_only_formats(info: dict) -> list:
+    return [
+        f for f in info.get('formats') or []
+        if f.get('acodec', 'none') != 'none' and f.get('vcodec', 'none') == 'none' and f.get('format_id')
+    ]
+
+def _efficiency(fmt: dict) -> Optional[float]:
+    codec = (fmt.get('acodec') or '').lower()
+    for prefix, factor in CODEC_EFFICIENCY.items():
+        if codec.startswith(prefix):
+            return factor
+    return None
+
+def _bitrate(fmt: dict) -> float:
+    return fmt.get('abr') or fmt.get('tbr') or 0
+
+def select_audio_source(info: dict, renditions: List[Tuple[str, str]]) -> Tuple[Optional[dict], Optional[dict]]:
+    """(smallest sufficient source, largest audio source) among an info dict's formats.
+
+    A source is sufficient when its bitrate, scaled by how efficient its
+    codec is, still covers the highest requested output bitrate with some
+    headroom for the re-encode. When a single rendition can stream-copy the
+    source codec, the source only needs the plain target bitrate. The first
+    value is None when nothing qualifies (or the output is lossless), and the
+    caller should keep bestaudio.
+    """
+    candidates = audio_only_formats(info)
+    best = max(candidates, key=lambda f: (_bitrate(f), format_bytes(f, info.get('duration'))), default=None)
+    if not candidates or any(audio_format == 'wav' for audio_format, _ in renditions):
+        return None, best
+
+    target = max(int(quality) for _, quality in renditions)
+    copy_prefixes = COPYABLE_CODECS.get(renditions[0][0], ()) if len(renditions) == 1 else ()
+    duration = info.get('duration')
+
+    sufficient = []
+    for fmt in candidates:
+        bitrate = _bitrate(fmt)
+        efficiency = _efficiency(fmt)
+        if not bitrate or efficiency is None:
+            continue
+        codec = (fmt.get('acodec') or '').lower()
+        if copy_prefixes and codec.startswith(copy_prefixes) and bitrate >= target:
+            sufficient.append(fmt)
+        elif bitrate * efficiency >= target * config.AUDIO_SOURCE_HEADROOM:
+            sufficient.append(fmt)
+    if not sufficient:
+        return None, best
+    chosen = min(sufficient, key=lambda f: (format_bytes(f, duration) or _bitrate(f) * 1000, -_bitrate(f)))
+    return chosen, best
+
+class AudioSourceReport:
+    """Bytes saved by bitrate-matched sources compared with always taking bestaudio."""
+
+    def __init__(self):
+        self.items_matched = 0
+        self.items_fallback = 0
+        self.bytes_saved = 0
+
+    def add(self, info: dict, chosen: Optional[dict], best: Optional[dict]):
+        if chosen is None or best is None:
+            self.items_fallback += 1
+            return
+        self.items_matched += 1
+        duration = info.get('duration')
+        self.bytes_saved += max(0, format_bytes(best, duration) - format_bytes(chosen, duration))
+
+    def to_dict(self) -> dict:
+        return {
+            'items_matched': self.items_matched,
+            'items_fallback': self.items_fallback,
+            'bytes_saved': self.bytes_saved
+        }
@@ -26,6 +26,129 @@ SUPPORTED_AUDIO_QUALITIES = {
 DEFAULT_AUDIO_FORMAT = "M4A"
 DEFAULT_AUDIO_QUALITY = "192kbps"
 
+# Reused yt-dlp sessions; tracking counts new HTTP connections in stats()
+SESSION_TRACK_CONNECTIONS = False
+
+# Multi-connection ranged downloads for single-file formats
+SEGMENTED_CONNECTIONS = 4  # 0 or 1 uses yt-dlp's single-connection downloader
+SEGMENTED_SEGMENT_SIZE = 4 * 1024 * 1024
+SEGMENTED_MIN_SIZE = 8 * 1024 * 1024
+SEGMENTED_READ_SIZE = 256 * 1024
+SEGMENTED_RETRIES = 10
+SEGMENTED_TIMEOUT = 30
+SEGMENTED_REPORT_INTERVAL = 0.5
+
+# Streaming merge: ffmpeg merges video+audio into fragmented mp4 while both download,
+# without writing the separate streams to disk
+STREAMING_MERGE = False
+STREAMING_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Metadata prefetch for playlists
+PREFETCH_WINDOW = 3
+PREFETCH_WORKERS = 2
+PREFETCH_EXPIRY_MARGIN = 600  # seconds before a signed URL expires
+
+# Library-wide deduplication of playlist downloads
+LIBRARY_DEDUP = True
+LIBRARY_INDEX_PATH = os.path.join(DEFAULT_DOWNLOAD_PATH, ".library.sqlite")
+LIBRARY_LINK_MODES = ["hardlink", "reflink", "symlink"]
+
+# Tags and cover art, written in the same ffmpeg pass as conversion/remux
+EMBED_METADATA = True
+EMBED_THUMBNAIL = True
+
+# Post-download verification
+VERIFY_OUTPUTS = True
+VERIFY_WORKERS = 2
+VERIFY_MANIFEST_NAME = ".manifest.json"
+VERIFY_DURATION_TOLERANCE = 2.0  # seconds, or 1% of the duration if larger
+VERIFY_PROBE_TIMEOUT = 60
+
+# Sharded playlist jobs
+LEDGER_LEASE_SECONDS = 300
+LEDGER_POLL_INTERVAL = 5
+LEDGER_MAX_ATTEMPTS = 3
+
+# Download daemon
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+DAEMON_MAX_JOBS = 4
+
+# Pre-flight estimation and scheduling
+# Typical video bitrates (kbps) per resolution, used until real format sizes are known
+ESTIMATE_VIDEO_KBPS = {
+    "144p": 100, "240p": 250, "360p": 500, "480p": 1000, "720p": 2500,
+    "1080p": 4500, "1440p": 9000, "2160p": 18000, "4320p": 40000
+}
+ESTIMATE_AUDIO_KBPS = 130
+ESTIMATE_DEFAULT_DURATION = 300  # seconds, for entries without a duration
+SCHEDULE_ORDER = "in_order"  # in_order, shortest_first or largest_first
+
+# Audio-only jobs download the smallest source that still covers the output bitrate
+AUDIO_SOURCE_MATCHING = True
+AUDIO_SOURCE_HEADROOM = 1.25  # source quality needed per kbps of re-encoded output
+
+# Section downloads: re-encode around the cuts so they land exactly on the requested times
+SECTION_EXACT_CUTS = True
+
+# Adaptive concurrency (AIMD) when servers rate limit us
+THROTTLE_MAX_CONNECTIONS = 16  # byte ranges in flight across all downloads
+THROTTLE_DECREASE_FACTOR = 0.5
+THROTTLE_COOLDOWN = 2.0  # seconds; further errors within this window count as the same event
+THROTTLE_DEFAULT_PAUSE = 5.0  # seconds to pause when a 429/403 has no Retry-After
+THROTTLE_MAX_PAUSE = 300.0
+THROTTLE_LATENCY_FACTOR = 3.0  # hold the limit when latency exceeds this multiple of its baseline
+
+# Metrics export (Prometheus text format)
+METRICS_PORT = None  # e.g. 9464 to serve http://127.0.0.1:9464/metrics
+METRICS_FILE = None  # e.g. a .prom file for node_exporter's textfile collector
+METRICS_FILE_INTERVAL = 15  # seconds
+
+# Scratch directory for fragments and merge intermediates (e.g. a local NVMe or tmpfs);
+# None downloads straight into the output folder
+SCRATCH_PATH = None
+SCRATCH_MAX_BYTES = 20 * 1024 ** 3  # videos expected to need more are written to the output folder
+
+# Output storage: "local" keeps files in the download path, "s3" uploads them to a bucket
+STORAGE_BACKEND = "local"
+S3_ENDPOINT = os.environ.get("S3_ENDPOINT")  # e.g. https://s3.eu-west-1.amazonaws.com or http://127.0.0.1:9000
+S3_BUCKET = os.environ.get("S3_BUCKET")
+S3_PREFIX = ""
+S3_REGION = os.environ.get("S3_REGION", "us-east-1")
+S3_ACCESS_KEY = os.environ.get("S3_ACCESS_KEY")
+S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY")
+S3_PART_SIZE = 16 * 1024 * 1024
+S3_PART_WORKERS = 4
+S3_UPLOAD_WORKERS = 2
+S3_MAX_PENDING = 4  # finished files waiting for upload before downloads wait
+S3_DELETE_LOCAL = True
+S3_RETRIES = 3
+S3_TIMEOUT = 60
+
+# GUI playlist table refresh interval (ms); updates are batched between refreshes
+GUI_REFRESH_MS = 16
+# Timer ticks kept by the GUI's frame latency probe
+GUI_FRAME_PROBE_WINDOW = 3600
+
+# GUI downloads run in a worker process: progress is sent to the GUI every WORKER_SEND_INTERVAL
+# seconds, and a worker that does not stop within WORKER_STOP_TIMEOUT seconds is killed
+WORKER_SEND_INTERVAL = 0.05
+WORKER_STOP_TIMEOUT = 3
+
+# GUI warm-up after format detection: playlist videos resolved ahead, and info dicts kept at most
+WARMUP_ITEMS = 3
+WARMUP_MAX_INFOS = 8
+WARMUP_JOIN_TIMEOUT = 5  # seconds a download waits for the warm-up's current step
+
+# Subscriptions: playlists and channels mirrored on a schedule
+SUBSCRIPTION_STATE_PATH = os.path.join(DEFAULT_DOWNLOAD_PATH, ".subscriptions.sqlite")
+SUBSCRIPTION_DEFAULT_INTERVAL = 3600  # seconds between checks
+SUBSCRIPTION_CHECK_WORKERS = 4
+SUBSCRIPTION_DOWNLOAD_WORKERS = 1
+SUBSCRIPTION_PAGE_SIZE = 30  # entries compared with the snapshot
+SUBSCRIPTION_KNOWN_RUN = 5  # known entries in a row that end a check
+SUBSCRIPTION_POLL_INTERVAL = 60
+
 # Console colors
 class Colors:
     GREEN = "\033[92m"
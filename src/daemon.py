@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from . import config
+from . import metrics
+from . import throttle
+from . import urls
+from . import utils
+from .downloader import PlaylistDownloader, VideoDownloader
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+JOB_OPTIONS = ('output_path', 'resolution', 'audio_only', 'audio_quality', 'audio_format')
+# Downloader attributes that can be set per job after construction
+JOB_SETTINGS = ('audio_renditions', 'sections', 'entry_sections')
+
+HTTP_REASONS = {
+    200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+    405: 'Method Not Allowed', 500: 'Internal Server Error'
+}
+
+class Job:
+    def __init__(self, url: str, options: dict, is_playlist: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.url = url
+        self.options = options
+        self.is_playlist = is_playlist
+        self.state = QUEUED
+        self.progress = 0
+        self.status = ''
+        self.speed = 0.0
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.downloader = None
+        self.subscribers = set()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'playlist': self.is_playlist,
+            'options': self.options,
+            'state': self.state,
+            'progress': self.progress,
+            'status': self.status,
+            'speed': self.speed,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished
+        }
+
+class DownloadDaemon:
+    """Long-running download service with a small HTTP/JSON API.
+
+    Routes:
+        GET    /jobs              list jobs
+        POST   /jobs              submit {"url": ..., "audio_only": ..., ...}
+                                  or a batch {"urls": [...], "audio_only": ..., ...}
+        GET    /jobs/<id>         job details
+        DELETE /jobs/<id>         cancel a job
+        GET    /jobs/<id>/events  progress as Server-Sent Events
+        GET    /metrics           counters and histograms in Prometheus text format
+
+    Downloads run in a thread pool so the event loop only handles requests
+    and fans progress out to subscribers.
+    """
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None,
+                 max_jobs: Optional[int] = None):
+        self.host = host or config.DAEMON_HOST
+        self.port = port if port is not None else config.DAEMON_PORT
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs or config.DAEMON_MAX_JOBS)
+        self.jobs = {}
+        self.loop = None
+        self.server = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        print(f"Download daemon listening on http://{self.host}:{self.port}")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        for job in self.jobs.values():
+            if job.state not in FINISHED_STATES:
+                self.cancel(job.id)
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    # Job management
+
+    def submit(self, payload: dict) -> Job:
+        url = (payload.get('url') or '').strip()
+        if not utils.validate_url(url):
+            raise ValueError("Invalid YouTube URL")
+
+        options = {key: payload[key] for key in JOB_OPTIONS if key in payload}
+        options.update({key: payload[key] for key in JOB_SETTINGS if key in payload})
+        is_playlist = payload.get('playlist')
+        if is_playlist is None:
+            is_playlist = utils.get_url_type(url) == "playlist"
+
+        job = Job(url, options, bool(is_playlist))
+        self.jobs[job.id] = job
+        future = self.loop.run_in_executor(self.executor, self._run_job, job)
+        future.add_done_callback(lambda f, job=job: self._job_done(job, f))
+        return job
+
+    def submit_batch(self, payload: dict) -> dict:
+        """Submit one job per distinct URL in payload['urls'], all with the same options.
+
+        Equivalent URLs (see urls.normalize_batch) and URLs of jobs that are
+        still queued or running are skipped before anything is extracted.
+        """
+        batch = payload.get('urls')
+        if not isinstance(batch, list) or not all(isinstance(url, str) for url in batch):
+            raise ValueError("urls must be a list of strings")
+        unique, invalid = urls.normalize_batch(batch)
+        active = {
+            urls.parse(job.url).url for job in self.jobs.values() if job.state not in FINISHED_STATES
+        }
+        options = {key: value for key, value in payload.items() if key not in ('url', 'urls')}
+        jobs = [self.submit({**options, 'url': parsed.url}) for parsed in unique if parsed.url not in active]
+        return {
+            'jobs': [job.to_dict() for job in jobs],
+            'duplicates': sum(1 for url in batch if url.strip()) - len(invalid) - len(jobs),
+            'invalid': invalid
+        }
+
+    def cancel(self, job_id: str) -> Job:
+        job = self.jobs[job_id]
+        if job.state in FINISHED_STATES:
+            return job
+        job.state = CANCELLED
+        # The worker may be past its cancellation check while RUNNING is still queued for
+        # the loop, so stop any downloader that exists, whatever state the job showed
+        if job.downloader:
+            # BaseDownloader.stop() sleeps briefly, keep it off the event loop
+            self.loop.run_in_executor(None, job.downloader.stop)
+        self._publish(job, 'state')
+        return job
+
+    def _run_job(self, job: Job):
+        """Runs in an executor thread."""
+        if job.state == CANCELLED:
+            return
+        downloader_class = PlaylistDownloader if job.is_playlist else VideoDownloader
+        job.downloader = downloader_class(
+            job.url, **{key: value for key, value in job.options.items() if key in JOB_OPTIONS}
+        )
+        for key in JOB_SETTINGS:
+            if key in job.options:
+                setattr(job.downloader, key, job.options[key])
+        job.downloader.progress_callback = (
+            lambda progress, status, thumbnail, speed:
+            self.loop.call_soon_threadsafe(self._on_progress, job, progress, status, speed)
+        )
+        # Jobs wait here while the server is throttling and the videos limit is lowered
+        with throttle.VIDEOS.request(measure_latency=False):
+            if job.state == CANCELLED:
+                return
+            self.loop.call_soon_threadsafe(self._set_state, job, RUNNING)
+            if job.is_playlist:
+                job.downloader.download_playlist()
+            else:
+                job.downloader.download()
+
+    def _job_done(self, job: Job, future):
+        job.finished = time.time()
+        error = future.exception()
+        if job.state != CANCELLED:
+            if error:
+                job.state = FAILED
+                job.error = str(error)
+            else:
+                job.state = COMPLETED
+                job.progress = 100
+        self._publish(job, 'state')
+        for queue in job.subscribers:
+            queue.put_nowait(None)
+
+    def _set_state(self, job: Job, state: str):
+        if job.state == QUEUED:
+            job.state = state
+            self._publish(job, 'state')
+
+    def _on_progress(self, job: Job, progress: int, status: str, speed: float):
+        if progress >= 0:
+            job.progress = progress
+        if status:
+            job.status = status
+        job.speed = round(speed, 2)
+        self._publish(job, 'progress')
+
+    def _publish(self, job: Job, event: str):
+        if not job.subscribers:
+            return
+        message = (event, job.to_dict())
+        for queue in job.subscribers:
+            queue.put_nowait(message)
+
+    # HTTP handling
+
+    async def _handle_client(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = b''
+            length = int(headers.get('content-length', 0) or 0)
+            if length:
+                body = await reader.readexactly(length)
+
+            await self._route(method.upper(), target.split('?', 1)[0], body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            self._send_json(writer, 500, {'error': str(e)})
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, method: str, path: str, body: bytes, writer):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['metrics'] and method == 'GET':
+            return self._send_text(writer, 200, metrics.REGISTRY.render())
+        if not parts or parts[0] != 'jobs' or len(parts) > 3:
+            return self._send_json(writer, 404, {'error': 'Not found'})
+
+        if len(parts) == 1:
+            if method == 'GET':
+                return self._send_json(writer, 200, [job.to_dict() for job in self.jobs.values()])
+            if method == 'POST':
+                try:
+                    payload = json.loads(body or b'{}')
+                    if 'urls' in payload:
+                        return self._send_json(writer, 201, self.submit_batch(payload))
+                    job = self.submit(payload)
+                except (ValueError, TypeError) as e:
+                    return self._send_json(writer, 400, {'error': str(e)})
+                return self._send_json(writer, 201, job.to_dict())
+            return self._send_json(writer, 405, {'error': 'Method not allowed'})
+
+        job = self.jobs.get(parts[1])
+        if job is None:
+            return self._send_json(writer, 404, {'error': 'Unknown job'})
+
+        if len(parts) == 3:
+            if parts[2] != 'events' or method != 'GET':
+                return self._send_json(writer, 404, {'error': 'Not found'})
+            return await self._stream_events(job, writer)
+
+        if method == 'GET':
+            return self._send_json(writer, 200, job.to_dict())
+        if method == 'DELETE':
+            return self._send_json(writer, 200, self.cancel(job.id).to_dict())
+        return self._send_json(writer, 405, {'error': 'Method not allowed'})
+
+    def _send_json(self, writer, status: int, payload):
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+
+    def _send_text(self, writer, status: int, text: str):
+        body = text.encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+
+    async def _stream_events(self, job: Job, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        try:
+            self._write_event(writer, 'state', job.to_dict())
+            await writer.drain()
+            if job.state in FINISHED_STATES:
+                return
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                # Coalesce progress bursts so slow clients don't fall behind
+                while not queue.empty() and message[0] == 'progress':
+                    following = queue.get_nowait()
+                    if following is None:
+                        queue.put_nowait(None)
+                        break
+                    message = following
+                self._write_event(writer, *message)
+                await writer.drain()
+        finally:
+            job.subscribers.discard(queue)
+
+    def _write_event(self, writer, event: str, data: dict):
+        writer.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the YouTube downloader as a local service")
+    parser.add_argument('--host', default=config.DAEMON_HOST)
+    parser.add_argument('--port', type=int, default=config.DAEMON_PORT)
+    parser.add_argument('--max-jobs', type=int, default=config.DAEMON_MAX_JOBS)
+    args = parser.parse_args(argv)
+
+    metrics.start_exporters()
+    daemon = DownloadDaemon(args.host, args.port, args.max_jobs)
+    try:
+        asyncio.run(daemon.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,30 @@
 from tqdm import tqdm
 import os
+import functools
+import math
+import re
+import multiprocessing
 from typing import Optional
 import yt_dlp
 import time
 from . import config
 from . import utils
+from . import ledger
+from . import prefetch
+from . import session
+from . import library
+from . import entries
+from . import verify
+from . import postprocess
+from . import estimate
+from . import metrics
+from . import throttle
+from . import sections
+from . import audiosource
+from . import storage
+from . import staging
+from . import urls
+from .entries import PlaylistEntry
 
 class BaseDownloader:
     SUPPORTED_AUDIO_FORMATS = ['m4a', 'mp3', 'wav', 'aac']
@@ -21,11 +41,52 @@ class BaseDownloader:
         self.is_running = True
         self.is_paused = False
         self.progress_callback = None
+        # Per-video updates for playlist views: entries_callback(entries) once the playlist
+        # is enumerated, then item_callback(index, fields) with state/size/downloaded/speed/error
+        self.entries_callback = None
+        self.item_callback = None
+        self.current_index = None
         self.downloaded_files = set()
         self.current_process = None
         self.download_speed = 0
         self.last_downloaded = 0
         self.speed_update_time = time.time()
+        self.sessions = session.SessionPool(track_connections=config.SESSION_TRACK_CONNECTIONS)
+        self.library_path = config.LIBRARY_INDEX_PATH if config.LIBRARY_DEDUP else None
+        self.library = None
+        self.dedup_report = library.DedupReport()
+        self.verify_outputs = config.VERIFY_OUTPUTS
+        # Extra (format, quality) pairs for audio-only jobs, e.g. [("MP3", "320kbps"), ("M4A", "128kbps")]
+        self.audio_renditions = []
+        self.embed_metadata = config.EMBED_METADATA
+        self.embed_thumbnail = config.EMBED_THUMBNAIL
+        self.playlist_title = None
+        # Entries to download instead of enumerating the playlist, e.g. only the new ones of a subscription
+        self.preset_entries = None
+        # Parts to download, in yt-dlp's --download-sections syntax: "*1:00-2:30" or a chapter regex.
+        # sections applies to every video, entry_sections maps a video id to its own list.
+        self.sections = []
+        self.entry_sections = {}
+        self.exact_cuts = config.SECTION_EXACT_CUTS
+        self.match_audio_source = config.AUDIO_SOURCE_MATCHING
+        self.audio_source_report = audiosource.AudioSourceReport()
+        self.verifier = None
+        self.verification_results = []
+        self.storage = None
+        # Fast local directory (e.g. NVMe or tmpfs) for in-progress files; None writes to output_path
+        self.scratch_root = config.SCRATCH_PATH
+        self.scratch = None
+        self.schedule_order = config.SCHEDULE_ORDER
+        # Full info dicts already resolved elsewhere, by video id; used for size estimates
+        # together with the ones in metadata_cache
+        self.info_cache = {}
+        # warmup.MetadataCache filled before the download started (e.g. by the GUI); entries are used once
+        self.metadata_cache = None
+        self.job_estimate = None
+        self.tracker = None
+        # Bytes already counted per file, so the metrics only see each byte once
+        self._bytes_seen = {}
+        self._postprocess_started = None
 
         # Configure format selection based on FFmpeg availability
         ffmpeg_path = utils.get_ffmpeg_path()
@@ -52,11 +113,27 @@ class BaseDownloader:
             'fragment_retries': 10,
             'skip_unavailable_fragments': True,
             'keep_fragments': False,
-            'overwrites': True
+            'overwrites': True,
+            'segmented_connections': config.SEGMENTED_CONNECTIONS,
+            'segmented_min_size': config.SEGMENTED_MIN_SIZE,
+            'streaming_merge': config.STREAMING_MERGE,
+            # Back off between retries and let them lower the adaptive limits
+            'retry_sleep_functions': {
+                'http': throttle.CONNECTIONS.retry_sleep,
+                'fragment': throttle.CONNECTIONS.retry_sleep,
+                'extractor': throttle.METADATA.retry_sleep
+            }
         }
 
     def _progress_hook(self, d):
+        if not self.is_running:
+            raise yt_dlp.utils.DownloadCancelled()
+
         if d['status'] == 'downloading':
+            filename = d.get('filename', '')
+            downloaded = d.get('downloaded_bytes') or 0
+            metrics.downloaded_bytes.inc(max(0, downloaded - self._bytes_seen.get(filename, 0)))
+            self._bytes_seen[filename] = downloaded
             try:
                 # Calculate progress
                 if 'total_bytes' in d:
@@ -74,21 +151,47 @@ class BaseDownloader:
                 status = d.get('filename', '').split('/')[-1]
                 if self.audio_only:
                     status = f"Downloading audio: {status}"
+
+                # Playlists report byte-weighted progress of the whole job
+                if self.tracker:
+                    self.tracker.update(d.get('filename', ''), d.get('downloaded_bytes', 0))
+                    progress = self.tracker.progress()
+                    eta = self.tracker.eta()
+                    if eta is not None:
+                        status = f"{status} (ETA {utils.format_duration(eta)})"
                 
                 if self.progress_callback:
                     self.progress_callback(int(progress), status, d.get('thumbnail', ''), speed)
+                if self.item_callback and self.current_index is not None:
+                    self.item_callback(self.current_index, {
+                        'size': d.get('total_bytes') or d.get('total_bytes_estimate'),
+                        'downloaded': downloaded,
+                        'speed': d.get('speed')
+                    })
                     
             except Exception:
                 pass
         elif d['status'] == 'finished':
+            total = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+            metrics.downloaded_bytes.inc(max(0, total - self._bytes_seen.pop(d.get('filename', ''), 0)))
+            elapsed = d.get('elapsed')
+            if elapsed:
+                metrics.download_seconds.observe(elapsed)
+                if total:
+                    metrics.throughput.observe(total / elapsed)
             if self.progress_callback:
                 self.progress_callback(-1, "Processing...", '', 0)
 
     def _post_hook(self, d):
-        if d['status'] == 'finished':
+        if d['status'] == 'started':
+            self._postprocess_started = time.time()
+        elif d['status'] == 'finished':
+            if self._postprocess_started is not None:
+                metrics.postprocess_seconds.observe(time.time() - self._postprocess_started)
+                self._postprocess_started = None
             self.downloaded_files.add(d.get('filename', ''))
             if self.progress_callback:
-                self.progress_callback(100, '', '', 0)
+                self.progress_callback(self.tracker.progress() if self.tracker else 100, '', '', 0)
 
     def stop(self):
         self.is_running = False
@@ -117,42 +220,46 @@ class BaseDownloader:
         try:
             if self.is_playlist_url():
                 # For playlists, check first video's formats
-                with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
-                    playlist_info = ydl.extract_info(self.url, download=False)
-                    if playlist_info and 'entries' in playlist_info:
-                        first_video = next((e for e in playlist_info['entries'] if e), None)
-                        if first_video:
-                            video_url = f"https://youtube.com/watch?v={first_video['id']}"
-                            return self._get_formats_for_url(video_url)
+                ydl = self.sessions.get('flat', {'quiet': True, 'extract_flat': True})
+                playlist_info = ydl.extract_info(self._listing_url(), download=False)
+                if playlist_info and 'entries' in playlist_info:
+                    first_video = next((e for e in playlist_info['entries'] if e), None)
+                    if first_video:
+                        video_url = urls.video_url(first_video['id'])
+                        return self._get_formats_for_url(video_url)
             else:
-                return self._get_formats_for_url(self.url)
+                return self._get_formats_for_url(self._single_video_url())
                     
         except Exception as e:
             raise Exception(f"Failed to detect formats: {str(e)}")
+        finally:
+            self.sessions.close()
 
     def _get_formats_for_url(self, url):
-        with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-            info = ydl.extract_info(url, download=False)
-            formats = info.get('formats', [])
-            
-            # Get video formats
-            video_formats = set()
-            for f in formats:
-                if f.get('height'):
-                    video_formats.add(f"{f['height']}p")
-            
-            # Get audio formats
-            audio_formats = []
-            audio_qualities = ['64kbps', '96kbps', '128kbps', '192kbps', '256kbps', '320kbps']
-            
-            for fmt in self.SUPPORTED_AUDIO_FORMATS:
-                for quality in audio_qualities:
-                    audio_formats.append({
-                        'format': fmt,
-                        'quality': quality
-                    })
-            
-            return sorted(video_formats, key=lambda x: int(x[:-1]), reverse=True), audio_formats
+        info = self._extract_video_info(url)
+        if self.metadata_cache is not None:
+            # Keep it for the download that usually follows
+            self.metadata_cache.put_info(url, info)
+        formats = info.get('formats', [])
+        
+        # Get video formats
+        video_formats = set()
+        for f in formats:
+            if f.get('height'):
+                video_formats.add(f"{f['height']}p")
+        
+        # Get audio formats
+        audio_formats = []
+        audio_qualities = ['64kbps', '96kbps', '128kbps', '192kbps', '256kbps', '320kbps']
+        
+        for fmt in self.SUPPORTED_AUDIO_FORMATS:
+            for quality in audio_qualities:
+                audio_formats.append({
+                    'format': fmt,
+                    'quality': quality
+                })
+        
+        return sorted(video_formats, key=lambda x: int(x[:-1]), reverse=True), audio_formats
 
     def _select_format(self, info: dict) -> str:
         formats = info.get('formats', [])
@@ -221,12 +328,17 @@ class BaseDownloader:
         return f"{best_video['format_id']}+{best_audio['format_id']}"
 
     def is_playlist_url(self):
-        try:
-            with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
-                info = ydl.extract_info(self.url, download=False)
-                return bool(info and info.get('_type') == 'playlist')
-        except:
-            return False
+        return utils.get_url_type(self.url) == "playlist"
+
+    def _listing_url(self) -> str:
+        """URL to enumerate: for a channel, the tab urls.parse maps it to, as its root lists tabs instead of videos"""
+        parsed = urls.parse(self.url)
+        return parsed.url if parsed and parsed.kind == urls.CHANNEL else self.url
+
+    def _single_video_url(self) -> str:
+        """Canonical watch URL of the video self.url points at, e.g. without a mix's list= parameter"""
+        parsed = urls.parse(self.url)
+        return urls.video_url(parsed.video_id) if parsed and parsed.video_id else self.url
 
     def _get_best_formats(self, formats, target_height):
         # Get best video format
@@ -270,6 +382,265 @@ class BaseDownloader:
         
         return video_formats[0], audio_formats[0]
 
+    def _video_url(self, entry: PlaylistEntry) -> str:
+        return urls.video_url(entry.id)
+
+    def _extract_video_info(self, url: str) -> dict:
+        """Extract an unprocessed info dict that can be handed to process_ie_result"""
+        if self.metadata_cache is not None:
+            info = self.metadata_cache.take_info(url)
+            if info is not None:
+                return info
+        ydl = self.sessions.get('info', {'quiet': True})
+        with throttle.METADATA.request(on_throttle=self._report_throttle):
+            return ydl.extract_info(url, download=False, process=False)
+
+    def _notify_item(self, index: int, **fields):
+        if self.item_callback:
+            self.item_callback(index, fields)
+
+    def _report_throttle(self, limiter):
+        if self.progress_callback:
+            self.progress_callback(
+                -1, f"Server is throttling requests, {limiter.name} limit lowered to {limiter.limit}", "", 0)
+
+    def _item_sections(self, video_id: str) -> list:
+        return self.entry_sections.get(video_id) or self.sections
+
+    def _apply_sections(self, ydl, specs: list, outtmpl: str):
+        """Restrict the next download to the given sections, or the whole video if there are none"""
+        selector = sections.SectionSelector(specs) if specs else None
+        if selector:
+            ydl.params['download_ranges'] = selector
+        else:
+            # yt-dlp calls the option whenever the key is present, even when it is None
+            ydl.params.pop('download_ranges', None)
+        ydl.params['force_keyframes_at_cuts'] = bool(selector) and self.exact_cuts
+        if selector:
+            # Every section is its own file. yt-dlp leaves section_end unset for
+            # a section that runs to an unknown end, so the end label is optional
+            base, ext = os.path.splitext(outtmpl)
+            outtmpl = f"{base} [%(section_start)d%(section_end&-{{:.0f}}|)s]{ext}"
+        self.sessions.configure(ydl, outtmpl=outtmpl)
+        return selector
+
+    def _process_download(self, ydl, info: dict, **kwargs) -> dict:
+        """process_ie_result with per-file parallelism taken from the adaptive connection limit"""
+        limit = throttle.CONNECTIONS.wait()
+        ydl.params['concurrent_fragment_downloads'] = min(self.ydl_opts['concurrent_fragment_downloads'], limit)
+        ydl.params['segmented_connections'] = min(self.ydl_opts['segmented_connections'], limit)
+        with throttle.CONNECTIONS.request(acquire=False, measure_latency=False,
+                                          on_throttle=self._report_throttle):
+            try:
+                result = ydl.process_ie_result(info, download=True, **kwargs)
+                if self.scratch:
+                    self._publish_result(result)
+            finally:
+                if self.scratch:
+                    # Fragments, .part files and failed outputs don't outlive the video
+                    self.scratch.clear()
+        return result
+
+    def _work_dir(self, info: dict) -> str:
+        """Directory a video is downloaded and post-processed in"""
+        if self.scratch is None:
+            return self.output_path
+        expected = estimate.estimate_info_bytes(info, self.audio_only, int(self.resolution[:-1]))
+        # Merging keeps the downloaded streams and the merged output side by side
+        if self.scratch.fits(expected * 2 if expected else None):
+            return self.scratch.path
+        return self.output_path
+
+    def _publish_result(self, result: dict):
+        """Move finished outputs from scratch into the output folder, atomically"""
+        for download in (result or {}).get('requested_downloads') or []:
+            published = {}
+            for record in download.get('rendition_files') or [download]:
+                path = record.get('filepath')
+                if path and self.scratch.contains(path) and os.path.exists(path):
+                    target = os.path.join(self.output_path, os.path.relpath(path, self.scratch.path))
+                    self.scratch.publish(path, target)
+                    published[path] = record['filepath'] = target
+            if download.get('filepath') in published:
+                download['filepath'] = published[download['filepath']]
+
+    def _start_scratch(self):
+        if self.scratch_root:
+            self.scratch = staging.ScratchArea(self.scratch_root)
+
+    def _close_scratch(self):
+        if self.scratch:
+            scratch, self.scratch = self.scratch, None
+            scratch.close()
+
+    def _thumbnail_url(self, info: dict) -> str:
+        if info.get('thumbnail'):
+            return info['thumbnail']
+        thumbnails = info.get('thumbnails') or []
+        return thumbnails[-1].get('url', '') if thumbnails else ''
+
+    def _output_filepath(self, result: dict) -> Optional[str]:
+        """Final output path from a process_ie_result return value"""
+        downloads = (result or {}).get('requested_downloads') or []
+        return downloads[0].get('filepath') if downloads else None
+
+    def _output_files(self, result: dict) -> list:
+        """Every output path of a process_ie_result return value, one per audio rendition"""
+        downloads = (result or {}).get('requested_downloads') or []
+        if not downloads:
+            return []
+        records = downloads[0].get('rendition_files') or [downloads[0]]
+        return [record['filepath'] for record in records if record.get('filepath')]
+
+    def _library_file_count(self) -> int:
+        return len(self.audio_renditions) if self.audio_only and self.audio_renditions else 1
+
+    def _embeds_tags(self) -> bool:
+        return self.embed_metadata or self.embed_thumbnail
+
+    def _renditions(self) -> list:
+        renditions = self.audio_renditions or [(self.audio_format, self.audio_quality)]
+        return [postprocess.normalize_rendition(*rendition) for rendition in renditions]
+
+    def _apply_audio_source(self, ydl, info: dict):
+        """Pick the smallest audio stream that still meets the target bitrate for this video"""
+        if not self.audio_only:
+            return
+        format_spec = self.ydl_opts['format']
+        if self.match_audio_source:
+            chosen, best = audiosource.select_audio_source(info, self._renditions())
+            self.audio_source_report.add(info, chosen, best)
+            if chosen:
+                format_spec = f"{chosen['format_id']}/{format_spec}"
+        self.sessions.configure(ydl, format_spec=format_spec)
+
+    def _report_audio_sources(self):
+        report = self.audio_source_report
+        if report.items_matched:
+            message = (f"Bitrate-matched audio for {report.items_matched} videos, "
+                       f"saved {utils.format_size(report.bytes_saved)} over bestaudio")
+            print(message)
+            if self.progress_callback:
+                self.progress_callback(-1, message, "", 0)
+
+    def _audio_opts(self) -> dict:
+        """yt-dlp options for audio-only jobs"""
+        if self.audio_renditions or self._embeds_tags():
+            # Decode the source once; every rendition, its tags and cover art
+            # are written by the same ffmpeg run
+            renditions = self._renditions()
+            return {
+                'format': 'bestaudio/best',
+                'postprocessors': [],
+                'postprocessor_args': [],
+                'writethumbnail': self.embed_thumbnail,
+                'custom_postprocessors': [(
+                    functools.partial(
+                        postprocess.AudioRenditionsPP, renditions=renditions,
+                        embed_metadata=self.embed_metadata, embed_thumbnail=self.embed_thumbnail
+                    ),
+                    'post_process'
+                )]
+            }
+        return {
+            'format': 'bestaudio/best',
+            'custom_postprocessors': [],
+            'writethumbnail': False,
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': self.audio_format.lower(),
+                'preferredquality': self.audio_quality.replace('kbps', '')
+            }],
+            'postprocessor_args': [
+                '-ar', '44100',
+                '-ac', '2',
+                '-b:a', f"{self.audio_quality.replace('kbps', '')}k"
+            ]
+        }
+
+    def _video_pp_opts(self) -> dict:
+        """Post-processing options for video jobs"""
+        if self._embeds_tags():
+            # Remux, tags and cover art in one ffmpeg run
+            return {
+                'postprocessors': [],
+                'writethumbnail': self.embed_thumbnail,
+                'custom_postprocessors': [(
+                    functools.partial(
+                        postprocess.VideoRemuxPP, target_format='mp4',
+                        embed_metadata=self.embed_metadata, embed_thumbnail=self.embed_thumbnail
+                    ),
+                    'post_process'
+                )]
+            }
+        return {
+            'postprocessors': [{
+                'key': 'FFmpegVideoRemuxer',
+                'preferedformat': 'mp4',
+            }],
+            'writethumbnail': False,
+            'custom_postprocessors': []
+        }
+
+    def _start_verifier(self):
+        if self.verify_outputs:
+            try:
+                self.verifier = verify.OutputVerifier()
+            except RuntimeError as e:
+                print(f"Skipping output verification: {str(e)}")
+
+    def _finish_output(self, filepath: Optional[str], duration: Optional[float],
+                       audio_format: Optional[str] = None):
+        """Queue a finished output for verification and upload while the next download runs"""
+        if not filepath or not os.path.exists(filepath):
+            return
+        verified = None
+        if self.verifier:
+            verified = self.verifier.submit(filepath, duration, self.audio_only,
+                                            audio_format or self.audio_format.lower())
+        if self.storage:
+            # Uploaded after verification, which needs the local file
+            self.storage.submit(filepath, os.path.relpath(filepath, self.output_path), after=verified)
+
+    def _finish_result(self, result: dict, duration: Optional[float]):
+        for download in (result or {}).get('requested_downloads') or []:
+            expected = duration
+            if download.get('section_start') is not None or download.get('section_end') is not None:
+                # Without exact cuts a section snaps to keyframes, so its length is not checked;
+                # neither is an open-ended section of a video with an unknown duration
+                end = download.get('section_end')
+                expected = (end - (download.get('section_start') or 0)
+                            if self.exact_cuts and end is not None and math.isfinite(end) else None)
+            renditions = download.get('rendition_files')
+            if renditions:
+                for rendition in renditions:
+                    self._finish_output(rendition['filepath'], expected, rendition['audio_format'])
+            else:
+                self._finish_output(download.get('filepath'), expected)
+
+    def _start_storage(self):
+        self.storage = storage.make_backend()
+
+    def _finish_storage(self):
+        if self.storage:
+            backend, self.storage = self.storage, None
+            uploaded = backend.finish()
+            if uploaded and self.progress_callback:
+                self.progress_callback(-1, f"Uploaded {len(uploaded)} files", "", 0)
+
+    def _finish_verifier(self):
+        if not self.verifier:
+            return
+        verifier, self.verifier = self.verifier, None
+        self.verification_results = verifier.finish()
+        failed = [result for result in self.verification_results if not result['ok']]
+        for result in failed:
+            print(f"Verification failed for {result['path']}: {', '.join(result['problems'])}")
+        if self.progress_callback and self.verification_results:
+            self.progress_callback(
+                -1, f"Verified {len(self.verification_results)} files, {len(failed)} with problems", "", 0
+            )
+
     def _get_ydl_opts(self):
         """Get yt-dlp options based on download settings"""
         ydl_opts = {
@@ -311,128 +682,399 @@ class VideoDownloader(BaseDownloader):
         utils.create_download_directory(self.output_path)
         
         try:
+            info = self._extract_video_info(self._single_video_url())
             if self.audio_only:
                 # Audio-only configuration
-                self.ydl_opts.update({
-                    'format': 'bestaudio/best',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': self.audio_format.lower(),
-                        'preferredquality': self.audio_quality.replace('kbps', '')
-                    }],
-                    'postprocessor_args': [
-                        '-ar', '44100',
-                        '-ac', '2',
-                        '-b:a', f"{self.audio_quality.replace('kbps', '')}k"
-                    ]
-                })
+                self.ydl_opts.update(self._audio_opts())
             else:
                 # Video configuration (existing code)
-                with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
-                    info = ydl.extract_info(self.url, download=False)
-                    formats = info.get('formats', [])
-                    target_height = int(self.resolution[:-1])
-                    video_format, audio_format = self._get_best_formats(formats, target_height)
-                    self.ydl_opts.update({
-                        'format': f"{video_format['format_id']}+{audio_format['format_id']}",
-                        'postprocessors': [{
-                            'key': 'FFmpegVideoRemuxer',
-                            'preferedformat': 'mp4',
-                        }]
-                    })
+                formats = info.get('formats', [])
+                target_height = int(self.resolution[:-1])
+                video_format, audio_format = self._get_best_formats(formats, target_height)
+                self.ydl_opts.update({
+                    'format': f"{video_format['format_id']}+{audio_format['format_id']}",
+                    **self._video_pp_opts()
+                })
             
-            # Download with selected format
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                info = ydl.extract_info(self.url, download=False)
-                if self.progress_callback:
-                    self.progress_callback(0, info.get('title', ''), info.get('thumbnail', ''), 0)
-                ydl.download([self.url])
+            # Download with selected format, reusing the extracted info
+            if self.progress_callback:
+                self.progress_callback(0, info.get('title', ''), self._thumbnail_url(info), 0)
+            self._start_verifier()
+            self._start_storage()
+            self._start_scratch()
+            duration = info.get('duration')
+            started = time.time()
+            ydl = self.sessions.get('download', self.ydl_opts)
+            self._apply_audio_source(ydl, info)
+            self._apply_sections(ydl, self._item_sections(info.get('id')),
+                                 os.path.join(self._work_dir(info), '%(title)s.%(ext)s'))
+            result = self._process_download(ydl, info)
+            metrics.items_done.inc()
+            metrics.item_seconds.observe(time.time() - started)
+            self._finish_result(result, duration)
             
         except Exception as e:
+            metrics.items_failed.inc()
             raise Exception(f"Download failed: {str(e)}")
+        finally:
+            self._finish_verifier()
+            self._finish_storage()
+            self._close_scratch()
+            self._report_audio_sources()
+            self.sessions.close()
 
 class PlaylistDownloader(BaseDownloader):
+    def _configure_format_opts(self):
+        """Configure format selection based on audio/video mode"""
+        if self.audio_only:
+            self.ydl_opts.update(self._audio_opts())
+        else:
+            target_height = int(self.resolution[:-1])
+            self.ydl_opts.update({
+                'format': f'bestvideo[height={target_height}]+bestaudio/best[height<={target_height}]',
+                **self._video_pp_opts()
+            })
+
+    def _get_playlist_entries(self):
+        """Enumerate the playlist into compact entries.
+
+        The playlist is extracted unprocessed so its entries can be consumed
+        page by page; each flat entry dict is reduced to a PlaylistEntry and
+        dropped, so only the compact list lives for the rest of the run.
+        """
+        if self.preset_entries is not None:
+            return self.preset_entries
+        if self.metadata_cache is not None:
+            cached = self.metadata_cache.take_playlist(self.url)
+            if cached is not None:
+                self.playlist_title, entries = cached
+                return entries
+
+        ydl = self.sessions.get('flat', {'quiet': True, 'extract_flat': True})
+        playlist_info = ydl.extract_info(self._listing_url(), download=False, process=False)
+        if playlist_info and playlist_info.get('_type') in ('url', 'url_transparent'):
+            # e.g. watch?v=...&list=... redirects to the playlist itself
+            playlist_info = ydl.extract_info(playlist_info['url'], download=False, process=False)
+        if not playlist_info or 'entries' not in playlist_info:
+            raise ValueError("No videos found in playlist")
+
+        raw_entries = playlist_info['entries']
+        self.playlist_title = playlist_info.get('title')
+        del playlist_info
+        entries = []
+        for raw_entry in raw_entries:
+            if raw_entry and raw_entry.get('id'):
+                entries.append(PlaylistEntry.from_info(len(entries) + 1, raw_entry))
+        if not entries:
+            raise ValueError("Playlist is empty")
+        return entries
+
+    def _download_entry(self, entry, total_videos, video_info=None):
+        index = entry.index
+        video_url = self._video_url(entry)
+
+        # Get video info for progress display, reused for the download itself
+        if video_info is None:
+            video_info = self._extract_video_info(video_url)
+        title = video_info.get('title', 'Unknown')
+
+        if self.tracker:
+            self.tracker.start_item(index, video_info)
+            progress = self.tracker.progress()
+        else:
+            progress = ((index-1) * 100) // total_videos
+
+        if self.progress_callback:
+            self.progress_callback(
+                progress,
+                f"[{index}/{total_videos}] {title}",
+                self._thumbnail_url(video_info),
+                0
+            )
+
+        # Update output template on this thread's long-lived download session
+        ydl = self.sessions.get('download', self.ydl_opts)
+        self._apply_audio_source(ydl, video_info)
+        self._apply_sections(ydl, self._item_sections(entry.id), os.path.join(
+            self._work_dir(video_info),
+            f"{index:03d}_%(title)s.%(ext)s"
+        ))
+        # Playlist fields are used for the album and track tags
+        result = self._process_download(ydl, video_info, extra_info={
+            'playlist': self.playlist_title,
+            'playlist_title': self.playlist_title,
+            'playlist_index': index
+        })
+
+        filepath = self._output_filepath(result)
+        duration = video_info.get('duration') or entry.duration
+        self._finish_result(result, duration)
+        if self.library and not self._item_sections(entry.id):
+            # Every rendition, so a later link recreates all of them
+            files = self._output_files(result)
+            if len(files) == self._library_file_count() and all(os.path.exists(path) for path in files):
+                self.library.record_all(self._library_key(entry), entry.id, files)
+                self.dedup_report.items_downloaded += 1
+        del video_info, result
+        return filepath
+
+    def _library_key(self, entry):
+        return library.make_key(entry.id, {
+            'format': self.ydl_opts.get('format'),
+            'postprocessors': self.ydl_opts.get('postprocessors'),
+            'postprocessor_args': self.ydl_opts.get('postprocessor_args'),
+            'merge_output_format': self.ydl_opts.get('merge_output_format'),
+            'audio_renditions': self.audio_renditions if self.audio_only else None,
+            'embed_metadata': self.embed_metadata,
+            'embed_thumbnail': self.embed_thumbnail
+        })
+
+    def _link_from_library(self, entry) -> bool:
+        """Link an already downloaded copy into this playlist's folder, if the library has one"""
+        if self.library is None or self._item_sections(entry.id):
+            return False
+        try:
+            # A missing rendition makes the whole item a miss
+            sources = self.library.lookup_all(self._library_key(entry), self._library_file_count())
+            if not sources:
+                return False
+            size = 0
+            for source in sources:
+                # Same name yt-dlp rendered for the recorded file, under this playlist's index
+                name = re.sub(r'^\d+_', '', os.path.basename(source), count=1)
+                target = os.path.join(self.output_path, f"{entry.index:03d}_{name}")
+                mode = 'existing'
+                if os.path.abspath(source) != os.path.abspath(target):
+                    mode = library.link_file(source, target)
+                size += os.path.getsize(source)
+            self.dedup_report.add_link(size, mode)
+            metrics.items_skipped.inc()
+            entry.status = entries.LINKED
+            return True
+        except OSError as e:
+            print(f"Error linking video {entry.index} from library: {str(e)}")
+            return False
+
+    def _open_library(self):
+        # Outputs uploaded to a storage backend don't stay on disk to be linked
+        if self.library_path and not self.storage:
+            self.library = library.LibraryIndex(self.library_path)
+
+    def _close_library(self):
+        if self.library:
+            self.library.close()
+            self.library = None
+        report = self.dedup_report
+        if report.items_linked:
+            message = (f"Linked {report.items_linked} videos from library, "
+                       f"saved {utils.format_size(report.bytes_saved)}")
+            print(message)
+            if self.progress_callback:
+                self.progress_callback(-1, message, "", 0)
+
+    def _report_estimate(self):
+        job_estimate = self.job_estimate
+        message = (f"Estimated {utils.format_size(job_estimate.total_bytes)} for "
+                   f"{len(job_estimate.sizes)} videos "
+                   f"({utils.format_duration(job_estimate.total_duration)} of media)")
+        print(message)
+        if self.progress_callback:
+            self.progress_callback(-1, message, "", 0)
+
     def download_playlist(self):
         if not utils.validate_url(self.url):
             raise ValueError("Invalid YouTube playlist URL")
         
         utils.create_download_directory(self.output_path)
-        ffmpeg_path = utils.get_ffmpeg_path()
         
         try:
-            # Configure format selection based on audio/video mode
-            if self.audio_only:
-                self.ydl_opts.update({
-                    'format': 'bestaudio/best',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': self.audio_format.lower(),
-                        'preferredquality': self.audio_quality.replace('kbps', '')
-                    }],
-                    'postprocessor_args': [
-                        '-ar', '44100',
-                        '-ac', '2',
-                        '-b:a', f"{self.audio_quality.replace('kbps', '')}k"
-                    ]
-                })
-            else:
-                target_height = int(self.resolution[:-1])
-                self.ydl_opts.update({
-                    'format': f'bestvideo[height={target_height}]+bestaudio/best[height<={target_height}]',
-                    'postprocessors': [{
-                        'key': 'FFmpegVideoRemuxer',
-                        'preferedformat': 'mp4',
-                    }]
-                })
+            self._configure_format_opts()
+            self._start_storage()
+            self._start_scratch()
+            self._open_library()
+            self._start_verifier()
+            playlist_entries = self._get_playlist_entries()
+            total_videos = len(playlist_entries)
 
-            # Rest of the playlist download code remains the same
-            with yt_dlp.YoutubeDL({'quiet': True, 'extract_flat': True}) as ydl:
-                playlist_info = ydl.extract_info(self.url, download=False)
-                if not playlist_info or 'entries' not in playlist_info:
-                    raise ValueError("No videos found in playlist")
-                
-                entries = [entry for entry in playlist_info['entries'] if entry and entry.get('id')]
-                total_videos = len(entries)
-                
-                if total_videos == 0:
-                    raise ValueError("Playlist is empty")
-                
-                # Download videos
-                for index, entry in enumerate(entries, 1):
+            # Videos already in the library are linked instead of downloaded
+            pending = [entry for entry in playlist_entries if not self._link_from_library(entry)]
+
+            if self.entries_callback:
+                self.entries_callback(playlist_entries)
+
+            # Expected bytes per video drive the progress bar, the ETA and the download order
+            infos = dict(self.info_cache)
+            if self.metadata_cache is not None:
+                # Format lists the warm-up already resolved give real sizes instead of bitrate guesses
+                infos.update(self.metadata_cache.infos_by_id())
+            self.job_estimate = estimate.JobEstimate(pending, self.audio_only, self.resolution, infos)
+            del infos
+            pending = estimate.schedule(pending, self.schedule_order, self.job_estimate)
+            self.tracker = estimate.ProgressTracker(self.job_estimate)
+            self._report_estimate()
+
+            # Resolve upcoming videos' metadata while the current one downloads
+            prefetcher = prefetch.MetadataPrefetcher(
+                self._extract_video_info,
+                [self._video_url(entry) for entry in pending]
+            )
+
+            # Download videos
+            try:
+                for position, entry in enumerate(pending):
                     if not self.is_running:
                         break
-                    
+
                     try:
-                        video_url = f"https://youtube.com/watch?v={entry['id']}"
-                        
-                        # Get video info for progress display
-                        with yt_dlp.YoutubeDL({'quiet': True}) as info_ydl:
-                            video_info = info_ydl.extract_info(video_url, download=False)
-                            title = video_info.get('title', 'Unknown')
-                        
-                        if self.progress_callback:
-                            self.progress_callback(
-                                ((index-1) * 100) // total_videos,
-                                f"[{index}/{total_videos}] {title}", 
-                                video_info.get('thumbnail', ''),
-                                0
-                            )
-                        
-                        # Update output template
-                        self.ydl_opts['outtmpl'] = os.path.join(
-                            self.output_path,
-                            f"{index:03d}_%(title)s.%(ext)s"
-                        )
-                        
-                        with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                            ydl.download([video_url])
-                        
+                        entry.status = entries.DOWNLOADING
+                        self._notify_item(entry.index, state=entry.status)
+                        started = time.time()
+                        self.current_index = entry.index
+                        filepath = self._download_entry(entry, total_videos, prefetcher.get(position))
+                        entry.status = entries.DONE
+                        metrics.items_done.inc()
+                        metrics.item_seconds.observe(time.time() - started)
+                        size = os.path.getsize(filepath) if filepath and os.path.exists(filepath) else None
+                        self._notify_item(entry.index, state=entry.status, size=size, downloaded=size, speed=None)
                     except Exception as e:
-                        print(f"Error downloading video {index}: {str(e)}")
+                        entry.status = entries.FAILED
+                        metrics.items_failed.inc()
+                        self._notify_item(entry.index, state=entry.status, speed=None, error=str(e))
+                        print(f"Error downloading video {entry.index}: {str(e)}")
                         continue
-                
-                if self.progress_callback:
-                    self.progress_callback(100, "Playlist download complete", "", 0)
+                    finally:
+                        self.current_index = None
+                        self.tracker.finish_item(entry.index)
+            finally:
+                prefetcher.close()
+
+            if self.progress_callback:
+                self.progress_callback(100, "Playlist download complete", "", 0)
                     
         except Exception as e:
-            raise Exception(f"Playlist download failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Playlist download failed: {str(e)}")
+        finally:
+            self._finish_verifier()
+            self._finish_storage()
+            self._close_scratch()
+            self._report_audio_sources()
+            self._close_library()
+            self.sessions.close()
+
+class ShardedPlaylistDownloader(PlaylistDownloader):
+    """Playlist downloader that claims items from a WorkLedger shared with other workers.
+
+    Workers can run as separate processes on one machine or on several hosts
+    that share the ledger's filesystem. The first worker to start enumerates
+    the playlist; a ledger seeded up front (e.g. with fake entries) is used as is.
+    """
+
+    def __init__(self, url: str, ledger_path: str, *args, worker_id: Optional[str] = None, **kwargs):
+        super().__init__(url, *args, **kwargs)
+        self.ledger_path = ledger_path
+        self.worker_id = worker_id or ledger.make_worker_id()
+
+    def _seed_ledger(self, work_ledger):
+        while not work_ledger.is_seeded():
+            if not self.is_running:
+                return
+            if work_ledger.claim_seed(self.worker_id):
+                work_ledger.seed(self._get_playlist_entries())
+                return
+            time.sleep(config.LEDGER_POLL_INTERVAL)
+
+    def download_shard(self):
+        if not utils.validate_url(self.url):
+            raise ValueError("Invalid YouTube playlist URL")
+
+        utils.create_download_directory(self.output_path)
+        work_ledger = ledger.WorkLedger(self.ledger_path)
+
+        try:
+            self._configure_format_opts()
+            self._start_storage()
+            self._start_scratch()
+            self._open_library()
+            self._start_verifier()
+            self._seed_ledger(work_ledger)
+            total_videos = work_ledger.total()
+
+            while self.is_running:
+                claimed = work_ledger.claim(self.worker_id)
+                if claimed is None:
+                    if work_ledger.remaining() == 0:
+                        break
+                    # Other workers hold the remaining leases; wait in case one expires
+                    time.sleep(config.LEDGER_POLL_INTERVAL)
+                    continue
+
+                entry = claimed
+                if self._link_from_library(entry):
+                    work_ledger.complete(self.worker_id, entry.index)
+                    continue
+
+                heartbeat = ledger.Heartbeat(work_ledger, self.worker_id, entry.index)
+                heartbeat.start()
+                try:
+                    started = time.time()
+                    self._download_entry(entry, total_videos)
+                    work_ledger.complete(self.worker_id, entry.index)
+                    metrics.items_done.inc()
+                    metrics.item_seconds.observe(time.time() - started)
+                except Exception as e:
+                    metrics.items_failed.inc()
+                    print(f"Error downloading video {entry.index}: {str(e)}")
+                    work_ledger.fail(self.worker_id, entry.index, str(e))
+                finally:
+                    heartbeat.stop()
+
+            if self.progress_callback:
+                self.progress_callback(100, f"Shard complete: {work_ledger.counts()}", "", 0)
+
+        except Exception as e:
+            raise Exception(f"Sharded download failed: {str(e)}")
+        finally:
+            work_ledger.close()
+            self._finish_verifier()
+            self._finish_storage()
+            self._close_scratch()
+            self._report_audio_sources()
+            self._close_library()
+            self.sessions.close()
+
+def run_shard_worker(url: str, ledger_path: str, output_path: Optional[str] = None,
+                     resolution: Optional[str] = None, audio_only: bool = False,
+                     audio_quality: Optional[str] = None, audio_format: Optional[str] = None,
+                     worker_id: Optional[str] = None, fixtures_path: Optional[str] = None):
+    """Process entry point for one sharded playlist worker.
+
+    With fixtures_path the worker replays a fixtures.FixtureStore from its own
+    local server instead of using the network (e.g. a synthetic playlist).
+    """
+    downloader = ShardedPlaylistDownloader(
+        url, ledger_path, output_path, resolution, audio_only,
+        audio_quality, audio_format, worker_id=worker_id
+    )
+    server = None
+    if fixtures_path:
+        from . import fixtures
+        store = fixtures.FixtureStore(fixtures_path)
+        server = fixtures.FixtureServer(store).start()
+        fixtures.replay(downloader, store, server)
+    try:
+        downloader.download_shard()
+    finally:
+        if server:
+            server.stop()
+
+def start_shard_workers(url: str, ledger_path: str, count: int, **options):
+    """Start count local worker processes against one ledger and wait for them."""
+    processes = [
+        multiprocessing.Process(target=run_shard_worker, args=(url, ledger_path), kwargs=options)
+        for _ in range(count)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return [process.exitcode for process in processes]
@@ -0,0 +1,129 @@
+import os
+import sys
+import tempfile
+from typing import Iterable, Optional, Tuple
+
+PENDING = 'pending'
+DOWNLOADING = 'downloading'
+DONE = 'done'
+LINKED = 'linked'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+class PlaylistEntry:
+    """Compact per-video record kept for the whole playlist run.
+
+    Only the fields needed to schedule, name and report a video are kept;
+    full info dicts are resolved per video and dropped right after use.
+    """
+    __slots__ = ('index', 'id', 'title', 'duration', 'status')
+
+    def __init__(self, index: int, video_id: str, title: Optional[str] = None,
+                 duration: Optional[float] = None, status: str = PENDING):
+        self.index = index
+        self.id = video_id
+        self.title = title
+        self.duration = duration
+        self.status = status
+
+    @classmethod
+    def from_info(cls, index: int, info: dict) -> 'PlaylistEntry':
+        duration = info.get('duration')
+        return cls(index, info['id'], info.get('title'), float(duration) if duration else None)
+
+    def __repr__(self):
+        return f"PlaylistEntry({self.index}, {self.id!r}, {self.title!r}, {self.status!r})"
+
+def _memory() -> Tuple[Optional[int], Optional[int]]:
+    """(current, peak) resident bytes of this process, where the platform reports them."""
+    current = peak = None
+    try:
+        import resource
+        # KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        try:
+            import psutil
+            info = psutil.Process().memory_info()
+            current, peak = info.rss, peak or getattr(info, 'peak_wset', None)
+        except ImportError:
+            pass
+    return current, peak
+
+def _measure(url: str, fixtures_path: str, output_path: str, resolution: str, items: int, conn):
+    """Benchmark child: download the first items videos of a replayed playlist and report memory."""
+    from .downloader import PlaylistDownloader
+    from . import fixtures
+
+    store = fixtures.FixtureStore(fixtures_path)
+    with fixtures.FixtureServer(store) as server:
+        downloader = fixtures.replay(PlaylistDownloader(url, output_path, resolution), store, server)
+        downloader.verify_outputs = False
+        downloader.library_path = None
+        finished = []
+
+        def item_done(index, fields):
+            if fields.get('state') in (DONE, FAILED):
+                finished.append(index)
+                if len(finished) >= items:
+                    downloader.stop()
+
+        downloader.item_callback = item_done
+        baseline = _memory()[0]
+        downloader.download_playlist()
+    current, peak = _memory()
+    conn.send({'baseline': baseline, 'current': current, 'peak': peak, 'downloaded': len(finished)})
+    conn.close()
+
+def benchmark(sizes: Iterable[int] = (500, 2000, 8000), items: int = 20, resolution: str = '240p',
+              output_root: Optional[str] = None) -> dict:
+    """Resident memory of a playlist run as the playlist grows.
+
+    For each size a synthetic playlist (fixtures.synthetic_playlist) is
+    replayed offline in a fresh process, which enumerates, estimates and
+    schedules every entry and downloads the first items videos. Only the
+    compact entries should grow with the playlist, so resident memory after
+    the run should stay roughly flat across sizes.
+    """
+    import multiprocessing
+    from . import fixtures
+    from . import urls
+    from . import utils
+
+    ffmpeg_path = utils.get_ffmpeg_path()
+    if not ffmpeg_path:
+        raise RuntimeError("FFmpeg not found")
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='entries-benchmark-', dir=output_root) as directory:
+        video_path, audio_path = fixtures.make_media(ffmpeg_path, directory, int(resolution[:-1]))
+        for size in sizes:
+            url = urls.playlist_url(f"PLsynthetic{size}")
+            store = fixtures.FixtureStore(os.path.join(directory, f"fixtures-{size}"))
+            fixtures.synthetic_playlist(store, url, size, video_path, audio_path, int(resolution[:-1]))
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_measure, args=(
+                url, store.path, os.path.join(directory, f"out-{size}"), resolution, items, child_conn
+            ))
+            process.start()
+            child_conn.close()
+            result = parent_conn.recv()
+            process.join()
+            results[size] = {
+                'videos_downloaded': result['downloaded'],
+                'rss_mb': round(result['current'] / 1024 / 1024, 1) if result['current'] else None,
+                'rss_growth_mb': (round((result['current'] - result['baseline']) / 1024 / 1024, 1)
+                                  if result['current'] and result['baseline'] else None),
+                'peak_rss_mb': round(result['peak'] / 1024 / 1024, 1) if result['peak'] else None
+            }
+    return results
+
+if __name__ == "__main__":
+    import json
+    sizes = [int(value) for value in sys.argv[1:]] or [500, 2000, 8000]
+    print(json.dumps(benchmark(sizes), indent=2))
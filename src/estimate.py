@@ -0,0 +1,146 @@
+import time
+from typing import Dict, List, Optional
+from . import config
+from .entries import PlaylistEntry
+
+IN_ORDER = 'in_order'
+SHORTEST_FIRST = 'shortest_first'
+LARGEST_FIRST = 'largest_first'
+SCHEDULE_ORDERS = (IN_ORDER, SHORTEST_FIRST, LARGEST_FIRST)
+
+def format_bytes(fmt: Optional[dict], duration: Optional[float]) -> int:
+    """Size of one format: its (approximate) file size, or bitrate times duration."""
+    if not fmt:
+        return 0
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    bitrate = fmt.get('tbr') or fmt.get('abr') or fmt.get('vbr')
+    return int(bitrate * 125 * duration) if bitrate and duration else 0
+
+def estimate_info_bytes(info: dict, audio_only: bool, target_height: int) -> Optional[int]:
+    """Expected download size from an info dict's format list."""
+    formats = info.get('formats') or []
+    duration = info.get('duration')
+    audio_formats = [
+        f for f in formats
+        if f.get('acodec', 'none') != 'none' and f.get('vcodec', 'none') == 'none'
+    ]
+    best_audio = max(audio_formats, key=lambda f: f.get('abr') or f.get('tbr') or 0, default=None)
+    if audio_only:
+        return format_bytes(best_audio, duration) or None
+
+    video_formats = [
+        f for f in formats
+        if f.get('vcodec', 'none') != 'none' and f.get('acodec', 'none') == 'none'
+        and (f.get('height') or 0) <= target_height
+    ]
+    best_video = max(video_formats, key=lambda f: (f.get('height') or 0, f.get('tbr') or 0), default=None)
+    return (format_bytes(best_video, duration) + format_bytes(best_audio, duration)) or None
+
+def estimate_duration_bytes(duration: Optional[float], audio_only: bool, resolution: str) -> int:
+    """Expected download size from the duration alone, using typical bitrates."""
+    duration = duration or config.ESTIMATE_DEFAULT_DURATION
+    kbps = config.ESTIMATE_AUDIO_KBPS
+    if not audio_only:
+        kbps += config.ESTIMATE_VIDEO_KBPS.get(resolution, config.ESTIMATE_VIDEO_KBPS[config.DEFAULT_RESOLUTION])
+    return int(kbps * 125 * duration)
+
+class JobEstimate:
+    """Pre-flight size and duration estimate for every entry of a job.
+
+    Flat playlist entries only carry durations, so sizes start from typical
+    bitrates and are replaced by format-based sizes whenever a full info dict
+    is available (cached up front or resolved during the run).
+    """
+
+    def __init__(self, entries: List[PlaylistEntry], audio_only: bool, resolution: str,
+                 infos: Optional[Dict[str, dict]] = None):
+        self.audio_only = audio_only
+        self.resolution = resolution
+        self.target_height = int(resolution[:-1])
+        self.sizes = {}
+        self.durations = {}
+        for entry in entries:
+            self.durations[entry.index] = entry.duration or config.ESTIMATE_DEFAULT_DURATION
+            info = (infos or {}).get(entry.id)
+            size = estimate_info_bytes(info, audio_only, self.target_height) if info else None
+            self.sizes[entry.index] = size or estimate_duration_bytes(entry.duration, audio_only, resolution)
+
+    def refine(self, index: int, info: dict) -> int:
+        size = estimate_info_bytes(info, self.audio_only, self.target_height)
+        if size:
+            self.sizes[index] = size
+        if info.get('duration'):
+            self.durations[index] = info['duration']
+        return self.sizes[index]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.sizes.values())
+
+    @property
+    def total_duration(self) -> float:
+        return sum(self.durations.values())
+
+def schedule(entries: List[PlaylistEntry], order: str, job_estimate: JobEstimate) -> List[PlaylistEntry]:
+    """Order entries for download. File names keep their playlist index."""
+    if order == SHORTEST_FIRST:
+        return sorted(entries, key=lambda e: (job_estimate.durations[e.index], job_estimate.sizes[e.index]))
+    if order == LARGEST_FIRST:
+        return sorted(entries, key=lambda e: job_estimate.sizes[e.index], reverse=True)
+    if order != IN_ORDER:
+        raise ValueError(f"Unknown schedule order: {order}")
+    return list(entries)
+
+class ProgressTracker:
+    """Byte-weighted progress and ETA for a whole job.
+
+    Each item counts by its expected size, so a long 8K video moves the bar
+    further than a short clip. Bytes of the item in flight are summed across
+    its files (video and audio streams) and capped at the item's estimate.
+    """
+
+    def __init__(self, job_estimate: JobEstimate):
+        self.estimate = job_estimate
+        self.done_bytes = 0
+        self.current = None
+        self._file_bytes = {}
+        self.started = time.time()
+        self.transferred = 0
+
+    def start_item(self, index: int, info: Optional[dict] = None):
+        if info:
+            self.estimate.refine(index, info)
+        self.current = index
+        self._file_bytes = {}
+
+    def update(self, filename: str, downloaded_bytes: int):
+        previous = self._file_bytes.get(filename, 0)
+        self._file_bytes[filename] = downloaded_bytes
+        self.transferred += max(0, downloaded_bytes - previous)
+
+    def finish_item(self, index: int):
+        self.done_bytes += self.estimate.sizes.get(index, 0)
+        if self.current == index:
+            self.current = None
+            self._file_bytes = {}
+
+    def completed_bytes(self) -> int:
+        current = 0
+        if self.current is not None:
+            expected = self.estimate.sizes.get(self.current, 0)
+            current = min(sum(self._file_bytes.values()), int(expected * 0.99))
+        return self.done_bytes + current
+
+    def progress(self) -> int:
+        total = self.estimate.total_bytes
+        return min(100, self.completed_bytes() * 100 // total) if total else 0
+
+    def eta(self) -> Optional[float]:
+        """Seconds left at the average transfer rate so far."""
+        elapsed = time.time() - self.started
+        if elapsed <= 0 or not self.transferred:
+            return None
+        rate = self.transferred / elapsed
+        return max(0, self.estimate.total_bytes - self.completed_bytes()) / rate
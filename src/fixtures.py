@@ -0,0 +1,335 @@
+import functools
+import gzip
+import hashlib
+import http.server
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import List, Optional, Tuple
+import yt_dlp
+from . import config
+from . import metrics
+from . import session
+from . import urls
+
+class FixtureMissing(Exception):
+    pass
+
+def media_key(video_id: Optional[str], format_id: Optional[str]) -> str:
+    return re.sub(r'[^\w.-]', '_', f"{video_id}-{format_id}")
+
+def thumbnail_key(video_id: Optional[str], url: str) -> str:
+    """Thumbnail URLs are not signed, so they identify the image; the extension is kept for yt-dlp"""
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+    return media_key(video_id, f"thumbnail-{digest}.{yt_dlp.utils.determine_ext(url, 'jpg')}")
+
+class FixtureStore:
+    """Recorded extractor results and media files under one directory.
+
+    info/<hash>.json.gz holds the unprocessed info dict of one URL,
+    media/<video id>-<format id> the bytes of one downloaded format and
+    media/<video id>-thumbnail-<hash> one downloaded thumbnail. Signed
+    media URLs change on every extraction, so media is keyed by video and
+    format instead of by URL.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.join(path, 'info'), exist_ok=True)
+        os.makedirs(os.path.join(path, 'media'), exist_ok=True)
+
+    def _info_path(self, url: str) -> str:
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.path, 'info', f"{digest}.json.gz")
+
+    def save_info(self, url: str, info: dict):
+        path = self._info_path(url)
+        with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump({'url': url, 'info': info}, f)
+        os.replace(path + '.tmp', path)
+
+    def load_info(self, url: str) -> dict:
+        try:
+            with gzip.open(self._info_path(url), 'rt', encoding='utf-8') as f:
+                return json.load(f)['info']
+        except FileNotFoundError:
+            raise FixtureMissing(f"No recorded info for {url}")
+
+    def media_path(self, key: str) -> str:
+        return os.path.join(self.path, 'media', key)
+
+    def has_media(self, key: str) -> bool:
+        return os.path.exists(self.media_path(key))
+
+    def save_media(self, key: str, source: str, link: bool = False):
+        """Copy source into the store; with link, hard-link it instead where the filesystem allows."""
+        target = self.media_path(key)
+        if link:
+            try:
+                if os.path.lexists(target):
+                    os.remove(target)
+                os.link(source, target)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(source, target + '.tmp')
+        os.replace(target + '.tmp', target)
+
+def _materialize_entries(info: dict):
+    """Replace a lazily paged entries iterator with a list so it can be saved and still be used"""
+    entries = info.get('entries')
+    if entries is None or isinstance(entries, list):
+        return
+    if isinstance(entries, yt_dlp.utils.PagedList):
+        info['entries'] = entries.getslice()
+    else:
+        info['entries'] = list(entries)
+
+class RecordingYoutubeDL(session.SessionYoutubeDL):
+    """SessionYoutubeDL that saves every extraction and downloaded format to a FixtureStore.
+
+    URLs are always extracted unprocessed and then processed as the caller
+    asked, so one fixture per URL serves both process=True and process=False
+    callers on replay.
+    """
+
+    def __init__(self, params=None, auto_init=True, store: Optional[FixtureStore] = None):
+        super().__init__(params, auto_init)
+        self.store = store
+
+    def extract_info(self, url, download=True, ie_key=None, extra_info=None,
+                     process=True, force_generic_extractor=False):
+        info = super().extract_info(url, download=False, ie_key=ie_key, extra_info=extra_info,
+                                    process=False, force_generic_extractor=force_generic_extractor)
+        if info is not None:
+            _materialize_entries(info)
+            self.store.save_info(url, self.sanitize_info(info))
+        if not process:
+            return info
+        return self.process_ie_result(info, download, extra_info)
+
+    def dl(self, name, info, subtitle=False, test=False):
+        result = super().dl(name, info, subtitle, test)
+        success = result[0] if isinstance(result, tuple) else result
+        # Section downloads hold only part of the format
+        if (success and not subtitle and not test and os.path.exists(name)
+                and info.get('section_start') is None and info.get('section_end') is None):
+            self.store.save_media(media_key(info.get('id'), info.get('format_id')), name)
+        return result
+
+    def _write_thumbnails(self, label, info_dict, filename, thumb_filename_base=None):
+        written = super()._write_thumbnails(label, info_dict, filename, thumb_filename_base)
+        for thumbnail in info_dict.get('thumbnails') or []:
+            path = thumbnail.get('filepath')
+            if path and os.path.exists(path):
+                self.store.save_media(thumbnail_key(info_dict.get('id'), thumbnail['url']), path)
+        return written
+
+class ReplayYoutubeDL(session.SessionYoutubeDL):
+    """SessionYoutubeDL that answers extract_info from a FixtureStore without network access.
+
+    Every format and thumbnail URL is pointed at a FixtureServer, which
+    serves the recorded bytes with range support; fragmented (DASH/HLS)
+    formats are served as the single file they were merged into when
+    recorded. Formats and thumbnails that were not downloaded while
+    recording answer 404, so replay the same format choices.
+    """
+
+    def __init__(self, params=None, auto_init=True, store: Optional[FixtureStore] = None,
+                 media_url: Optional[str] = None):
+        super().__init__(params, auto_init)
+        self.store = store
+        self.media_url = media_url
+
+    def extract_info(self, url, download=True, ie_key=None, extra_info=None,
+                     process=True, force_generic_extractor=False):
+        metrics.extractor_calls.inc()
+        info = self._localize(self.store.load_info(url))
+        if not process:
+            return info
+        return self.process_ie_result(info, download, extra_info)
+
+    def _localize(self, info: dict) -> dict:
+        formats = info.get('formats') or ([info] if info.get('url') and info.get('_type', 'video') == 'video' else [])
+        for fmt in formats:
+            fmt['url'] = f"{self.media_url}/media/{media_key(info.get('id'), fmt.get('format_id'))}"
+            fmt['protocol'] = 'http'
+            for key in ('fragments', 'fragment_base_url', 'manifest_url', 'is_dash_periods'):
+                fmt.pop(key, None)
+        for thumbnail in info.get('thumbnails') or []:
+            if thumbnail.get('url'):
+                thumbnail['url'] = f"{self.media_url}/media/{thumbnail_key(info.get('id'), thumbnail['url'])}"
+        if info.get('thumbnail'):
+            info['thumbnail'] = f"{self.media_url}/media/{thumbnail_key(info.get('id'), info['thumbnail'])}"
+        return info
+
+class _MediaHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body: bool):
+        key = self.path.rpartition('/')[2]
+        store = self.server.store
+        if not self.path.startswith('/media/') or not store.has_media(key):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        path = store.media_path(key)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range') or '')
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if not body:
+            return
+
+        remaining = end - start + 1
+        with open(path, 'rb') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(remaining, 256 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def log_message(self, format, *args):
+        pass
+
+class FixtureServer:
+    """Local HTTP server for recorded media, with byte-range and keep-alive support"""
+
+    def __init__(self, store: FixtureStore, host: str = '127.0.0.1', port: int = 0):
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _MediaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.store = store
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self) -> 'FixtureServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fixture-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def make_media(ffmpeg_path: str, directory: str, height: int = 240, duration: float = 2.0) -> Tuple[str, str]:
+    """Generate a video-only mp4 (test pattern) and an audio-only m4a (tone) for synthetic fixtures."""
+    video_path = os.path.join(directory, f"synthetic-{height}p.mp4")
+    audio_path = os.path.join(directory, "synthetic.m4a")
+    width = height * 16 // 9 // 2 * 2
+    subprocess.run([
+        ffmpeg_path, '-v', 'error', '-y', '-f', 'lavfi',
+        '-i', f"testsrc=duration={duration}:size={width}x{height}:rate=10", '-c:v', 'mpeg4', '-an', video_path
+    ], check=True)
+    subprocess.run([
+        ffmpeg_path, '-v', 'error', '-y', '-f', 'lavfi',
+        '-i', f"sine=duration={duration}", '-c:a', 'aac', '-vn', audio_path
+    ], check=True)
+    return video_path, audio_path
+
+def synthetic_playlist(store: FixtureStore, playlist_url: str, count: int, video_path: str,
+                       audio_path: str, height: int = 240, duration: float = 2.0) -> List[str]:
+    """Record a fake playlist of count videos into store; returns their IDs.
+
+    Every video has one video-only (137) and one audio-only (140) format,
+    all backed by the same two files, which are hard-linked into the store
+    where possible so large playlists cost little disk. Replay it like a
+    recorded one, e.g. for tests or benchmarks that need many entries.
+    """
+    video_ids = [f"synth{number:06d}" for number in range(1, count + 1)]
+    formats = [
+        {'format_id': '137', 'ext': 'mp4', 'vcodec': 'mp4v.20.9', 'acodec': 'none', 'height': height,
+         'width': height * 16 // 9, 'filesize': os.path.getsize(video_path), 'source': video_path},
+        {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 128,
+         'filesize': os.path.getsize(audio_path), 'source': audio_path}
+    ]
+    for number, video_id in enumerate(video_ids, start=1):
+        info = {
+            'id': video_id,
+            'title': f"Synthetic video {number}",
+            'duration': duration,
+            'uploader': 'Synthetic',
+            'extractor': 'youtube',
+            'extractor_key': 'Youtube',
+            'webpage_url': urls.video_url(video_id),
+            'thumbnails': [],
+            'formats': []
+        }
+        for fmt in formats:
+            source = fmt['source']
+            info['formats'].append(dict(
+                {key: value for key, value in fmt.items() if key != 'source'},
+                url=f"https://media.invalid/{video_id}/{fmt['format_id']}", protocol='https'
+            ))
+            store.save_media(media_key(video_id, fmt['format_id']), source, link=True)
+        store.save_info(urls.video_url(video_id), info)
+
+    store.save_info(playlist_url, {
+        '_type': 'playlist',
+        'id': 'PLsynthetic',
+        'title': f"Synthetic playlist of {count}",
+        'extractor': 'youtube:tab',
+        'extractor_key': 'YoutubeTab',
+        'webpage_url': playlist_url,
+        'entries': [
+            {'_type': 'url', 'ie_key': 'Youtube', 'id': video_id, 'url': urls.video_url(video_id),
+             'title': f"Synthetic video {number}", 'duration': duration}
+            for number, video_id in enumerate(video_ids, start=1)
+        ]
+    })
+    return video_ids
+
+def record(downloader, store: FixtureStore):
+    """Make downloader record its extractions and downloads into store (needs network)."""
+    downloader.sessions.close()
+    downloader.sessions = session.SessionPool(
+        functools.partial(RecordingYoutubeDL, store=store),
+        track_connections=config.SESSION_TRACK_CONNECTIONS
+    )
+    return downloader
+
+def replay(downloader, store: FixtureStore, server: FixtureServer):
+    """Make downloader run entirely from store and server."""
+    downloader.sessions.close()
+    downloader.sessions = session.SessionPool(
+        functools.partial(ReplayYoutubeDL, store=store, media_url=server.url),
+        track_connections=config.SESSION_TRACK_CONNECTIONS
+    )
+    return downloader
@@ -1,24 +1,85 @@
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                            QHBoxLayout, QLineEdit, QPushButton, QComboBox, 
-                           QProgressBar, QLabel, QFileDialog, QTextEdit, QCheckBox, QMessageBox, QGroupBox)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                           QProgressBar, QLabel, QFileDialog, QTextEdit, QCheckBox, QMessageBox, QGroupBox,
+                           QTableView, QHeaderView, QAbstractItemView)
+from PyQt6.QtCore import Qt, QThread, QObject, QTimer, pyqtSignal
 from PyQt6.QtGui import QIcon, QPalette, QColor, QPixmap
 import sys
 import os
+import threading
 import urllib.request
 import time
+from collections import deque
 from . import config
 from .downloader import PlaylistDownloader, VideoDownloader
 from . import utils
+from .playlist_model import PlaylistTableModel
+from . import metrics
+from . import worker
+from .warmup import MetadataCache, WarmUp
+
+class FrameLatencyProbe(QObject):
+    """Measures how late the event loop runs a timer due every GUI_REFRESH_MS.
+
+    Whatever keeps the GUI thread from running (long handlers, another
+    thread holding the GIL) delays the ticks; each delay is recorded in the
+    ytdl_gui_frame_delay_seconds histogram and summarised by summary().
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.interval = config.GUI_REFRESH_MS / 1000
+        self.delays = deque(maxlen=config.GUI_FRAME_PROBE_WINDOW)
+        self._last = None
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.setInterval(config.GUI_REFRESH_MS)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        # Only measured while a download runs; an idle window needs no 16 ms wake-ups
+        self._timer.stop()
+
+    def reset(self):
+        self.delays.clear()
+
+    def _tick(self):
+        now = time.perf_counter()
+        delay = max(0.0, now - self._last - self.interval)
+        self._last = now
+        self.delays.append(delay)
+        metrics.gui_frame_delay.observe(delay)
+
+    def summary(self) -> str:
+        if not self.delays:
+            return "no samples"
+        delays = sorted(self.delays)
+        p95 = delays[min(len(delays) - 1, int(len(delays) * 0.95))]
+        return f"p95 {p95 * 1000:.1f} ms, max {delays[-1] * 1000:.1f} ms over {len(delays)} frames"
 
 class DownloaderThread(QThread):
+    """Relays a download running in a worker process (worker.DownloadProcess) to the GUI.
+
+    This thread only waits on the worker's pipe and turns its messages into
+    signals, so the download itself never competes with the event loop for
+    the GIL. stop() returns at once; stopped is emitted when the worker is gone.
+    """
     progress_updated = pyqtSignal(int, str, str, float)
     download_complete = pyqtSignal()
+    stopped = pyqtSignal()
     status_updated = pyqtSignal(str)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, url, output_path, resolution, audio_only, audio_quality, audio_format, is_playlist=False):
+    def __init__(self, url, output_path, resolution, audio_only, audio_quality, audio_format, is_playlist=False,
+                 playlist_model=None, metadata_cache=None, warmup=None):
         super().__init__()
+        self.playlist_model = playlist_model
+        self.metadata_cache = metadata_cache
+        self.warmup = warmup
         self.url = url
         self.output_path = output_path
         self.resolution = resolution
@@ -26,51 +87,71 @@ class DownloaderThread(QThread):
         self.audio_quality = audio_quality
         self.audio_format = audio_format
         self.is_playlist = is_playlist
-        self.downloader = None
+        self.process = None
         self.is_running = True
         
     def run(self):
+        if self.warmup is not None and self.warmup.is_alive():
+            # Let a stopped warm-up finish its current step so the worker gets its result
+            self.warmup.join(config.WARMUP_JOIN_TIMEOUT)
+        if not self.is_running:
+            return
         try:
-            # Create appropriate downloader
-            downloader_class = PlaylistDownloader if self.is_playlist else VideoDownloader
-            self.downloader = downloader_class(
+            self.process = worker.DownloadProcess(
                 self.url,
-                self.output_path,
-                self.resolution,
-                self.audio_only,
-                self.audio_quality,
-                self.audio_format
+                {
+                    'output_path': self.output_path,
+                    'resolution': self.resolution,
+                    'audio_only': self.audio_only,
+                    'audio_quality': self.audio_quality,
+                    'audio_format': self.audio_format
+                },
+                self.is_playlist,
+                self.metadata_cache.export() if self.metadata_cache is not None else None
             )
-            
-            # Set progress callback
-            self.downloader.progress_callback = self._on_progress
-            
-            try:
-                # Start download
-                if self.is_playlist:
-                    self.downloader.download_playlist()
-                else:
-                    self.downloader.download()
-                    
-                if self.is_running:
-                    self.download_complete.emit()
-                    
-            except Exception as e:
-                self.error_occurred.emit(str(e))
-                
+            self.process.start()
         except Exception as e:
             self.error_occurred.emit(f"Failed to initialize downloader: {str(e)}")
+            return
+        if not self.is_running:
+            # Stopped while the worker was starting
+            self.process.stop()
+            return
 
-    def stop(self):
+        for message in self.process.messages():
+            if not self.is_running:
+                return
+            kind = message[0]
+            if kind == worker.PROGRESS:
+                self._on_progress(*message[1:])
+            elif kind == worker.ENTRIES and self.playlist_model is not None:
+                # The model batches these itself; no signal per update
+                self.playlist_model.set_entries(message[1])
+            elif kind == worker.ITEMS and self.playlist_model is not None:
+                for index, fields in message[1].items():
+                    self.playlist_model.update_item(index, fields)
+            elif kind == worker.DONE:
+                self.download_complete.emit()
+            elif kind == worker.ERROR:
+                self.error_occurred.emit(message[1])
+
+    def stop(self, block: bool = False):
+        """Cancel the download; the waiting happens on a helper thread unless block is set."""
+        self.is_running = False
+        if block:
+            self._stop_process()
+        else:
+            threading.Thread(target=self._stop_process, name='download-stop', daemon=True).start()
+
+    def _stop_process(self):
         try:
-            self.is_running = False
-            if self.downloader:
-                self.downloader.stop()
-            self.wait(2000)  # Wait up to 2 seconds
-            if self.isRunning():
-                self.terminate()
+            if self.process:
+                # Cancels the download, or kills the worker if it does not respond
+                self.process.stop()
+            self.wait(2000)
         except Exception as e:
-            print(f"Error stopping thread: {str(e)}")
+            print(f"Error stopping download: {str(e)}")
+        self.stopped.emit()
 
     def _on_progress(self, progress: int, status: str, thumbnail: str, speed: float):
         if not self.is_running:
@@ -81,9 +162,8 @@ class DownloaderThread(QThread):
         self.progress_updated.emit(progress, status, thumbnail, float(formatted_speed))
 
     def toggle_pause(self):
-        if self.downloader:
-            self.downloader.toggle_pause()
-            return self.downloader.is_paused
+        if self.process:
+            return self.process.toggle_pause()
         return False
 
 class MainWindow(QMainWindow):
@@ -92,9 +172,13 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("YouTube Playlist Downloader")
         self.setMinimumSize(900, 700)
         self.downloader_thread = None
+        # Metadata resolved after format detection, picked up by the next download
+        self.metadata_cache = MetadataCache()
+        self.warmup = None
         
         # Setup UI without FFmpeg checks
         self.setup_ui()
+        self.frame_probe = FrameLatencyProbe(self)
         self.apply_styles()
 
     def apply_styles(self):
@@ -196,6 +280,20 @@ class MainWindow(QMainWindow):
         self.thumbnail_label.setFixedSize(320, 180)
         self.thumbnail_label.setScaledContents(True)
         progress_layout.addWidget(self.thumbnail_label)
+
+        # Per-video table for playlists; only visible rows are painted
+        self.playlist_model = PlaylistTableModel(self)
+        self.playlist_view = QTableView()
+        self.playlist_view.setModel(self.playlist_model)
+        self.playlist_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.playlist_view.setWordWrap(False)
+        self.playlist_view.verticalHeader().setVisible(False)
+        self.playlist_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.playlist_view.verticalHeader().setDefaultSectionSize(22)
+        self.playlist_view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+        self.playlist_view.horizontalHeader().setStretchLastSection(True)
+        self.playlist_view.setColumnWidth(2, 280)
+        progress_layout.addWidget(self.playlist_view)
         
         progress_group.setLayout(progress_layout)
         layout.addWidget(progress_group)
@@ -297,6 +395,9 @@ class MainWindow(QMainWindow):
                 return
             
             utils.create_download_directory(output_path)
+            # The download's own prefetcher takes over; keep what the warm-up has so far
+            if self.warmup is not None:
+                self.warmup.stop()
             
             self.downloader_thread = DownloaderThread(
                 url=url,
@@ -305,11 +406,19 @@ class MainWindow(QMainWindow):
                 audio_only=self.audio_only_check.isChecked(),
                 audio_quality=self.audio_quality_combo.currentText(),
                 audio_format=self.audio_format_combo.currentText(),
-                is_playlist=utils.get_url_type(url) == "playlist"
+                is_playlist=utils.get_url_type(url) == "playlist",
+                playlist_model=self.playlist_model,
+                metadata_cache=self.metadata_cache,
+                warmup=self.warmup
             )
+            self.playlist_model.clear()
+            self.playlist_model.start()
+            self.frame_probe.reset()
+            self.frame_probe.start()
             
             self.downloader_thread.progress_updated.connect(self.update_progress)
             self.downloader_thread.download_complete.connect(self.download_finished)
+            self.downloader_thread.stopped.connect(self.download_stopped)
             self.downloader_thread.error_occurred.connect(self.handle_error)
             self.downloader_thread.status_updated.connect(self.log_status)
             
@@ -363,16 +472,24 @@ class MainWindow(QMainWindow):
         self.progress_bar.setValue(100)
         self.current_video_label.setText("Current video: None")
         self.log_status("Download completed!")
+        self.frame_probe.stop()
+        self.playlist_model.stop()
+        self.log_status(f"UI frame delay during download: {self.frame_probe.summary()}")
         self.thumbnail_label.clear()
 
+    def download_stopped(self):
+        self.stop_btn.setText("Stop")
+        self.log_status("Download stopped")
+        self.download_finished()
+
     def stop_download(self):
         if self.downloader_thread and self.downloader_thread.isRunning():
             try:
                 self.stop_btn.setEnabled(False)  # Prevent multiple clicks
                 self.stop_btn.setText("Stopping...")
+                self.pause_btn.setEnabled(False)
+                # Returns at once; download_stopped runs when the worker is gone
                 self.downloader_thread.stop()
-                self.log_status("Download stopped")
-                self.download_finished()
             except Exception as e:
                 self.log_status(f"Error stopping download: {str(e)}")
 
@@ -386,7 +503,8 @@ class MainWindow(QMainWindow):
         try:
             if hasattr(self, 'downloader_thread'):
                 if self.downloader_thread.isRunning():
-                    self.stop_download()
+                    # The window is going away; make sure the worker is gone first
+                    self.downloader_thread.stop(block=True)
             event.accept()
         except Exception as e:
             print(f"Error during cleanup: {str(e)}")
@@ -397,6 +515,27 @@ class MainWindow(QMainWindow):
         self.detect_formats_btn.setEnabled(is_valid)
         self.download_btn.setEnabled(False)
         self.audio_only_check.setEnabled(is_valid)
+        self._cancel_warmup()
+
+    def _start_warmup(self, url):
+        """Enumerate a playlist and resolve its first videos while the user picks options"""
+        if self.warmup is not None:
+            self.warmup.cancel()
+            self.warmup = None
+        if utils.get_url_type(url) != "playlist":
+            # Format detection already cached the video's metadata
+            return
+        try:
+            self.warmup = WarmUp(PlaylistDownloader(url), self.metadata_cache)
+            self.warmup.start()
+        except Exception as e:
+            print(f"Error starting warm-up: {str(e)}")
+
+    def _cancel_warmup(self):
+        if self.warmup is not None:
+            self.warmup.cancel()
+            self.warmup = None
+        self.metadata_cache.clear()
         
     def detect_formats(self):
         if not self.url_input.text().strip():
@@ -412,20 +551,22 @@ class MainWindow(QMainWindow):
             formats_detected = pyqtSignal(list, list)
             error_occurred = pyqtSignal(str)
             
-            def __init__(self, url):
+            def __init__(self, url, metadata_cache):
                 super().__init__()
                 self.url = url
+                self.metadata_cache = metadata_cache
                 
             def run(self):
                 try:
                     downloader = VideoDownloader(self.url)
+                    downloader.metadata_cache = self.metadata_cache
                     video_formats, audio_formats = downloader.get_available_formats()
                     self.formats_detected.emit(video_formats, audio_formats)
                 except Exception as e:
                     self.error_occurred.emit(str(e))
         
         # Initialize and connect thread
-        self.format_thread = FormatDetectionThread(self.url_input.text().strip())
+        self.format_thread = FormatDetectionThread(self.url_input.text().strip(), self.metadata_cache)
         self.format_thread.formats_detected.connect(self._update_formats)
         self.format_thread.error_occurred.connect(self.handle_error)
         self.format_thread.start()
@@ -448,6 +589,7 @@ class MainWindow(QMainWindow):
         
         self.detect_formats_btn.setEnabled(True)
         self.download_btn.setEnabled(True)
+        self._start_warmup(self.format_thread.url)
 
     def download_audio(self):
         self.audio_only = True
@@ -0,0 +1,187 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, List
+from . import config
+from .entries import PlaylistEntry
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+def make_worker_id() -> str:
+    """Build a worker ID that is unique across hosts sharing a ledger."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class WorkLedger:
+    """SQLite work ledger shared by sharded playlist workers.
+
+    Items are claimed under a lease that the owning worker keeps alive with
+    heartbeats. Leases that expire (crashed or hung workers) are handed out
+    again on the next claim. The database may live on a shared filesystem,
+    so the default rollback journal is used instead of WAL.
+    """
+
+    def __init__(self, path: str, lease_seconds: Optional[int] = None,
+                 max_attempts: Optional[int] = None):
+        self.path = path
+        self.lease_seconds = lease_seconds or config.LEDGER_LEASE_SECONDS
+        self.max_attempts = max_attempts or config.LEDGER_MAX_ATTEMPTS
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                idx INTEGER PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                title TEXT,
+                duration REAL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                expires REAL
+            );
+        """)
+
+    def _transaction(self, func):
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(self.conn)
+                self.conn.execute('COMMIT')
+                return result
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def is_seeded(self) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT 1 FROM meta WHERE key = 'seeded'").fetchone()
+        return row is not None
+
+    def claim_seed(self, worker_id: str) -> bool:
+        """Elect one worker to enumerate the playlist. Returns True for the winner."""
+        def claim(conn):
+            now = time.time()
+            row = conn.execute("SELECT value, expires FROM meta WHERE key = 'seeder'").fetchone()
+            if row and row[0] != worker_id and row[1] > now:
+                return False
+            conn.execute("INSERT OR REPLACE INTO meta (key, value, expires) VALUES ('seeder', ?, ?)",
+                         (worker_id, now + self.lease_seconds))
+            return True
+        return self._transaction(claim)
+
+    def seed(self, entries: List[PlaylistEntry]) -> int:
+        """Add playlist entries and mark the ledger seeded."""
+        def insert(conn):
+            conn.executemany(
+                "INSERT OR IGNORE INTO items (idx, video_id, title, duration) VALUES (?, ?, ?, ?)",
+                [(entry.index, entry.id, entry.title, entry.duration) for entry in entries]
+            )
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('seeded', '1')")
+            return len(entries)
+        return self._transaction(insert)
+
+    def claim(self, worker_id: str) -> Optional[PlaylistEntry]:
+        """Lease the next pending (or expired) item for worker_id."""
+        def claim(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE items SET status = ?, error = 'lease expired' "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, LEASED, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT idx, video_id, title, duration FROM items "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY idx LIMIT 1",
+                (PENDING, LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE items SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE idx = ?",
+                (LEASED, worker_id, now + self.lease_seconds, row[0])
+            )
+            return PlaylistEntry(row[0], row[1], row[2], row[3], LEASED)
+        return self._transaction(claim)
+
+    def heartbeat(self, worker_id: str, index: int) -> bool:
+        """Extend the lease on index. Returns False if the lease was lost."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE items SET lease_expires = ? WHERE idx = ? AND worker = ? AND status = ?",
+                (time.time() + self.lease_seconds, index, worker_id, LEASED)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, worker_id: str, index: int) -> None:
+        with self._lock:
+            self.conn.execute(
+                "UPDATE items SET status = ?, lease_expires = NULL, error = NULL "
+                "WHERE idx = ? AND worker = ?",
+                (DONE, index, worker_id)
+            )
+
+    def fail(self, worker_id: str, index: int, error: str) -> None:
+        """Release index for retry, or mark it failed once attempts run out."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "lease_expires = NULL, error = ? WHERE idx = ? AND worker = ?",
+                (self.max_attempts, FAILED, PENDING, error, index, worker_id)
+            )
+
+    def total(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def remaining(self) -> int:
+        """Items that are not finished yet (pending or leased)."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM items WHERE status IN (?, ?)", (PENDING, LEASED)
+            ).fetchone()[0]
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
+
+class Heartbeat(threading.Thread):
+    """Keeps a claimed item's lease alive while it is being downloaded."""
+
+    def __init__(self, ledger: WorkLedger, worker_id: str, index: int):
+        super().__init__(daemon=True)
+        self.ledger = ledger
+        self.worker_id = worker_id
+        self.index = index
+        self._stopped = threading.Event()
+
+    def run(self):
+        interval = max(1, self.ledger.lease_seconds // 3)
+        while not self._stopped.wait(interval):
+            try:
+                if not self.ledger.heartbeat(self.worker_id, self.index):
+                    break
+            except sqlite3.Error as e:
+                print(f"Heartbeat failed for item {self.index}: {str(e)}")
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
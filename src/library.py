@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+from . import config
+
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones
+
+def make_key(video_id: str, settings: dict) -> str:
+    """Key a library item by video ID plus the format and post-processing settings."""
+    digest = hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+    return f"{video_id}:{digest.hexdigest()[:16]}"
+
+def part_key(key: str, number: int) -> str:
+    """Key of the number-th file of an item; the first keeps the item key itself."""
+    return key if number == 0 else f"{key}#{number}"
+
+def _reflink(src: str, dst: str) -> None:
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("Reflinks are not supported on this platform")
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dst)
+            raise
+
+def link_file(src: str, dst: str, modes=None) -> str:
+    """Place src at dst without copying data. Returns the link mode that worked."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    last_error = None
+    for mode in modes or config.LIBRARY_LINK_MODES:
+        try:
+            if mode == 'hardlink':
+                os.link(src, dst)
+            elif mode == 'reflink':
+                _reflink(src, dst)
+            elif mode == 'symlink':
+                os.symlink(os.path.abspath(src), dst)
+            else:
+                continue
+            return mode
+        except OSError as e:
+            last_error = e
+    raise OSError(f"Could not link {src} into place: {last_error}")
+
+class DedupReport:
+    def __init__(self):
+        self.items_linked = 0
+        self.items_downloaded = 0
+        self.bytes_saved = 0
+        self.modes = {}
+
+    def add_link(self, size: int, mode: str):
+        self.items_linked += 1
+        self.bytes_saved += size
+        self.modes[mode] = self.modes.get(mode, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            'items_linked': self.items_linked,
+            'items_downloaded': self.items_downloaded,
+            'bytes_saved': self.bytes_saved,
+            'modes': dict(self.modes)
+        }
+
+class LibraryIndex:
+    """Index of every output in the library, shared by all playlists.
+
+    Rows whose file has gone missing or changed size are dropped on lookup,
+    so deleting a file from the library simply makes it download again.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.LIBRARY_INDEX_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS outputs (
+                key TEXT PRIMARY KEY,
+                video_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                recorded REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT path, size FROM outputs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path, size = row
+            try:
+                if os.path.getsize(path) == size:
+                    return path
+            except OSError:
+                pass
+            self.conn.execute("DELETE FROM outputs WHERE key = ?", (key,))
+            self.conn.commit()
+            return None
+
+    def record(self, key: str, video_id: str, path: str) -> None:
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO outputs (key, video_id, path, size, recorded) VALUES (?, ?, ?, ?, ?)",
+                (key, video_id, os.path.abspath(path), os.path.getsize(path), time.time())
+            )
+            self.conn.commit()
+
+    def lookup_all(self, key: str, count: int) -> Optional[List[str]]:
+        """Paths of the count files recorded under key by record_all, or None if any is missing"""
+        paths = [self.lookup(part_key(key, number)) for number in range(count)]
+        return paths if all(paths) else None
+
+    def record_all(self, key: str, video_id: str, paths: List[str]) -> None:
+        """Record every output of one item (e.g. each audio rendition) under key"""
+        for number, path in enumerate(paths):
+            self.record(part_key(key, number), video_id, path)
+
+    def close(self) -> None:
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,192 @@
+import bisect
+import http.server
+import os
+import threading
+from typing import Callable, Optional, Sequence
+from . import config
+
+class Counter:
+    """Monotonic counter; an uncontended lock keeps inc() cheap enough for progress hooks."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield self.name, self.value
+
+class Gauge:
+    """Value read from a callback when rendered, one sample per label value."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], dict], label: str):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.label = label
+
+    def samples(self):
+        for label_value, value in self.read().items():
+            yield f'{self.name}{{{self.label}="{label_value}"}}', value
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float]):
+        self.name = name
+        self.help = help_text
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound:g}"}}', cumulative
+        cumulative += counts[-1]
+        yield f'{self.name}_bucket{{le="+Inf"}}', cumulative
+        yield f'{self.name}_sum', total
+        yield f'{self.name}_count', cumulative
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], dict], label: str) -> Gauge:
+        metric = Gauge(name, help_text, read, label)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float]) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, value in metric.samples():
+                lines.append(f"{name} {value:g}" if isinstance(value, float) else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def write_file(self, path: str):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+SECONDS_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+THROUGHPUT_BUCKETS = tuple(mb * 1024 * 1024 for mb in (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100))
+FRAME_DELAY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1)
+
+REGISTRY = Registry()
+downloaded_bytes = REGISTRY.counter('ytdl_downloaded_bytes_total', 'Bytes downloaded')
+items_done = REGISTRY.counter('ytdl_items_done_total', 'Videos downloaded successfully')
+items_failed = REGISTRY.counter('ytdl_items_failed_total', 'Videos that failed to download')
+items_skipped = REGISTRY.counter('ytdl_items_skipped_total', 'Videos linked from the library instead of downloaded')
+retries = REGISTRY.counter('ytdl_retries_total', 'Retried requests (yt-dlp HTTP, fragment and extractor retries, segmented byte ranges)')
+uploaded_bytes = REGISTRY.counter('ytdl_uploaded_bytes_total', 'Bytes uploaded to the storage backend')
+extractor_calls = REGISTRY.counter('ytdl_extractor_calls_total', 'yt-dlp extract_info calls')
+download_seconds = REGISTRY.histogram(
+    'ytdl_download_seconds', 'Time to download one file (video or audio stream)', SECONDS_BUCKETS)
+postprocess_seconds = REGISTRY.histogram(
+    'ytdl_postprocess_seconds', 'Time spent in one post-processor step', SECONDS_BUCKETS)
+item_seconds = REGISTRY.histogram(
+    'ytdl_item_seconds', 'Total time per video, download and post-processing', SECONDS_BUCKETS)
+gui_frame_delay = REGISTRY.histogram(
+    'ytdl_gui_frame_delay_seconds', 'How late GUI timer ticks run (event loop latency)', FRAME_DELAY_BUCKETS)
+throughput = REGISTRY.histogram(
+    'ytdl_download_throughput_bytes_per_second', 'Average speed of each downloaded file', THROUGHPUT_BUCKETS)
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port: int, host: str = '127.0.0.1') -> http.server.ThreadingHTTPServer:
+    """Serve /metrics from a background thread."""
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+class FileExporter(threading.Thread):
+    """Rewrites the metrics file every interval seconds, for node_exporter's textfile collector."""
+
+    def __init__(self, path: str, interval: Optional[float] = None, registry: Registry = REGISTRY):
+        super().__init__(name='metrics-file', daemon=True)
+        self.path = path
+        self.interval = interval or config.METRICS_FILE_INTERVAL
+        self.registry = registry
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.registry.write_file(self.path)
+        except OSError as e:
+            print(f"Error writing metrics file: {str(e)}")
+
+    def stop(self):
+        self._stopped.set()
+        self._write()
+
+_exporters_started = False
+
+def start_exporters():
+    """Start the exporters enabled in config (METRICS_PORT, METRICS_FILE) once per process."""
+    global _exporters_started
+    if _exporters_started:
+        return
+    _exporters_started = True
+    if config.METRICS_PORT:
+        try:
+            start_http_server(config.METRICS_PORT)
+        except OSError as e:
+            print(f"Error starting metrics endpoint: {str(e)}")
+    if config.METRICS_FILE:
+        FileExporter(config.METRICS_FILE).start()
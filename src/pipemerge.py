@@ -0,0 +1,311 @@
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional
+from . import config
+from . import segmented
+from . import throttle
+
+class StreamingUnsupported(Exception):
+    pass
+
+def can_stream(info: dict) -> bool:
+    """True for a video+audio pair of plain HTTP(S) formats that ffmpeg can merge while they download."""
+    formats = info.get('requested_formats') or []
+    return (
+        len(formats) == 2
+        and all(segmented.is_supported(fmt) for fmt in formats)
+        and info.get('section_start') is None
+        and info.get('section_end') is None
+        and info.get('ext') == 'mp4'
+    )
+
+def disk_bytes_written() -> Optional[int]:
+    """Bytes this process and its finished children (e.g. ffmpeg) have sent to block devices.
+
+    Linux only; files on tmpfs are not counted. The kernel adds the I/O of
+    reaped children to the parent's /proc/self/io, so it is not added again.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('write_bytes:'))
+    except (OSError, StopIteration):
+        return None
+
+class _Feeder(threading.Thread):
+    """Downloads one format in ranges and writes it into a pipe read by ffmpeg."""
+
+    def __init__(self, fmt: dict, fd: int, chunk_size: int):
+        super().__init__(name=f"feed-{fmt.get('format_id')}", daemon=True)
+        self.source = segmented.SegmentedDownloader(fmt['url'], None, fmt.get('http_headers'))
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.total_bytes = fmt.get('filesize') or fmt.get('filesize_approx')
+        self.downloaded_bytes = 0
+        self.retries = 0
+        self.error = None
+        self.cancelled = threading.Event()
+
+    def run(self):
+        try:
+            with os.fdopen(self.fd, 'wb') as pipe:
+                self._feed(pipe)
+        except BrokenPipeError:
+            # ffmpeg exited; its return code says why
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            self.source.close_connection()
+
+    def _feed(self, pipe):
+        position = 0
+        attempt = 0
+        while not self.cancelled.is_set():
+            end = position + self.chunk_size - 1
+            try:
+                response = self.source.request_range(position, end)
+                if response.status == 416:
+                    response.read()
+                    return
+                if response.status in segmented.THROTTLE_STATUSES:
+                    response.read()
+                    retry_after = response.getheader('Retry-After')
+                    raise segmented.Throttled(response.status, throttle.retry_after_seconds(retry_after))
+                if response.status not in (200, 206):
+                    response.read()
+                    raise http.client.HTTPException(f"HTTP {response.status} for bytes {position}-{end}")
+                content_range = segmented.parse_content_range(response.getheader('Content-Range'))
+                if content_range:
+                    self.total_bytes = content_range[2]
+
+                while True:
+                    chunk = response.read(config.SEGMENTED_READ_SIZE)
+                    if not chunk:
+                        break
+                    if self.cancelled.is_set():
+                        return
+                    pipe.write(chunk)
+                    position += len(chunk)
+                    self.downloaded_bytes = position
+                attempt = 0
+            except BrokenPipeError:
+                raise
+            except (http.client.HTTPException, OSError) as e:
+                self.source.close_connection()
+                attempt += 1
+                self.retries += 1
+                if attempt > config.SEGMENTED_RETRIES:
+                    raise
+                if isinstance(e, segmented.Throttled):
+                    throttle.CONNECTIONS.on_throttle(e.retry_after)
+                    throttle.CONNECTIONS.wait()
+                else:
+                    time.sleep(throttle.CONNECTIONS.retry_sleep(attempt))
+                continue
+
+            # A server that ignores Range sends everything at once
+            if response.status == 200 or (self.total_bytes and position >= self.total_bytes):
+                return
+
+class StreamingMerge:
+    """Merges a video and an audio format into fragmented mp4 while both download.
+
+    Each format is fetched by its own thread and written into a pipe that
+    ffmpeg reads as an input, so the separate video and audio files are never
+    written and the merged file is written once. The output is fragmented
+    mp4 (moov at the start, fragments after), which needs no second pass to
+    move the index. Tags (metadata_args) and cover art (thumbnail) are
+    written by the same ffmpeg run; fragmented mp4 cannot carry cover art,
+    so with a thumbnail the output is a regular mp4 with its index at the
+    end, which is still written once. Where inherited pipes are not
+    available (Windows), or a source cannot be read sequentially (e.g. mp4
+    with its index at the end), ffmpeg reads the format URLs itself instead.
+    """
+
+    def __init__(self, ffmpeg_path: str, formats: List[dict], filename: str,
+                 report: Optional[Callable[[int, Optional[int]], None]] = None,
+                 thumbnail: Optional[str] = None, metadata_args: Optional[list] = None):
+        self.ffmpeg_path = ffmpeg_path
+        self.formats = formats
+        self.filename = filename
+        self.report = report
+        self.thumbnail = thumbnail
+        self.metadata_args = metadata_args or []
+        self.retries = 0
+        self.mode = None
+
+    def _extra_inputs(self) -> list:
+        return ['-i', self.thumbnail] if self.thumbnail else []
+
+    def _output_args(self, tmpfilename: str) -> list:
+        args = []
+        video_streams = 0
+        for number, fmt in enumerate(self.formats):
+            if fmt.get('vcodec', 'none') != 'none':
+                args += ['-map', f'{number}:v:0']
+                video_streams += 1
+            if fmt.get('acodec', 'none') != 'none':
+                args += ['-map', f'{number}:a:0']
+        args += ['-c', 'copy']
+        if self.thumbnail:
+            args += [
+                '-map', f'{len(self.formats)}:0',
+                f'-c:v:{video_streams}', 'mjpeg',
+                f'-disposition:v:{video_streams}', 'attached_pic'
+            ]
+        else:
+            args += ['-movflags', '+frag_keyframe+empty_moov+default_base_moof']
+        return args + self.metadata_args + ['-f', 'mp4', tmpfilename]
+
+    def run(self) -> int:
+        """Write the merged file; returns its size."""
+        tmpfilename = self.filename + '.part'
+        try:
+            if os.name == 'posix':
+                try:
+                    self._run_piped(tmpfilename)
+                    self.mode = 'pipe'
+                except StreamingUnsupported as e:
+                    print(f"Streaming merge through pipes failed, reading URLs directly: {str(e)}")
+                    self._run_direct(tmpfilename)
+                    self.mode = 'direct'
+            else:
+                self._run_direct(tmpfilename)
+                self.mode = 'direct'
+        except BaseException:
+            if os.path.exists(tmpfilename):
+                os.remove(tmpfilename)
+            raise
+        os.replace(tmpfilename, self.filename)
+        return os.path.getsize(self.filename)
+
+    def _run_piped(self, tmpfilename: str):
+        pipes = [os.pipe() for _ in self.formats]
+        # -xerror: an input that cannot be demuxed from a pipe fails the run instead of being dropped
+        args = [self.ffmpeg_path, '-y', '-nostdin', '-xerror', '-loglevel', 'error']
+        for read_fd, _ in pipes:
+            args += ['-i', f'pipe:{read_fd}']
+        args += self._extra_inputs()
+        try:
+            process = subprocess.Popen(args + self._output_args(tmpfilename),
+                                       pass_fds=[read_fd for read_fd, _ in pipes],
+                                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.PIPE)
+        except BaseException:
+            for read_fd, write_fd in pipes:
+                os.close(read_fd)
+                os.close(write_fd)
+            raise
+        feeders = []
+        for fmt, (read_fd, write_fd) in zip(self.formats, pipes):
+            os.close(read_fd)
+            feeders.append(_Feeder(fmt, write_fd, config.STREAMING_CHUNK_SIZE))
+        for feeder in feeders:
+            feeder.start()
+
+        try:
+            self._wait(process, lambda: (
+                sum(feeder.downloaded_bytes for feeder in feeders),
+                sum(feeder.total_bytes or 0 for feeder in feeders) or None
+            ))
+        finally:
+            for feeder in feeders:
+                feeder.cancelled.set()
+            for feeder in feeders:
+                feeder.join(timeout=config.SEGMENTED_TIMEOUT)
+            self.retries += sum(feeder.retries for feeder in feeders)
+
+        errors = [feeder.error for feeder in feeders if feeder.error is not None]
+        if errors:
+            raise errors[0]
+        if process.returncode != 0:
+            raise StreamingUnsupported(self._stderr(process))
+
+    def _run_direct(self, tmpfilename: str):
+        args = [self.ffmpeg_path, '-y', '-nostdin', '-xerror', '-loglevel', 'error']
+        for fmt in self.formats:
+            headers = ''.join(f"{key}: {value}\r\n" for key, value in (fmt.get('http_headers') or {}).items())
+            if headers:
+                args += ['-headers', headers]
+            args += ['-i', fmt['url']]
+        args += self._extra_inputs()
+        process = subprocess.Popen(args + self._output_args(tmpfilename),
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE)
+        total = sum(fmt.get('filesize') or fmt.get('filesize_approx') or 0 for fmt in self.formats) or None
+        self._wait(process, lambda: (
+            os.path.getsize(tmpfilename) if os.path.exists(tmpfilename) else 0, total
+        ))
+        if process.returncode != 0:
+            raise Exception(f"ffmpeg merge failed: {self._stderr(process)}")
+
+    def _wait(self, process, progress):
+        """Report progress until ffmpeg exits; kills it if reporting raises (e.g. cancelled)."""
+        try:
+            while process.poll() is None:
+                if self.report:
+                    self.report(*progress())
+                time.sleep(config.SEGMENTED_REPORT_INTERVAL)
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+
+    @staticmethod
+    def _stderr(process) -> str:
+        return process.stderr.read().decode('utf-8', 'replace').strip()[-500:]
+
+def benchmark(url: str, resolution: Optional[str] = None, fixtures_path: Optional[str] = None,
+              output_root: str = '.') -> dict:
+    """Disk bytes written per output byte with and without the streaming merge.
+
+    Downloads url twice into temporary folders under output_root (which should
+    not be on tmpfs). With fixtures_path the run is replayed offline from
+    recorded fixtures (see fixtures.py).
+    """
+    from .downloader import VideoDownloader
+    from . import fixtures
+
+    store = fixtures.FixtureStore(fixtures_path) if fixtures_path else None
+    server = fixtures.FixtureServer(store).start() if store else None
+    results = {}
+    try:
+        for streaming in (False, True):
+            with tempfile.TemporaryDirectory(prefix='merge-benchmark-', dir=output_root) as output_path:
+                downloader = VideoDownloader(url, output_path, resolution)
+                downloader.ydl_opts['streaming_merge'] = streaming
+                downloader.verify_outputs = False
+                if store:
+                    fixtures.replay(downloader, store, server)
+                os.sync()
+                written = disk_bytes_written()
+                started = time.time()
+                downloader.download()
+                os.sync()
+                written = disk_bytes_written() - written if written is not None else None
+                output_bytes = sum(
+                    os.path.getsize(os.path.join(directory, name))
+                    for directory, _, files in os.walk(output_path) for name in files
+                )
+                results['streaming' if streaming else 'separate'] = {
+                    'seconds': round(time.time() - started, 2),
+                    'output_bytes': output_bytes,
+                    'disk_bytes_written': written,
+                    'written_per_output_byte': round(written / output_bytes, 2) if written and output_bytes else None
+                }
+    finally:
+        if server:
+            server.stop()
+    return results
+
+if __name__ == "__main__":
+    import json
+    if len(sys.argv) < 2:
+        print("Usage: python -m src.pipemerge <video url> [resolution] [fixtures path]")
+        sys.exit(1)
+    print(json.dumps(benchmark(*sys.argv[1:4]), indent=2))
@@ -0,0 +1,156 @@
+import threading
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer
+from PyQt6.QtGui import QColor
+from . import config
+from . import entries
+from . import utils
+
+COLUMNS = ('#', 'ID', 'Title', 'State', 'Size', 'Speed', 'Error')
+# Row layout: one plain list per video
+INDEX, VIDEO_ID, TITLE, STATE, SIZE, DOWNLOADED, SPEED, ERROR = range(8)
+FIELDS = {'state': STATE, 'size': SIZE, 'downloaded': DOWNLOADED, 'speed': SPEED, 'error': ERROR}
+
+STATE_COLORS = {
+    entries.DONE: QColor('#2e7d32'),
+    entries.LINKED: QColor('#1565c0'),
+    entries.FAILED: QColor('#c62828')
+}
+
+# More dirty ranges than this are sent as one span; the view only repaints visible rows anyway
+MAX_RANGES = 32
+
+class PlaylistTableModel(QAbstractTableModel):
+    """Per-video table for playlist jobs.
+
+    Downloader threads call set_entries() and update_item() directly; they
+    only record the change under a lock. A timer on the GUI thread applies
+    pending changes every GUI_REFRESH_MS and emits one dataChanged per
+    contiguous range of touched rows, so a burst of progress updates costs
+    one repaint regardless of how many rows or threads produced it. The
+    timer runs only between start() and stop(), i.e. while a job runs.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._row_of = {}
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._pending_entries = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(config.GUI_REFRESH_MS)
+        self._timer.timeout.connect(self.flush)
+
+    # Called from downloader threads
+
+    def set_entries(self, playlist_entries):
+        rows = [
+            [entry.index, entry.id, entry.title or '', entry.status, None, 0, None, '']
+            for entry in playlist_entries
+        ]
+        with self._lock:
+            self._pending_entries = rows
+            self._pending = {}
+
+    def update_item(self, index: int, fields: dict):
+        with self._lock:
+            pending = self._pending.get(index)
+            if pending is None:
+                self._pending[index] = dict(fields)
+            else:
+                pending.update(fields)
+
+    def clear(self):
+        self.set_entries([])
+
+    # GUI thread
+
+    def start(self):
+        self._timer.start()
+
+    def stop(self):
+        """Stop the timer after applying what is still pending."""
+        self._timer.stop()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            new_rows, self._pending_entries = self._pending_entries, None
+            pending, self._pending = self._pending, {}
+
+        if new_rows is not None:
+            self.beginResetModel()
+            self._rows = new_rows
+            self._row_of = {row[INDEX]: position for position, row in enumerate(new_rows)}
+            self.endResetModel()
+
+        changed = []
+        for index, fields in pending.items():
+            position = self._row_of.get(index)
+            if position is None:
+                continue
+            row = self._rows[position]
+            for name, value in fields.items():
+                row[FIELDS[name]] = value
+            changed.append(position)
+        if changed:
+            self._emit_ranges(sorted(changed))
+
+    def _emit_ranges(self, positions):
+        last_column = len(COLUMNS) - 1
+        if len(positions) > MAX_RANGES:
+            ranges = [(positions[0], positions[-1])]
+        else:
+            ranges = []
+            start = previous = positions[0]
+            for position in positions[1:]:
+                if position != previous + 1:
+                    ranges.append((start, previous))
+                    start = position
+                previous = position
+            ranges.append((start, previous))
+        for first, last in ranges:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column))
+
+    # QAbstractTableModel
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._display(row, column)
+        if role == Qt.ItemDataRole.ForegroundRole and column == 3:
+            return STATE_COLORS.get(row[STATE])
+        if role == Qt.ItemDataRole.ToolTipRole and column in (2, 6):
+            return row[TITLE] if column == 2 else row[ERROR] or None
+        return None
+
+    def _display(self, row, column):
+        if column == 0:
+            return row[INDEX]
+        if column == 1:
+            return row[VIDEO_ID]
+        if column == 2:
+            return row[TITLE]
+        if column == 3:
+            if row[STATE] == entries.DOWNLOADING and row[SIZE]:
+                return f"{row[STATE]} {row[DOWNLOADED] * 100 // row[SIZE]}%"
+            return row[STATE]
+        if column == 4:
+            return utils.format_size(row[SIZE]) if row[SIZE] else ''
+        if column == 5:
+            return f"{row[SPEED] / (1024 * 1024):.2f} MB/s" if row[SPEED] else ''
+        return row[ERROR]
@@ -0,0 +1,207 @@
+import os
+from typing import List, Optional, Tuple
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+from yt_dlp.utils import PostProcessingError, prepend_extension, replace_extension
+from . import config
+
+# ffmpeg encoder and muxer arguments per audio output format
+AUDIO_ENCODERS = {
+    'mp3': ['-c:a', 'libmp3lame', '-f', 'mp3'],
+    'm4a': ['-c:a', 'aac', '-f', 'mp4'],
+    'aac': ['-c:a', 'aac', '-f', 'adts'],
+    'wav': ['-c:a', 'pcm_s16le', '-f', 'wav']
+}
+
+# Source codecs (yt-dlp 'acodec' prefixes) that can be stream-copied into a format
+COPYABLE_CODECS = {
+    'mp3': ('mp3',),
+    'm4a': ('mp4a', 'aac'),
+    'aac': ('mp4a', 'aac')
+}
+
+# Containers that can carry cover art and tags
+ART_FORMATS = ('mp3', 'm4a', 'mp4')
+TAG_FORMATS = ('mp3', 'm4a', 'mp4', 'wav')
+
+def normalize_rendition(audio_format: str, audio_quality: str) -> Tuple[str, str]:
+    """Map GUI/config names ("MP3", "320kbps") to ("mp3", "320")."""
+    audio_format = config.SUPPORTED_AUDIO_FORMATS.get(audio_format.upper(), audio_format).lower()
+    audio_quality = config.SUPPORTED_AUDIO_QUALITIES.get(audio_quality, audio_quality)
+    audio_quality = str(audio_quality).lower().replace('kbps', '').replace('k', '')
+    if audio_format not in AUDIO_ENCODERS:
+        raise ValueError(f"Unsupported audio format: {audio_format}")
+    return audio_format, audio_quality
+
+def rendition_paths(source: str, renditions: List[Tuple[str, str]]) -> List[str]:
+    """Output path per rendition; the bitrate is added when a format repeats."""
+    base = os.path.splitext(source)[0]
+    formats = [audio_format for audio_format, _ in renditions]
+    return [
+        f"{base}.{quality}k.{audio_format}" if formats.count(audio_format) > 1 else f"{base}.{audio_format}"
+        for audio_format, quality in renditions
+    ]
+
+def media_tags(info: dict) -> dict:
+    """Tags to write, taken from the info dict that was already extracted."""
+    upload_date = info.get('release_date') or info.get('upload_date') or ''
+    tags = {
+        'title': info.get('track') or info.get('title'),
+        'artist': info.get('artist') or info.get('creator') or info.get('uploader') or info.get('channel'),
+        'album': info.get('album') or info.get('playlist_title') or info.get('playlist'),
+        'track': info.get('playlist_index'),
+        'date': upload_date[:4] or None,
+        'comment': info.get('webpage_url')
+    }
+    return {key: str(value) for key, value in tags.items() if value}
+
+class SinglePassPP(FFmpegPostProcessor):
+    """Base for post-processors that finish an item in a single ffmpeg run.
+
+    Conversion or remuxing, metadata tags and cover art all go into the same
+    invocation, so each output file is read once and written once. The cover
+    art is the thumbnail yt-dlp already wrote for the item (writethumbnail).
+    """
+
+    def __init__(self, downloader=None, embed_metadata: bool = True, embed_thumbnail: bool = True):
+        super().__init__(downloader)
+        self.embed_metadata = embed_metadata
+        self.embed_thumbnail = embed_thumbnail
+
+    def _thumbnail_file(self, info: dict) -> Optional[str]:
+        for thumbnail in reversed(info.get('thumbnails') or []):
+            path = thumbnail.get('filepath')
+            if path and os.path.exists(path):
+                return path
+        return None
+
+    def _tag_options(self, info: dict, output_format: str) -> list:
+        if not self.embed_metadata or output_format not in TAG_FORMATS:
+            return []
+        options = []
+        for key, value in media_tags(info).items():
+            options += ['-metadata', f"{key}={value}"]
+        if output_format == 'mp3':
+            options += ['-id3v2_version', '3']
+        return options
+
+    def _art_options(self, art_stream: int) -> list:
+        """Map input 1 (the thumbnail) as the attached picture of video stream art_stream."""
+        return [
+            '-map', '1:0',
+            f'-c:v:{art_stream}', 'mjpeg',
+            f'-disposition:v:{art_stream}', 'attached_pic'
+        ]
+
+    def _outputs(self, info: dict, has_art: bool) -> List[Tuple[str, str, list]]:
+        """(path, format, ffmpeg output options) for every file to write"""
+        raise NotImplementedError
+
+    def run(self, info):
+        source = info['filepath']
+        thumbnail = self._thumbnail_file(info) if self.embed_thumbnail else None
+        outputs = self._outputs(info, bool(thumbnail))
+        temp_outputs = [prepend_extension(path, 'temp') for path, _, _ in outputs]
+
+        inputs = [(source, [])]
+        if thumbnail and any(output_format in ART_FORMATS for _, output_format, _ in outputs):
+            inputs.append((thumbnail, []))
+
+        self.to_screen(f"Writing {len(outputs)} file(s) from \"{source}\" in one pass")
+        try:
+            self.real_run_ffmpeg(inputs, [
+                (temp, options) for temp, (_, _, options) in zip(temp_outputs, outputs)
+            ])
+        except Exception as e:
+            for temp in temp_outputs:
+                if os.path.exists(temp):
+                    os.remove(temp)
+            raise PostProcessingError(f"Post-processing failed: {str(e)}")
+
+        for temp, (path, _, _) in zip(temp_outputs, outputs):
+            os.replace(temp, path)
+
+        files_to_delete = [] if source in [path for path, _, _ in outputs] else [source]
+        if thumbnail:
+            files_to_delete.append(thumbnail)
+            info.get('__files_to_move', {}).pop(thumbnail, None)
+        info['filepath'] = outputs[0][0]
+        info['ext'] = outputs[0][1]
+        return files_to_delete, info
+
+class AudioRenditionsPP(SinglePassPP):
+    """Extracts audio into one or more (format, bitrate) renditions in one ffmpeg run.
+
+    The downloaded source is decoded once and fanned out to every output.
+    The first rendition becomes the item's filepath; all outputs are listed
+    in info['rendition_files'].
+    """
+
+    def __init__(self, downloader=None, renditions=None, **kwargs):
+        super().__init__(downloader, **kwargs)
+        self.renditions = [normalize_rendition(*rendition) for rendition in renditions or []]
+
+    def _output_options(self, audio_format: str, quality: str, source_codec: str, has_art: bool) -> list:
+        options = ['-map', '0:a:0', '-ar', '44100', '-ac', '2']
+        if source_codec.startswith(COPYABLE_CODECS.get(audio_format, ())):
+            options = ['-map', '0:a:0', '-c:a', 'copy'] + AUDIO_ENCODERS[audio_format][2:]
+        else:
+            options += AUDIO_ENCODERS[audio_format]
+            if audio_format != 'wav':
+                options += ['-b:a', f"{quality}k"]
+        if has_art and audio_format in ART_FORMATS:
+            options += self._art_options(0)
+        else:
+            options.append('-vn')
+        return options
+
+    def _outputs(self, info, has_art):
+        source_codec = (info.get('acodec') or '').lower()
+        # Several renditions each need their own bitrate, so only a lone rendition may stream-copy
+        if len(self.renditions) > 1:
+            source_codec = ''
+        paths = rendition_paths(info['filepath'], self.renditions)
+        return [
+            (path, audio_format,
+             self._output_options(audio_format, quality, source_codec, has_art)
+             + self._tag_options(info, audio_format))
+            for path, (audio_format, quality) in zip(paths, self.renditions)
+        ]
+
+    def run(self, info):
+        paths = rendition_paths(info['filepath'], self.renditions)
+        files_to_delete, info = super().run(info)
+        info['rendition_files'] = [
+            {'filepath': path, 'audio_format': audio_format, 'audio_quality': quality}
+            for path, (audio_format, quality) in zip(paths, self.renditions)
+        ]
+        return files_to_delete, info
+
+class VideoRemuxPP(SinglePassPP):
+    """Remuxes a merged video into mp4 while writing tags and cover art."""
+
+    def __init__(self, downloader=None, target_format: str = 'mp4', **kwargs):
+        super().__init__(downloader, **kwargs)
+        self.target_format = target_format
+
+    def _outputs(self, info, has_art):
+        options = ['-map', '0:v:0', '-map', '0:a?', '-c', 'copy']
+        if has_art and self.target_format in ART_FORMATS:
+            options += self._art_options(1)
+        options += self._tag_options(info, self.target_format)
+        options += ['-f', self.target_format]
+        return [(replace_extension(info['filepath'], self.target_format), self.target_format, options)]
+
+    def streaming_extras(self, info: dict) -> Tuple[Optional[str], list]:
+        """(cover art file, tag options) for a streaming merge that writes them itself"""
+        thumbnail = self._thumbnail_file(info) if self.embed_thumbnail else None
+        return thumbnail, self._tag_options(info, self.target_format)
+
+    def run(self, info):
+        if info.get('__stream_merged') and info.get('ext') == self.target_format:
+            # pipemerge.StreamingMerge already wrote the tags and cover art; remuxing would write the file again
+            thumbnail = self._thumbnail_file(info) if self.embed_thumbnail else None
+            if thumbnail:
+                info.get('__files_to_move', {}).pop(thumbnail, None)
+                return [thumbnail], info
+            return [], info
+        return super().run(info)
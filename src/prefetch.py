@@ -0,0 +1,92 @@
+import re
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+from . import config
+
+_PATH_EXPIRE_RE = re.compile(r'/expire/(\d+)')
+
+def info_expires_at(info: dict) -> Optional[float]:
+    """Earliest expiry timestamp of the signed media URLs in an info dict."""
+    earliest = None
+    for fmt in info.get('formats') or []:
+        for key in ('url', 'manifest_url', 'fragment_base_url'):
+            url = fmt.get(key)
+            if not url:
+                continue
+            parsed = urllib.parse.urlparse(url)
+            expire = urllib.parse.parse_qs(parsed.query).get('expire', [None])[0]
+            if expire is None:
+                match = _PATH_EXPIRE_RE.search(parsed.path)
+                expire = match.group(1) if match else None
+            if expire and expire.isdigit():
+                expire = float(expire)
+                if earliest is None or expire < earliest:
+                    earliest = expire
+    return earliest
+
+def is_stale(info: dict, margin: Optional[float] = None) -> bool:
+    """True if the info dict's media URLs expire within margin seconds."""
+    expires = info_expires_at(info)
+    if expires is None:
+        return False
+    margin = config.PREFETCH_EXPIRY_MARGIN if margin is None else margin
+    return expires - margin <= time.time()
+
+class MetadataPrefetcher:
+    """Resolves info dicts for the next entries while the current one downloads.
+
+    At most `window` entries ahead of the current position are in flight or
+    cached at any time. Prefetched dicts whose signed URLs are about to expire
+    are thrown away and resolved again inline.
+    """
+
+    def __init__(self, extract: Callable[[str], dict], urls: List[str],
+                 window: Optional[int] = None, workers: Optional[int] = None):
+        self.extract = extract
+        self.urls = urls
+        self.window = config.PREFETCH_WINDOW if window is None else window
+        self._futures = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers or config.PREFETCH_WORKERS)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _fill(self, position: int):
+        end = min(len(self.urls), position + self.window + 1)
+        for ahead in range(position + 1, end):
+            if ahead not in self._futures:
+                self._futures[ahead] = self._executor.submit(self.extract, self.urls[ahead])
+
+    def get(self, position: int) -> dict:
+        """Return the info dict for urls[position], resolving it inline if needed."""
+        future = self._futures.pop(position, None)
+        # Drop anything we skipped past (e.g. after a stop/resume)
+        for stale_position in [p for p in self._futures if p < position]:
+            self._futures.pop(stale_position).cancel()
+        self._fill(position)
+
+        info = None
+        if future is not None:
+            try:
+                info = future.result()
+            except Exception:
+                info = None
+
+        if info is not None and is_stale(info):
+            self.expired += 1
+            info = None
+
+        if info is None:
+            self.misses += 1
+            return self.extract(self.urls[position])
+
+        self.hits += 1
+        return info
+
+    def close(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=False)
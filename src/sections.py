@@ -0,0 +1,58 @@
+import math
+import re
+from typing import List
+
+def parse_time(value: str) -> float:
+    """'90', '1:30', '1:02:03.5' or 'inf' to seconds."""
+    value = value.strip()
+    if value.lower() in ('inf', 'end', ''):
+        return math.inf
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+class SectionSelector:
+    """Picks the parts of a video to download, for yt-dlp's download_ranges option.
+
+    Specs follow yt-dlp's --download-sections syntax: "*start-end" is a time
+    range ("*10:00-12:30", "*1:00:00-inf") and anything else is a regex
+    matched against chapter titles. yt-dlp then hands each section to ffmpeg
+    with the stream URLs, so only the bytes around the section are fetched.
+    """
+
+    def __init__(self, specs: List[str]):
+        self.specs = list(specs)
+        self.ranges = []
+        self.chapters = []
+        for spec in self.specs:
+            spec = spec.strip()
+            if spec.startswith('*'):
+                start, _, end = spec[1:].partition('-')
+                start, end = parse_time(start or '0'), parse_time(end)
+                if start >= end:
+                    raise ValueError(f"Invalid section: {spec}")
+                self.ranges.append((start, end))
+            elif spec:
+                self.chapters.append(re.compile(spec, re.IGNORECASE))
+
+    def sections(self, info: dict) -> List[dict]:
+        duration = info.get('duration')
+        selected = [
+            {'start_time': chapter['start_time'], 'end_time': chapter['end_time'], 'title': chapter.get('title')}
+            for chapter in info.get('chapters') or []
+            if any(pattern.search(chapter.get('title') or '') for pattern in self.chapters)
+        ]
+        for start, end in self.ranges:
+            if duration:
+                if start >= duration:
+                    continue
+                end = min(end, duration)
+            selected.append({'start_time': start, 'end_time': end})
+        return sorted(selected, key=lambda section: section['start_time'])
+
+    def __call__(self, info: dict, ydl=None) -> List[dict]:
+        selected = self.sections(info)
+        if not selected and ydl is not None:
+            ydl.report_warning(f"No sections of \"{info.get('title')}\" match {self.specs}")
+        return selected
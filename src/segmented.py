@@ -0,0 +1,310 @@
+import http.client
+import http.server
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from typing import Callable, Optional, Tuple
+from . import config
+from . import throttle
+
+_CONTENT_RANGE_RE = re.compile(r'bytes\s+(\d+)-(\d+)/(\d+)')
+
+class RangeNotSupported(Exception):
+    pass
+
+class SegmentCancelled(Exception):
+    pass
+
+class Throttled(http.client.HTTPException):
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}: rate limited")
+        self.status = status
+        self.retry_after = retry_after
+
+# Answers that mean the server is rate limiting us
+THROTTLE_STATUSES = (429, 403)
+
+def parse_content_range(value: Optional[str]) -> Optional[Tuple[int, int, int]]:
+    """(first byte, last byte, total size) from a Content-Range header; None if absent or not bytes."""
+    match = _CONTENT_RANGE_RE.match(value or '')
+    return tuple(int(group) for group in match.groups()) if match else None
+
+def is_supported(info: dict) -> bool:
+    """True for single-file HTTP(S) formats that can be fetched by byte ranges."""
+    return (
+        info.get('protocol') in ('http', 'https')
+        and bool(info.get('url'))
+        and not info.get('fragments')
+        and not info.get('is_live')
+        # Sections are cut by ffmpeg from the stream URL (yt-dlp's FFmpegFD)
+        and info.get('section_start') is None
+        and info.get('section_end') is None
+    )
+
+class SegmentedDownloader:
+    """Fetches one file as parallel byte ranges over persistent connections.
+
+    The file is preallocated and every range is written at its own offset,
+    so ranges can complete in any order. Each worker thread keeps its own
+    keep-alive connection and pulls the next range when it finishes one; a
+    failed range is retried from the last byte written.
+
+    With a limiter (throttle.AdaptiveLimiter) every range request takes one
+    of its slots, so the number of open ranges follows the adaptive limit
+    and rate-limited answers (429/403) lower it and honour Retry-After.
+
+    request_range() and close_connection() also work on their own, for a
+    caller that reads the file in order (pipemerge); filename may then be None.
+    """
+
+    def __init__(self, url: str, filename: str, headers: Optional[dict] = None,
+                 connections: Optional[int] = None, segment_size: Optional[int] = None,
+                 retries: Optional[int] = None, limiter=None):
+        self.url = url
+        self.limiter = limiter
+        self.filename = filename
+        self.headers = dict(headers or {})
+        self.connections = connections or config.SEGMENTED_CONNECTIONS
+        self.segment_size = segment_size or config.SEGMENTED_SEGMENT_SIZE
+        self.retries = config.SEGMENTED_RETRIES if retries is None else retries
+        self.total_bytes = None
+        self.downloaded_bytes = 0
+        self.range_retries = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cancelled = threading.Event()
+
+    # Connections
+
+    def _open(self, url: str):
+        parsed = urllib.parse.urlsplit(url)
+        connection_class = (http.client.HTTPSConnection if parsed.scheme == 'https'
+                            else http.client.HTTPConnection)
+        return connection_class(parsed.hostname, parsed.port, timeout=config.SEGMENTED_TIMEOUT)
+
+    def request_range(self, start: int, end: int):
+        """GET bytes start..end on this thread's persistent connection.
+
+        Redirects are followed (and remembered); the response is returned
+        unread, whatever its status. Raises on connection errors, after
+        closing the connection.
+        """
+        url = self.url
+        for _ in range(5):
+            parsed = urllib.parse.urlsplit(url)
+            key = (parsed.scheme, parsed.netloc)
+            connection = getattr(self._local, 'connection', None)
+            if connection is None or self._local.key != key:
+                if connection is not None:
+                    connection.close()
+                connection = self._local.connection = self._open(url)
+                self._local.key = key
+
+            path = parsed.path or '/'
+            if parsed.query:
+                path = f"{path}?{parsed.query}"
+            headers = dict(self.headers)
+            headers['Range'] = f"bytes={start}-{end}"
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, OSError):
+                self.close_connection()
+                raise
+
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                url = urllib.parse.urljoin(url, response.getheader('Location'))
+                self.url = url
+                continue
+            return response
+        raise http.client.HTTPException("Too many redirects")
+
+    def close_connection(self):
+        """Close this thread's connection; the next request opens a new one."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def probe(self) -> int:
+        """Find the resource size and make sure the server honours ranges."""
+        try:
+            response = self.request_range(0, 0)
+            response.read()
+        finally:
+            # Ranges are fetched from the pool's threads, so the caller's connection is not reused
+            self.close_connection()
+        content_range = parse_content_range(response.getheader('Content-Range'))
+        if response.status != 206 or not content_range:
+            raise RangeNotSupported(f"Server answered {response.status} to a range request")
+        self.total_bytes = content_range[2]
+        return self.total_bytes
+
+    # Transfer
+
+    def _open_range(self, position: int, end: int):
+        """Request bytes position..end; returns the response once it is known to be a 206."""
+        response = self.request_range(position, end)
+        if response.status in THROTTLE_STATUSES:
+            response.read()
+            raise Throttled(response.status, throttle.retry_after_seconds(response.getheader('Retry-After')))
+        if response.status != 206:
+            response.read()
+            raise http.client.HTTPException(f"HTTP {response.status} for range {position}-{end}")
+        return response
+
+    def _fetch_segment(self, start: int, end: int):
+        # position is the next byte to write; it survives a failed attempt so the retry resumes there
+        position = start
+        attempt = 0
+        with open(self.filename, 'r+b') as target:
+            while position <= end:
+                if self._cancelled.is_set():
+                    raise SegmentCancelled()
+                if self.limiter:
+                    self.limiter.acquire()
+                started = time.time()
+                try:
+                    response = self._open_range(position, end)
+                    target.seek(position)
+                    while position <= end:
+                        if self._cancelled.is_set():
+                            self.close_connection()
+                            raise SegmentCancelled()
+                        chunk = response.read(min(config.SEGMENTED_READ_SIZE, end - position + 1))
+                        if not chunk:
+                            raise http.client.IncompleteRead(b'', end - position + 1)
+                        target.write(chunk)
+                        position += len(chunk)
+                        with self._lock:
+                            self.downloaded_bytes += len(chunk)
+                    if self.limiter:
+                        self.limiter.on_success(time.time() - started)
+                except (http.client.HTTPException, OSError) as e:
+                    self.close_connection()
+                    attempt += 1
+                    with self._lock:
+                        self.range_retries += 1
+                    if attempt > self.retries:
+                        raise
+                    if isinstance(e, Throttled) and self.limiter:
+                        # The limiter's pause holds this and every other range back
+                        self.limiter.on_throttle(e.retry_after)
+                    elif isinstance(e, Throttled):
+                        time.sleep(e.retry_after if e.retry_after is not None else min(2 ** attempt, 30))
+                    else:
+                        if self.limiter:
+                            self.limiter.on_congestion()
+                        time.sleep(min(2 ** attempt, 30) * 0.25)
+                finally:
+                    if self.limiter:
+                        self.limiter.release()
+
+    def download(self, report: Optional[Callable[[int, int], None]] = None) -> int:
+        """Download the whole file. report(downloaded, total) is called from this thread."""
+        total = self.total_bytes or self.probe()
+        with open(self.filename, 'wb') as target:
+            target.truncate(total)
+
+        ranges = [
+            (start, min(start + self.segment_size, total) - 1)
+            for start in range(0, total, self.segment_size)
+        ]
+        executor = ThreadPoolExecutor(max_workers=min(self.connections, len(ranges)) or 1)
+        try:
+            futures = [executor.submit(self._fetch_segment, start, end) for start, end in ranges]
+            pending = futures
+            while pending:
+                done, pending = wait(pending, timeout=config.SEGMENTED_REPORT_INTERVAL,
+                                     return_when=FIRST_EXCEPTION)
+                for future in done:
+                    future.result()
+                if report:
+                    report(self.downloaded_bytes, total)
+        except BaseException:
+            self._cancelled.set()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+        return total
+
+class _ThrottledRangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves server.data with byte ranges, at most server.rate bytes/s per connection."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.sent = 0
+        self.opened = time.time()
+
+    def do_GET(self):
+        data = self.server.data
+        start, end = 0, len(data) - 1
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), end) if match.group(2) else end
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        for offset in range(start, end + 1, 64 * 1024):
+            chunk = data[offset:min(offset + 64 * 1024, end + 1)]
+            self.wfile.write(chunk)
+            self.sent += len(chunk)
+            # Pace the connection, like a server that throttles each one
+            delay = self.opened + self.sent / self.server.rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def log_message(self, format, *args):
+        pass
+
+def benchmark(size: int = 16 * 1024 * 1024, rate: int = 4 * 1024 * 1024,
+              connections: Optional[int] = None) -> dict:
+    """Download time over one connection and over `connections` ranges.
+
+    A local server serves size random bytes and throttles every connection
+    to rate bytes/s, as YouTube's media servers do; no network is used.
+    """
+    connections = connections or config.SEGMENTED_CONNECTIONS
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _ThrottledRangeHandler)
+    httpd.daemon_threads = True
+    httpd.data = os.urandom(size)
+    httpd.rate = rate
+    threading.Thread(target=httpd.serve_forever, name='benchmark-server', daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/media"
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix='segmented-benchmark-') as directory:
+            for count in (1, connections):
+                filename = os.path.join(directory, f"{count}.bin")
+                downloader = SegmentedDownloader(url, filename, connections=count,
+                                                 segment_size=-(-size // (count * 4)))
+                started = time.time()
+                downloader.download()
+                seconds = time.time() - started
+                with open(filename, 'rb') as f:
+                    intact = f.read() == httpd.data
+                results[f"connections_{count}"] = {
+                    'seconds': round(seconds, 2),
+                    'mbytes_per_second': round(size / seconds / 1024 / 1024, 2),
+                    'intact': intact
+                }
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    return results
+
+if __name__ == "__main__":
+    import json
+    arguments = [int(value) for value in sys.argv[1:4]]
+    print(json.dumps(benchmark(*arguments), indent=2))
@@ -0,0 +1,229 @@
+import logging
+import os
+import threading
+import time
+from typing import Optional
+import yt_dlp
+from yt_dlp.postprocessor.ffmpeg import FFmpegPostProcessor
+from . import metrics
+from . import pipemerge
+from . import postprocess
+from . import segmented
+from . import throttle
+
+class ConnectionCounter(logging.Handler):
+    """Counts new HTTP connections opened by urllib3 (yt-dlp's requests handler)."""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.opened = 0
+
+    def emit(self, record):
+        if record.msg.startswith('Starting new'):
+            self.opened += 1
+
+class SessionYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL with the extensions used by our downloaders.
+
+    Single-file HTTP formats are fetched over several range connections when
+    the 'segmented_connections' option is above 1; fragmented (DASH/HLS)
+    formats, proxied sessions and servers that refuse range requests use
+    yt-dlp's own downloaders. With 'streaming_merge', a video+audio pair is
+    merged by ffmpeg while both formats download (see pipemerge.py) instead
+    of being written to two files and merged afterwards. Post-processors
+    that cannot be described by an option dict are passed as
+    'custom_postprocessors'.
+    """
+
+    def __init__(self, params=None, auto_init=True):
+        super().__init__(params, auto_init)
+        # (factory, when) pairs for post-processors that are not built into yt-dlp
+        for factory, when in self.params.get('custom_postprocessors') or []:
+            self.add_post_processor(factory(self), when=when)
+
+    def extract_info(self, *args, **kwargs):
+        metrics.extractor_calls.inc()
+        return super().extract_info(*args, **kwargs)
+
+    def process_info(self, info_dict):
+        if (self.params.get('streaming_merge') and not self.params.get('proxy')
+                and pipemerge.can_stream(info_dict)):
+            # With ffmpeg as the downloader, yt-dlp hands the whole pair to dl() in one call
+            # and skips its merger; dl() then runs the streaming merge instead of ffmpeg's own.
+            downloaders = self.params.get('external_downloader')
+            self.params['external_downloader'] = {'http': 'ffmpeg'}
+            try:
+                return super().process_info(info_dict)
+            finally:
+                self.params['external_downloader'] = downloaders
+        return super().process_info(info_dict)
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if (self.params.get('streaming_merge') and not subtitle and not test and name != '-'
+                and pipemerge.can_stream(info)):
+            return self._streaming_dl(name, info)
+        connections = self.params.get('segmented_connections') or 0
+        if (connections > 1 and not subtitle and not test and name != '-'
+                and not self.params.get('proxy') and segmented.is_supported(info)):
+            size = info.get('filesize') or info.get('filesize_approx') or 0
+            if not size or size >= self.params.get('segmented_min_size', 0):
+                try:
+                    return self._segmented_dl(name, info, connections)
+                except segmented.RangeNotSupported:
+                    pass
+        return super().dl(name, info, subtitle, test)
+
+    def _request_headers(self, info):
+        headers = dict(info.get('http_headers') or {})
+        try:
+            cookie_header = self.cookiejar.get_cookie_header(info['url'])
+            if cookie_header:
+                headers['Cookie'] = cookie_header
+        except AttributeError:
+            pass
+        return headers
+
+    def _reporter(self, name, tmpfilename, info):
+        """report(downloaded, total, status) that feeds this session's progress hooks"""
+        started = time.time()
+
+        def report(downloaded, total, status='downloading'):
+            elapsed = max(time.time() - started, 0.001)
+            speed = downloaded / elapsed
+            progress = {
+                'status': status,
+                'downloaded_bytes': downloaded,
+                'total_bytes': total,
+                'filename': name,
+                'tmpfilename': tmpfilename,
+                'elapsed': elapsed,
+                'speed': speed,
+                'eta': (total - downloaded) / speed if speed and total else None,
+                'info_dict': info
+            }
+            for hook in self._progress_hooks:
+                hook(progress)
+
+        return report
+
+    def _segmented_dl(self, name, info, connections):
+        tmpfilename = name + '.part'
+        downloader = segmented.SegmentedDownloader(
+            info['url'], tmpfilename, self._request_headers(info), connections=connections,
+            retries=self.params.get('retries'), limiter=throttle.CONNECTIONS
+        )
+        downloader.probe()
+        report = self._reporter(name, tmpfilename, info)
+
+        try:
+            total = downloader.download(report)
+        except BaseException:
+            if os.path.exists(tmpfilename):
+                os.remove(tmpfilename)
+            raise
+        finally:
+            metrics.retries.inc(downloader.range_retries)
+        os.replace(tmpfilename, name)
+        report(total, total, 'finished')
+        return True, True
+
+    def _streaming_dl(self, name, info):
+        formats = [
+            dict(fmt, http_headers=self._request_headers(fmt)) for fmt in info['requested_formats']
+        ]
+        report = self._reporter(name, name + '.part', info)
+        remux = next((pp for pp in self._pps['post_process'] if isinstance(pp, postprocess.VideoRemuxPP)), None)
+        thumbnail, metadata_args = remux.streaming_extras(info) if remux else (None, [])
+        merge = pipemerge.StreamingMerge(FFmpegPostProcessor(self).executable, formats, name, report,
+                                         thumbnail, metadata_args)
+        total = merge.run()
+        # Tells VideoRemuxPP there is nothing left to write
+        info['__stream_merged'] = True
+        report(total, total, 'finished')
+        return True, True
+
+class SessionPool:
+    """Keeps one configured YoutubeDL per worker thread and purpose.
+
+    Building a YoutubeDL loads the extractor registry, cookie jar and
+    request handlers; reusing it also keeps keep-alive connections and TLS
+    sessions in its handler's pool. Per-item settings (output template,
+    format) are applied to an existing instance with configure().
+    """
+
+    def __init__(self, ydl_class=None, track_connections: bool = False):
+        self.ydl_class = ydl_class or SessionYoutubeDL
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = []
+        self._generation = 0
+        self.created = 0
+        self.reused = 0
+        self.setup_seconds = 0.0
+        self.connections = None
+        if track_connections:
+            self.connections = ConnectionCounter()
+            pool_logger = logging.getLogger('urllib3.connectionpool')
+            pool_logger.setLevel(logging.DEBUG)
+            pool_logger.addHandler(self.connections)
+
+    def get(self, name: str, opts: dict):
+        """Return this thread's YoutubeDL for name, building it from opts on first use."""
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None or self._local.generation != self._generation:
+            sessions = self._local.sessions = {}
+            self._local.generation = self._generation
+
+        ydl = sessions.get(name)
+        if ydl is not None:
+            with self._lock:
+                self.reused += 1
+            return ydl
+
+        started = time.perf_counter()
+        ydl = self.ydl_class(opts)
+        elapsed = time.perf_counter() - started
+        sessions[name] = ydl
+        with self._lock:
+            self._sessions.append(ydl)
+            self.created += 1
+            self.setup_seconds += elapsed
+        return ydl
+
+    @staticmethod
+    def configure(ydl, outtmpl: Optional[str] = None, format_spec: Optional[str] = None):
+        """Apply per-item options to an existing YoutubeDL."""
+        if outtmpl is not None:
+            templates = ydl.params.get('outtmpl')
+            if isinstance(templates, dict):
+                templates['default'] = outtmpl
+            else:
+                ydl.params['outtmpl'] = {'default': outtmpl}
+        if format_spec is not None and format_spec != ydl.params.get('format'):
+            ydl.params['format'] = format_spec
+            ydl.format_selector = ydl.build_format_selector(format_spec)
+        return ydl
+
+    def reset(self):
+        """Close every session; threads build fresh ones on their next get()."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+            self._generation += 1
+        for ydl in sessions:
+            try:
+                ydl.close()
+            except Exception:
+                pass
+
+    def close(self):
+        self.reset()
+        if self.connections:
+            logging.getLogger('urllib3.connectionpool').removeHandler(self.connections)
+
+    def stats(self) -> dict:
+        return {
+            'created': self.created,
+            'reused': self.reused,
+            'setup_seconds': round(self.setup_seconds, 3),
+            'connections_opened': self.connections.opened if self.connections else None
+        }
@@ -0,0 +1,94 @@
+import errno
+import os
+import shutil
+import tempfile
+from typing import Optional
+from . import config
+
+def publish(source: str, target: str) -> str:
+    """Move source to target so readers never see a partial file.
+
+    On the same filesystem this is a rename. Across filesystems the file is
+    copied to a hidden temporary name next to the target, flushed, and then
+    renamed over the target. Returns 'rename' or 'copy'.
+    """
+    os.makedirs(os.path.dirname(target) or '.', exist_ok=True)
+    try:
+        os.replace(source, target)
+        return 'rename'
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    directory, name = os.path.split(target)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix='.publish', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as target_file, open(source, 'rb') as source_file:
+            shutil.copyfileobj(source_file, target_file, 1024 * 1024)
+            target_file.flush()
+            os.fsync(target_file.fileno())
+        shutil.copystat(source, tmp_path)
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.remove(source)
+    return 'copy'
+
+class ScratchArea:
+    """Per-job scratch directory for fragments, .part files and ffmpeg intermediates.
+
+    A video is only staged here when its expected footprint fits within
+    max_bytes and the free space of the scratch filesystem; otherwise it is
+    written straight to the output folder as before. The directory is
+    emptied after every video, so usage never exceeds one video's files.
+    """
+
+    def __init__(self, root: str, max_bytes: Optional[int] = None):
+        os.makedirs(root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix='job-', dir=root)
+        self.max_bytes = config.SCRATCH_MAX_BYTES if max_bytes is None else max_bytes
+        self.published = {'rename': 0, 'copy': 0}
+        self.skipped = 0
+
+    def usage(self) -> int:
+        total = 0
+        for directory, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    pass
+        return total
+
+    def fits(self, expected_bytes: Optional[int]) -> bool:
+        """Whether a video needing expected_bytes of scratch can be staged here"""
+        needed = expected_bytes or 0
+        fits = (self.usage() + needed <= self.max_bytes
+                and shutil.disk_usage(self.path).free >= needed)
+        if not fits:
+            self.skipped += 1
+        return fits
+
+    def publish(self, source: str, target: str) -> str:
+        mode = publish(source, target)
+        self.published[mode] += 1
+        return mode
+
+    def contains(self, path: str) -> bool:
+        return os.path.abspath(path).startswith(self.path + os.sep)
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                print(f"Error cleaning scratch file {path}: {str(e)}")
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
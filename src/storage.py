@@ -0,0 +1,427 @@
+import datetime
+import hashlib
+import hmac
+import http.client
+import http.server
+import os
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Optional
+from . import config
+from . import metrics
+from . import throttle
+
+class StorageError(Exception):
+    pass
+
+class OutputBackend:
+    """Destination for finished outputs.
+
+    submit() queues a finished file and returns at once, so uploads overlap
+    with the next downloads; finish() waits for everything queued.
+    """
+
+    def submit(self, path: str, relpath: str, after: Optional[Future] = None) -> Future:
+        raise NotImplementedError
+
+    def finish(self) -> list:
+        return []
+
+# AWS Signature Version 4
+
+def _hmac(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
+
+def _quote(value: str, safe: str = '-_.~') -> str:
+    return urllib.parse.quote(value, safe=safe)
+
+def sign_request(method: str, host: str, path: str, query: dict, headers: dict,
+                 payload_hash: str, access_key: str, secret_key: str, region: str,
+                 now: Optional[datetime.datetime] = None, service: str = 's3') -> dict:
+    """Headers to add to a request (x-amz-date, x-amz-content-sha256, Authorization)."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date = amz_date[:8]
+
+    signed = {key.lower(): str(value).strip() for key, value in headers.items()}
+    signed.update({'host': host, 'x-amz-date': amz_date, 'x-amz-content-sha256': payload_hash})
+    header_names = ';'.join(sorted(signed))
+    canonical_request = '\n'.join([
+        method,
+        _quote(path, safe='/-_.~'),
+        '&'.join(f"{_quote(key)}={_quote(str(value))}" for key, value in sorted(query.items())),
+        ''.join(f"{key}:{signed[key]}\n" for key in sorted(signed)),
+        header_names,
+        payload_hash
+    ])
+    scope = f"{date}/{region}/{service}/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    ])
+    key = _hmac(('AWS4' + secret_key).encode('utf-8'), date)
+    for part in (region, service, 'aws4_request'):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return {
+        'x-amz-date': amz_date,
+        'x-amz-content-sha256': payload_hash,
+        'Authorization': (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                          f"SignedHeaders={header_names}, Signature={signature}")
+    }
+
+class S3Client:
+    """Minimal S3 client over keep-alive http.client connections (one per thread).
+
+    Uses path-style addressing (endpoint/bucket/key), which AWS, MinIO and
+    most S3-compatible stores accept.
+    """
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, region: str = 'us-east-1'):
+        parsed = urllib.parse.urlsplit(endpoint)
+        self.scheme = parsed.scheme or 'https'
+        self.host = parsed.netloc
+        self.base_path = parsed.path.rstrip('/')
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = (http.client.HTTPSConnection if self.scheme == 'https'
+                                else http.client.HTTPConnection)
+            connection = self._local.connection = connection_class(self.host, timeout=config.S3_TIMEOUT)
+        return connection
+
+    def _drop_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+        metrics.retries.inc()
+        delay = throttle.retry_after_seconds(retry_after)
+        return delay if delay is not None else min(2 ** attempt, 30) * 0.25
+
+    def request(self, method: str, path: str, query: Optional[dict] = None, body: bytes = b'',
+                headers: Optional[dict] = None):
+        """Send a signed request; returns (status, headers, body). Raises StorageError on failure."""
+        query = query or {}
+        path = f"{self.base_path}{path}"
+        headers = dict(headers or {})
+        headers.update(sign_request(
+            method, self.host, path, query, headers, hashlib.sha256(body).hexdigest(),
+            self.access_key, self.secret_key, self.region
+        ))
+        url = _quote(path, safe='/-_.~')
+        if query:
+            url += '?' + '&'.join(
+                f"{_quote(key)}={_quote(str(value))}" if value != '' else _quote(key)
+                for key, value in sorted(query.items())
+            )
+
+        for attempt in range(config.S3_RETRIES + 1):
+            try:
+                connection = self._connection()
+                connection.request(method, url, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                self._drop_connection()
+                if attempt >= config.S3_RETRIES:
+                    raise StorageError(f"S3 {method} {path} failed: {str(e)}")
+                time.sleep(self._retry_delay(attempt))
+                continue
+            # 5xx, including 503 SlowDown, is worth retrying; 4xx is not
+            if response.status < 500 or attempt >= config.S3_RETRIES:
+                break
+            time.sleep(self._retry_delay(attempt, response.getheader('Retry-After')))
+
+        if response.status >= 300:
+            raise StorageError(f"S3 {method} {path} failed: HTTP {response.status} {data[:200]!r}")
+        return response.status, dict(response.getheaders()), data
+
+class S3Backend(OutputBackend):
+    """Uploads finished outputs to an S3-compatible bucket in the background.
+
+    Files up to part_size go up in one PUT, larger ones as a multipart upload
+    whose parts are sent in parallel. Once the store confirms the object (and
+    a HEAD shows the expected size) the local copy is deleted. At most
+    max_pending files wait for upload; submit() blocks beyond that, so local
+    disk use stays bounded when uploads are slower than downloads.
+    """
+
+    def __init__(self, endpoint: str, bucket: str, access_key: str, secret_key: str,
+                 prefix: str = '', region: Optional[str] = None, part_size: Optional[int] = None,
+                 part_workers: Optional[int] = None, upload_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, delete_local: Optional[bool] = None):
+        self.client = S3Client(endpoint, access_key, secret_key, region or config.S3_REGION)
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.part_size = part_size or config.S3_PART_SIZE
+        self.delete_local = config.S3_DELETE_LOCAL if delete_local is None else delete_local
+        self._uploads = ThreadPoolExecutor(max_workers=upload_workers or config.S3_UPLOAD_WORKERS)
+        self._parts = ThreadPoolExecutor(max_workers=part_workers or config.S3_PART_WORKERS)
+        self._slots = threading.BoundedSemaphore(max_pending or config.S3_MAX_PENDING)
+        self._futures = []
+        self.uploaded = []
+
+    def object_key(self, relpath: str) -> str:
+        key = relpath.replace(os.sep, '/').lstrip('/')
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _path(self, key: str) -> str:
+        return f"/{self.bucket}/{key}"
+
+    def submit(self, path, relpath, after=None):
+        self._slots.acquire()
+        try:
+            future = self._uploads.submit(self._upload, path, self.object_key(relpath), after)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+        return future
+
+    def _upload(self, path: str, key: str, after: Optional[Future]) -> str:
+        if after is not None:
+            # e.g. verification, which still needs the local file; a file that
+            # fails it is not uploaded, and the local copy stays for inspection
+            try:
+                verified = after.result()
+            except Exception as e:
+                raise StorageError(f"Not uploading {path}: verification failed: {str(e)}")
+            if isinstance(verified, dict) and not verified.get('ok', True):
+                problems = ', '.join(verified.get('problems') or [])
+                raise StorageError(f"Not uploading {path}: verification failed: {problems}")
+        size = os.path.getsize(path)
+        if size <= self.part_size:
+            with open(path, 'rb') as f:
+                self.client.request('PUT', self._path(key), body=f.read())
+        else:
+            self._multipart_upload(path, key, size)
+
+        _, headers, _ = self.client.request('HEAD', self._path(key))
+        remote_size = int({k.lower(): v for k, v in headers.items()}.get('content-length', -1))
+        if remote_size != size:
+            raise StorageError(f"Uploaded size mismatch for {key}: {remote_size} != {size}")
+        metrics.uploaded_bytes.inc(size)
+        if self.delete_local:
+            os.remove(path)
+        self.uploaded.append(key)
+        return key
+
+    def _multipart_upload(self, path: str, key: str, size: int):
+        _, _, body = self.client.request('POST', self._path(key), {'uploads': ''})
+        match = re.search(rb'<UploadId>([^<]+)</UploadId>', body)
+        if not match:
+            raise StorageError(f"No UploadId for {key}")
+        upload_id = match.group(1).decode('utf-8')
+
+        try:
+            futures = [
+                self._parts.submit(self._upload_part, path, key, upload_id, number, offset,
+                                   min(self.part_size, size - offset))
+                for number, offset in enumerate(range(0, size, self.part_size), start=1)
+            ]
+            etags = [future.result() for future in futures]
+            parts = ''.join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            _, _, body = self.client.request(
+                'POST', self._path(key), {'uploadId': upload_id},
+                body=f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode('utf-8')
+            )
+            # S3 can report a failed completion inside a 200 response
+            if b'<Error>' in body:
+                raise StorageError(f"Completing upload of {key} failed: {body[:200]!r}")
+        except BaseException:
+            try:
+                self.client.request('DELETE', self._path(key), {'uploadId': upload_id})
+            except StorageError:
+                pass
+            raise
+
+    def _upload_part(self, path: str, key: str, upload_id: str, number: int, offset: int, length: int) -> str:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        _, headers, _ = self.client.request(
+            'PUT', self._path(key), {'partNumber': number, 'uploadId': upload_id}, body=data
+        )
+        etag = {k.lower(): v for k, v in headers.items()}.get('etag')
+        if not etag:
+            raise StorageError(f"No ETag for part {number} of {key}")
+        return etag
+
+    def finish(self) -> list:
+        """Wait for queued uploads and return the uploaded keys."""
+        for future in self._futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error uploading output: {str(e)}")
+        self._futures = []
+        self._uploads.shutdown(wait=True)
+        self._parts.shutdown(wait=True)
+        return self.uploaded
+
+class _S3Handler(http.server.BaseHTTPRequestHandler):
+    """Path-style S3 subset used by S3Backend: objects, multipart uploads and HEAD."""
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status: int, body: bytes = b'', headers: Optional[dict] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if 'Content-Length' not in (headers or {}):
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _error(self, status: int, code: str):
+        self._reply(status, f"<Error><Code>{code}</Code></Error>".encode('utf-8'))
+
+    def _authorized(self, path: str, query: dict, body: bytes) -> bool:
+        server = self.server
+        match = re.match(r'AWS4-HMAC-SHA256 Credential=[^/]+/\d{8}/([^/]+)/s3/aws4_request, '
+                         r'SignedHeaders=([^,]+), Signature=(\w+)', self.headers.get('Authorization') or '')
+        payload_hash = self.headers.get('x-amz-content-sha256')
+        if not match or payload_hash != hashlib.sha256(body).hexdigest():
+            return False
+        try:
+            now = datetime.datetime.strptime(self.headers.get('x-amz-date') or '', '%Y%m%dT%H%M%SZ')
+        except ValueError:
+            return False
+        automatic = ('host', 'x-amz-date', 'x-amz-content-sha256')
+        headers = {name: self.headers.get(name, '') for name in match.group(2).split(';') if name not in automatic}
+        expected = sign_request(
+            self.command, self.headers.get('Host'), path, query, headers, payload_hash,
+            server.access_key, server.secret_key, match.group(1), now=now.replace(tzinfo=datetime.timezone.utc)
+        )
+        return hmac.compare_digest(expected['Authorization'], self.headers['Authorization'])
+
+    def _handle(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(parsed.path)
+        query = {key: values[0] for key, values in urllib.parse.parse_qs(parsed.query, keep_blank_values=True).items()}
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, path, query))
+            failure = server.failures.pop(0) if server.failures else None
+        if failure:
+            return self._reply(failure, b'<Error><Code>SlowDown</Code></Error>', {'Retry-After': '0'})
+        if not self._authorized(path, query, body):
+            return self._error(403, 'SignatureDoesNotMatch')
+
+        with server.lock:
+            if self.command == 'PUT' and 'uploadId' in query:
+                parts = server.uploads.get(query['uploadId'])
+                if parts is None:
+                    return self._error(404, 'NoSuchUpload')
+                parts[int(query['partNumber'])] = body
+                return self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+            if self.command == 'PUT':
+                server.objects[path] = body
+                return self._reply(200, headers={'ETag': f'"{hashlib.md5(body).hexdigest()}"'})
+            if self.command == 'POST' and 'uploads' in query:
+                upload_id = f"upload-{len(server.uploads) + 1}"
+                server.uploads[upload_id] = {}
+                return self._reply(200, (f"<InitiateMultipartUploadResult><UploadId>{upload_id}"
+                                         f"</UploadId></InitiateMultipartUploadResult>").encode('utf-8'))
+            if self.command == 'POST' and 'uploadId' in query:
+                parts = server.uploads.pop(query['uploadId'], None)
+                numbers = [int(number) for number in re.findall(rb'<PartNumber>(\d+)</PartNumber>', body)]
+                if parts is None or any(number not in parts for number in numbers):
+                    return self._error(400, 'InvalidPart')
+                server.objects[path] = b''.join(parts[number] for number in numbers)
+                return self._reply(200, b'<CompleteMultipartUploadResult/>')
+            if self.command == 'DELETE':
+                if 'uploadId' in query:
+                    server.uploads.pop(query['uploadId'], None)
+                else:
+                    server.objects.pop(path, None)
+                return self._reply(204)
+            if path not in server.objects:
+                return self._error(404, 'NoSuchKey')
+            data = server.objects[path]
+            return self._reply(200, data, {'Content-Length': str(len(data))})
+
+    do_GET = do_HEAD = do_PUT = do_POST = do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        pass
+
+class LocalS3Server:
+    """In-memory S3-compatible stand-in (a tiny MinIO) for testing the S3 backend offline.
+
+    Requests must carry a valid Signature V4 for access_key/secret_key.
+    objects maps "/bucket/key" to bytes; fail(status, count) answers the
+    next count requests with status (e.g. 503 SlowDown) to exercise retries.
+    """
+
+    def __init__(self, access_key: str = 'test', secret_key: str = 'test-secret',
+                 host: str = '127.0.0.1', port: int = 0):
+        self.httpd = http.server.ThreadingHTTPServer((host, port), _S3Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.access_key = access_key
+        self.httpd.secret_key = secret_key
+        self.httpd.lock = threading.Lock()
+        self.httpd.objects = {}
+        self.httpd.uploads = {}
+        self.httpd.failures = []
+        self.httpd.requests = []
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    @property
+    def objects(self) -> Dict[str, bytes]:
+        return self.httpd.objects
+
+    @property
+    def requests(self) -> list:
+        """(method, path, query) of every request received"""
+        return self.httpd.requests
+
+    def fail(self, status: int = 503, count: int = 1):
+        with self.httpd.lock:
+            self.httpd.failures.extend([status] * count)
+
+    def start(self) -> 'LocalS3Server':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='local-s3', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def make_backend() -> Optional[OutputBackend]:
+    """Backend selected by config.STORAGE_BACKEND; None keeps outputs on local disk."""
+    if config.STORAGE_BACKEND == 's3':
+        if not (config.S3_ENDPOINT and config.S3_BUCKET):
+            raise ValueError("S3_ENDPOINT and S3_BUCKET must be set for the s3 storage backend")
+        return S3Backend(config.S3_ENDPOINT, config.S3_BUCKET, config.S3_ACCESS_KEY,
+                         config.S3_SECRET_KEY, prefix=config.S3_PREFIX)
+    if config.STORAGE_BACKEND not in (None, 'local'):
+        raise ValueError(f"Unknown storage backend: {config.STORAGE_BACKEND}")
+    return None
@@ -0,0 +1,353 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from . import config
+from . import entries
+from . import metrics
+from . import throttle
+from . import urls
+from .daemon import JOB_OPTIONS, JOB_SETTINGS
+from .downloader import PlaylistDownloader
+from .entries import PlaylistEntry
+
+class Subscription:
+    """One playlist or channel to mirror, as listed in the subscriptions file."""
+
+    def __init__(self, url: str, interval: Optional[float] = None, options: Optional[dict] = None):
+        self.url = url
+        self.interval = interval or config.SUBSCRIPTION_DEFAULT_INTERVAL
+        self.options = options or {}
+        self.next_check = 0.0
+        self.running = False
+
+def load_subscriptions(path: str) -> List[Subscription]:
+    """Read a JSON list of {"url": ..., "interval": seconds, <job options>} objects.
+
+    Only the first of several entries for the same playlist or channel is
+    kept, however its URL is written.
+    """
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    subscriptions = []
+    seen = set()
+    for item in items:
+        parsed = urls.parse(item['url'])
+        key = parsed.url if parsed else item['url']
+        if key in seen:
+            print(f"Skipping duplicate subscription {item['url']}")
+            continue
+        seen.add(key)
+        options = {key: item[key] for key in JOB_OPTIONS + JOB_SETTINGS if key in item}
+        subscriptions.append(Subscription(item['url'], item.get('interval'), options))
+    return subscriptions
+
+class SnapshotStore:
+    """What each subscription looked like when it was last fully mirrored.
+
+    For every URL it keeps the IDs on the first page of the listing and the
+    listing's entry count, plus every video ID that was downloaded (or
+    linked from the library) with the index it was saved under, so a check
+    can tell new entries from known ones without enumerating the whole
+    listing, and new entries get indexes no earlier file uses.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or config.SUBSCRIPTION_STATE_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                url TEXT PRIMARY KEY,
+                first_page TEXT NOT NULL,
+                entry_count INTEGER,
+                checked REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS known (
+                url TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                item_index INTEGER,
+                PRIMARY KEY (url, video_id)
+            );
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(known)")}
+        if 'item_index' not in columns:
+            self.conn.execute("ALTER TABLE known ADD COLUMN item_index INTEGER")
+        self.conn.commit()
+
+    def snapshot(self, url: str):
+        """(first page IDs, entry count) or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT first_page, entry_count FROM snapshots WHERE url = ?", (url,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def known_ids(self, url: str) -> set:
+        with self._lock:
+            return {row[0] for row in self.conn.execute("SELECT video_id FROM known WHERE url = ?", (url,))}
+
+    def last_index(self, url: str) -> int:
+        """Highest index used by a mirrored entry of url (rows from before indexes were kept count as one each)"""
+        with self._lock:
+            highest, count = self.conn.execute(
+                "SELECT MAX(item_index), COUNT(*) FROM known WHERE url = ?", (url,)
+            ).fetchone()
+        return max(highest or 0, count)
+
+    def mark_known(self, url: str, known_entries: List[PlaylistEntry]):
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO known (url, video_id, item_index) VALUES (?, ?, ?)",
+                [(url, entry.id, entry.index) for entry in known_entries]
+            )
+            self.conn.commit()
+
+    def save_snapshot(self, url: str, first_page: List[str], entry_count: Optional[int]):
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots (url, first_page, entry_count, checked) VALUES (?, ?, ?, ?)",
+                (url, json.dumps(first_page), entry_count, time.time())
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class CheckResult:
+    def __init__(self, title: Optional[str], new_entries: List[PlaylistEntry],
+                 first_page: List[str], entry_count: Optional[int], entries_read: int):
+        self.title = title
+        self.new_entries = new_entries
+        self.first_page = first_page
+        self.entry_count = entry_count
+        self.entries_read = entries_read
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.new_entries)
+
+def check_subscription(downloader, store: SnapshotStore) -> CheckResult:
+    """Find the entries of downloader.url that have not been mirrored yet.
+
+    The listing is read unprocessed, so yt-dlp fetches its pages only as
+    entries are consumed. When the first page and the entry count match the
+    stored snapshot nothing has changed and no further page is read.
+    Otherwise paging stops after SUBSCRIPTION_KNOWN_RUN known IDs in a row,
+    unless the entry count says more new entries are still to come (e.g. a
+    playlist that appends at the end).
+
+    New entries are numbered after the highest index already mirrored, so
+    numbered filenames never repeat. When they are all listed ahead of the
+    known ones (a channel, newest first) they are numbered from the bottom
+    up, which keeps the numbers in upload order.
+    """
+    url = downloader.url
+    ydl = downloader.sessions.get('flat', {'quiet': True, 'extract_flat': True})
+    with throttle.METADATA.request(on_throttle=downloader._report_throttle):
+        listing = ydl.extract_info(downloader._listing_url(), download=False, process=False)
+        if listing and listing.get('_type') in ('url', 'url_transparent'):
+            listing = ydl.extract_info(listing['url'], download=False, process=False)
+    if not listing or 'entries' not in listing:
+        raise ValueError(f"No entries found for {url}")
+
+    page_size = config.SUBSCRIPTION_PAGE_SIZE
+    entry_count = listing.get('playlist_count')
+    snapshot = store.snapshot(url)
+    known = store.known_ids(url)
+    expected_new = (entry_count - snapshot[1]
+                    if snapshot and entry_count is not None and snapshot[1] is not None else None)
+
+    first_page = []
+    new_entries = []
+    first_known = None
+    known_run = 0
+    position = 0
+    for raw_entry in listing['entries']:
+        if not raw_entry or not raw_entry.get('id'):
+            continue
+        position += 1
+        video_id = raw_entry['id']
+        if position <= page_size:
+            first_page.append(video_id)
+            if (position == page_size and snapshot is not None
+                    and first_page == snapshot[0] and entry_count == snapshot[1]):
+                break
+        if video_id in known:
+            if first_known is None:
+                first_known = position
+            known_run += 1
+            if (known_run >= config.SUBSCRIPTION_KNOWN_RUN and position >= page_size
+                    and (expected_new is None or len(new_entries) >= expected_new)):
+                break
+        else:
+            known_run = 0
+            new_entries.append((position, raw_entry))
+
+    if first_known is not None and all(new_position < first_known for new_position, _ in new_entries):
+        new_entries.reverse()
+    last_index = store.last_index(url)
+    new_entries = [
+        PlaylistEntry.from_info(last_index + number, raw_entry)
+        for number, (_, raw_entry) in enumerate(new_entries, 1)
+    ]
+    return CheckResult(listing.get('title'), new_entries, first_page, entry_count, position)
+
+class SubscriptionScheduler:
+    """Checks subscriptions when they are due and downloads only their new entries.
+
+    At most check_workers listings are checked at once; new entries go to a
+    separate pool of download_workers, each running one PlaylistDownloader
+    over just those entries. A subscription is not checked again while its
+    previous check or download is still running. The snapshot is saved only
+    when every new entry was downloaded, so failures are retried on the next
+    check.
+    """
+
+    def __init__(self, subscriptions: List[Subscription], state_path: Optional[str] = None,
+                 check_workers: Optional[int] = None, download_workers: Optional[int] = None):
+        self.subscriptions = subscriptions
+        self.store = SnapshotStore(state_path)
+        self._checks = ThreadPoolExecutor(max_workers=check_workers or config.SUBSCRIPTION_CHECK_WORKERS)
+        self._downloads = ThreadPoolExecutor(max_workers=download_workers or config.SUBSCRIPTION_DOWNLOAD_WORKERS)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._futures = []
+
+    def _make_downloader(self, subscription: Subscription) -> PlaylistDownloader:
+        options = subscription.options
+        downloader = PlaylistDownloader(
+            subscription.url, **{key: value for key, value in options.items() if key in JOB_OPTIONS}
+        )
+        for key in JOB_SETTINGS:
+            if key in options:
+                setattr(downloader, key, options[key])
+        return downloader
+
+    def _check(self, subscription: Subscription):
+        try:
+            downloader = self._make_downloader(subscription)
+            try:
+                result = check_subscription(downloader, self.store)
+            finally:
+                downloader.sessions.close()
+            print(f"Checked {subscription.url}: {len(result.new_entries)} new "
+                  f"({result.entries_read} entries read)")
+            if not result.changed:
+                self.store.save_snapshot(subscription.url, result.first_page, result.entry_count)
+                self._finish(subscription)
+                return
+            self._track(self._downloads.submit(self._download, subscription, downloader, result))
+        except Exception as e:
+            print(f"Error checking subscription {subscription.url}: {str(e)}")
+            self._finish(subscription)
+
+    def _download(self, subscription: Subscription, downloader: PlaylistDownloader, result: CheckResult):
+        try:
+            downloader.preset_entries = result.new_entries
+            downloader.playlist_title = result.title
+            with throttle.VIDEOS.request(measure_latency=False):
+                if not self._stopped.is_set():
+                    downloader.download_playlist()
+        except Exception as e:
+            print(f"Error downloading subscription {subscription.url}: {str(e)}")
+        finally:
+            # Also after a cancel or failure partway, so the videos that finished are not downloaded again
+            self._record(subscription, result)
+            self._finish(subscription)
+
+    def _record(self, subscription: Subscription, result: CheckResult):
+        try:
+            finished = [
+                entry for entry in result.new_entries if entry.status in (entries.DONE, entries.LINKED)
+            ]
+            self.store.mark_known(subscription.url, finished)
+            if len(finished) == len(result.new_entries):
+                self.store.save_snapshot(subscription.url, result.first_page, result.entry_count)
+        except Exception as e:
+            print(f"Error recording subscription {subscription.url}: {str(e)}")
+
+    def _finish(self, subscription: Subscription):
+        with self._lock:
+            subscription.running = False
+            subscription.next_check = time.time() + subscription.interval
+
+    def _track(self, future):
+        with self._lock:
+            self._futures = [f for f in self._futures if not f.done()]
+            self._futures.append(future)
+
+    def check_due(self) -> int:
+        """Start checks for every due subscription; returns how many were started."""
+        now = time.time()
+        started = 0
+        for subscription in self.subscriptions:
+            with self._lock:
+                if subscription.running or subscription.next_check > now:
+                    continue
+                subscription.running = True
+            self._track(self._checks.submit(self._check, subscription))
+            started += 1
+        return started
+
+    def wait(self):
+        """Wait until every started check and download has finished."""
+        while True:
+            with self._lock:
+                pending = [f for f in self._futures if not f.done()]
+            if not pending:
+                return
+            for future in pending:
+                future.result()
+
+    def run_once(self):
+        self.check_due()
+        self.wait()
+
+    def run_forever(self):
+        while not self._stopped.is_set():
+            self.check_due()
+            with self._lock:
+                idle = [s.next_check for s in self.subscriptions if not s.running]
+            delay = min(idle) - time.time() if idle else config.SUBSCRIPTION_POLL_INTERVAL
+            self._stopped.wait(min(max(delay, 1.0), config.SUBSCRIPTION_POLL_INTERVAL))
+
+    def stop(self):
+        self._stopped.set()
+
+    def close(self):
+        self.stop()
+        self._checks.shutdown(wait=True)
+        self._downloads.shutdown(wait=True)
+        self.store.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mirror playlists and channels listed in a subscriptions file")
+    parser.add_argument('subscriptions', help="JSON list of {\"url\": ..., \"interval\": seconds, ...}")
+    parser.add_argument('--state', default=config.SUBSCRIPTION_STATE_PATH)
+    parser.add_argument('--check-workers', type=int, default=config.SUBSCRIPTION_CHECK_WORKERS)
+    parser.add_argument('--download-workers', type=int, default=config.SUBSCRIPTION_DOWNLOAD_WORKERS)
+    parser.add_argument('--once', action='store_true', help="Check every subscription once and exit")
+    args = parser.parse_args(argv)
+
+    metrics.start_exporters()
+    scheduler = SubscriptionScheduler(load_subscriptions(args.subscriptions), args.state,
+                                      args.check_workers, args.download_workers)
+    try:
+        if args.once:
+            scheduler.run_once()
+        else:
+            scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import email.utils
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+from . import config
+from . import metrics
+
+# Statuses YouTube's servers answer with when a client is being rate limited
+THROTTLE_STATUSES = (429, 403)
+_STATUS_RE = re.compile(r'HTTP Error (\d{3})')
+
+def retry_after_seconds(value) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or HTTP date)."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if value.isdigit():
+        seconds = float(value)
+    else:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), config.THROTTLE_MAX_PAUSE)
+
+def classify(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """(is_throttled, retry_after) for an exception raised by yt-dlp or our downloaders."""
+    seen = set()
+    pending = [error]
+    while pending:
+        current = pending.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        response = getattr(current, 'response', None)
+        status = getattr(current, 'status', None) or getattr(response, 'status', None)
+        if status in THROTTLE_STATUSES:
+            headers = getattr(response, 'headers', None) or getattr(current, 'headers', None) or {}
+            retry_after = getattr(current, 'retry_after', None)
+            if retry_after is None:
+                retry_after = retry_after_seconds(headers.get('Retry-After'))
+            return True, retry_after
+        # yt-dlp wraps the original error in DownloadError.exc_info
+        exc_info = getattr(current, 'exc_info', None)
+        if exc_info and len(exc_info) > 1:
+            pending.append(exc_info[1])
+        pending.extend([current.__cause__, current.__context__])
+
+    match = _STATUS_RE.search(str(error))
+    return bool(match and int(match.group(1)) in THROTTLE_STATUSES), None
+
+class AdaptiveLimiter:
+    """Concurrency limit adjusted by additive increase / multiplicative decrease.
+
+    Each successful request counts towards raising the limit by one; after
+    `limit` successes in a row the limit grows (so roughly one step per round
+    of requests), unless latency has climbed well above its baseline. A
+    throttling response halves the limit and, with Retry-After, pauses new
+    requests until the server allows them again. Repeated signals within the
+    cooldown count as one decrease, since they come from the same burst.
+    """
+
+    def __init__(self, name: str, maximum: int, minimum: int = 1):
+        self.name = name
+        self.maximum = max(minimum, maximum)
+        self.minimum = minimum
+        self.limit = self.maximum
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._successes = 0
+        self._baseline_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def pause_remaining(self) -> float:
+        return max(0.0, self.paused_until - time.time())
+
+    def wait(self) -> int:
+        """Wait out any Retry-After pause and return the current limit."""
+        with self._condition:
+            while self.pause_remaining() > 0:
+                self._condition.wait(self.pause_remaining())
+            return self.limit
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit or self.pause_remaining() > 0:
+                self._condition.wait(self.pause_remaining() or None)
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: Optional[float] = None):
+        with self._condition:
+            if latency is not None:
+                if self._baseline_latency is None:
+                    self._baseline_latency = latency
+                else:
+                    self._baseline_latency = min(latency, self._baseline_latency * 0.9 + latency * 0.1)
+                if latency > self._baseline_latency * config.THROTTLE_LATENCY_FACTOR:
+                    # Slow responses are an early sign of congestion; hold the limit
+                    self._successes = 0
+                    return
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_congestion(self) -> bool:
+        """Cut the limit after an error or retry. Returns True if it changed."""
+        with self._condition:
+            self._successes = 0
+            now = time.time()
+            if now - self._last_decrease < config.THROTTLE_COOLDOWN:
+                return False
+            self._last_decrease = now
+            reduced = max(self.minimum, int(self.limit * config.THROTTLE_DECREASE_FACTOR))
+            changed = reduced != self.limit
+            self.limit = reduced
+            return changed
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> bool:
+        """The server rate-limited a request: cut the limit and pause new requests."""
+        with self._condition:
+            self.throttled += 1
+            pause = config.THROTTLE_DEFAULT_PAUSE if retry_after is None else retry_after
+            self.paused_until = max(self.paused_until, time.time() + min(pause, config.THROTTLE_MAX_PAUSE))
+        changed = self.on_congestion()
+        if changed:
+            print(f"Server is throttling requests, {self.name} limit lowered to {self.limit}")
+        return changed
+
+    @contextmanager
+    def request(self, acquire: bool = True, measure_latency: bool = True,
+                on_throttle: Optional[Callable[['AdaptiveLimiter'], None]] = None):
+        """Run one request under the limit and feed its outcome back.
+
+        Whole-video downloads pass acquire=False (their parallelism is set per
+        file) and measure_latency=False (their duration depends on size).
+        """
+        if acquire:
+            self.acquire()
+        started = time.time()
+        try:
+            yield self
+        except Exception as e:
+            throttled, retry_after = classify(e)
+            if throttled:
+                self.on_throttle(retry_after)
+                if on_throttle:
+                    on_throttle(self)
+            raise
+        else:
+            self.on_success(time.time() - started if measure_latency else None)
+        finally:
+            if acquire:
+                self.release()
+
+    def retry_sleep(self, n: int) -> float:
+        """yt-dlp retry_sleep_functions hook (called as sleep_func(n=attempt)): every retry is a congestion signal."""
+        metrics.retries.inc()
+        self.on_congestion()
+        return max(self.pause_remaining(), min(2 ** n, 30) * 0.25)
+
+    def snapshot(self) -> dict:
+        return {
+            'limit': self.limit,
+            'maximum': self.maximum,
+            'in_flight': self.in_flight,
+            'paused_for': round(self.pause_remaining(), 1),
+            'throttled': self.throttled
+        }
+
+# Process-wide controllers, shared by every downloader and daemon job
+VIDEOS = AdaptiveLimiter('videos', config.DAEMON_MAX_JOBS)
+METADATA = AdaptiveLimiter('metadata', config.PREFETCH_WORKERS + 1)
+CONNECTIONS = AdaptiveLimiter('connections', config.THROTTLE_MAX_CONNECTIONS)
+LIMITERS = (VIDEOS, METADATA, CONNECTIONS)
+
+def snapshot() -> dict:
+    return {limiter.name: limiter.snapshot() for limiter in LIMITERS}
+
+metrics.REGISTRY.gauge(
+    'ytdl_concurrency_limit', 'Current adaptive concurrency limit',
+    lambda: {limiter.name: limiter.limit for limiter in LIMITERS}, 'controller')
+metrics.REGISTRY.gauge(
+    'ytdl_concurrency_in_flight', 'Requests currently running under each limit',
+    lambda: {limiter.name: limiter.in_flight for limiter in LIMITERS}, 'controller')
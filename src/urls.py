@@ -0,0 +1,165 @@
+import re
+import urllib.parse
+from typing import Iterable, List, Optional, Tuple
+
+VIDEO = 'video'
+PLAYLIST = 'playlist'
+CHANNEL = 'channel'
+
+_HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com'
+}
+_VIDEO_ID_RE = re.compile(r'[\w-]{11}')
+_PLAYLIST_ID_RE = re.compile(r'[\w-]{2,}')
+_TIMESTAMP_RE = re.compile(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s?)?')
+# Paths whose next part is a video ID
+_VIDEO_PATHS = ('shorts', 'live', 'embed', 'v', 'e')
+_CHANNEL_PATHS = ('channel', 'c', 'user')
+# A channel's root lists its tabs (as playlists); its uploads are the videos tab
+_DEFAULT_CHANNEL_TAB = 'videos'
+
+def video_url(video_id: str) -> str:
+    return f"https://youtube.com/watch?v={video_id}"
+
+def playlist_url(playlist_id: str) -> str:
+    return f"https://youtube.com/playlist?list={playlist_id}"
+
+def parse_timestamp(value: Optional[str]) -> Optional[int]:
+    """Seconds for a t=/start= value such as "90", "90s" or "1h2m3s"."""
+    match = _TIMESTAMP_RE.fullmatch(value or '')
+    if not value or not match:
+        return None
+    hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+def is_mix(playlist_id: Optional[str]) -> bool:
+    """Mixes (RD...) are generated around one video and do not end, so they are not downloaded as playlists."""
+    return bool(playlist_id) and playlist_id.startswith('RD')
+
+class YoutubeURL:
+    """What a YouTube URL points at, parsed from the URL alone.
+
+    kind is VIDEO, PLAYLIST or CHANNEL. A watch URL with a list= parameter
+    is a playlist (yt-dlp downloads the whole list for it) unless the list
+    is a mix; video_id, index and start_time are kept either way. url is
+    the canonical form, so equivalent URLs (youtu.be, shorts, music,
+    m.youtube.com, tracking parameters) compare equal. A channel URL
+    without a tab stands for its videos tab.
+    """
+
+    def __init__(self, kind: str, video_id: Optional[str] = None, playlist_id: Optional[str] = None,
+                 channel: Optional[str] = None, index: Optional[int] = None, start_time: Optional[int] = None):
+        self.kind = kind
+        self.video_id = video_id
+        self.playlist_id = playlist_id
+        self.channel = channel
+        self.index = index
+        self.start_time = start_time
+
+    @property
+    def is_playlist(self) -> bool:
+        return self.kind in (PLAYLIST, CHANNEL)
+
+    @property
+    def url(self) -> str:
+        if self.kind == VIDEO:
+            return video_url(self.video_id)
+        if self.kind == PLAYLIST:
+            return playlist_url(self.playlist_id)
+        return f"https://youtube.com/{self.channel}"
+
+    def __repr__(self):
+        return f"YoutubeURL({self.kind}, {self.url})"
+
+def _video_id(value: Optional[str]) -> Optional[str]:
+    return value if value and _VIDEO_ID_RE.fullmatch(value) else None
+
+def _playlist_id(value: Optional[str]) -> Optional[str]:
+    return value if value and _PLAYLIST_ID_RE.fullmatch(value) else None
+
+def _index(value: Optional[str]) -> Optional[int]:
+    return int(value) if value and value.isdigit() else None
+
+def parse(url: str) -> Optional[YoutubeURL]:
+    """Parse any YouTube watch, youtu.be, shorts, music, playlist or channel URL; None if it is not one."""
+    url = (url or '').strip()
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parts = urllib.parse.urlsplit(url)
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https'):
+        return None
+    host = (parts.hostname or '').lower()
+    query = urllib.parse.parse_qs(parts.query)
+    fragment = urllib.parse.parse_qs(parts.fragment)
+
+    def param(name: str, source=query) -> Optional[str]:
+        values = source.get(name)
+        return values[0] if values else None
+
+    path = [part for part in parts.path.split('/') if part]
+    playlist_id = _playlist_id(param('list'))
+    start_time = parse_timestamp(param('t') or param('start') or param('t', fragment))
+    index = _index(param('index'))
+
+    if host == 'youtu.be':
+        video_id = _video_id(path[0]) if path else None
+    elif host in _HOSTS:
+        if not path:
+            return None
+        head = path[0]
+        if head == 'watch':
+            video_id = _video_id(param('v') or (path[1] if len(path) > 1 else None))
+        elif head in _VIDEO_PATHS and len(path) > 1:
+            if head == 'embed' and path[1] == 'videoseries':
+                video_id = None
+            else:
+                video_id = _video_id(path[1])
+        elif head == 'playlist':
+            video_id = None
+        elif head == 'browse' and len(path) > 1 and path[1].startswith('VL'):
+            # music.youtube.com/browse/VL<playlist id>
+            video_id = None
+            playlist_id = _playlist_id(path[1][2:])
+        elif head.startswith('@') or (head in _CHANNEL_PATHS and len(path) > 1):
+            channel = path[:1] if head.startswith('@') else path[:2]
+            tab = path[len(channel)].lower() if len(path) > len(channel) else _DEFAULT_CHANNEL_TAB
+            if head.startswith('@'):
+                # Handles are case-insensitive
+                channel = [head.lower()]
+            # Different tabs list different things, so an explicit tab stays part of the URL
+            return YoutubeURL(CHANNEL, channel='/'.join(channel + [tab]))
+        else:
+            return None
+    else:
+        return None
+
+    if playlist_id and not (video_id and is_mix(playlist_id)):
+        return YoutubeURL(PLAYLIST, video_id, playlist_id, index=index, start_time=start_time)
+    if video_id:
+        return YoutubeURL(VIDEO, video_id, playlist_id, index=index, start_time=start_time)
+    return None
+
+def normalize_batch(batch: Iterable[str]) -> Tuple[List[YoutubeURL], List[str]]:
+    """Parse a batch of URLs, keeping the first of each group of equivalent ones.
+
+    Returns (unique parsed URLs in input order, URLs that are not YouTube
+    URLs). Blank lines are ignored. Nothing here touches the network, so
+    duplicates are dropped before any extraction is paid for.
+    """
+    unique = []
+    invalid = []
+    seen = set()
+    for url in batch:
+        if not url or not url.strip():
+            continue
+        parsed = parse(url)
+        if parsed is None:
+            invalid.append(url)
+        elif parsed.url not in seen:
+            seen.add(parsed.url)
+            unique.append(parsed)
+    return unique, invalid
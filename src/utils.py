@@ -7,6 +7,7 @@ import urllib.request
 import zipfile
 import shutil
 from pathlib import Path
+from . import urls
 
 def check_ffmpeg() -> bool:
     """Check if FFmpeg is available."""
@@ -30,24 +31,32 @@ def get_ffmpeg_path() -> Optional[str]:
     # Then check system PATH
     if platform.system().lower() == 'windows':
         system_ffmpeg = shutil.which('ffmpeg.exe')
-        if system_ffmpeg:
-            return system_ffmpeg
-    
-    return None
+    else:
+        system_ffmpeg = shutil.which('ffmpeg')
+    return system_ffmpeg or None
+
+def get_ffprobe_path() -> Optional[str]:
+    """Get FFprobe path, looking next to FFmpeg first"""
+    ffmpeg_path = get_ffmpeg_path()
+    if ffmpeg_path:
+        ffmpeg_dir = os.path.dirname(ffmpeg_path)
+        for name in ('ffprobe.exe', 'ffprobe'):
+            candidate = os.path.join(ffmpeg_dir, name)
+            if os.path.exists(candidate):
+                return candidate
+    return shutil.which('ffprobe')
 
 def get_url_type(url: str) -> str:
-    """Determine URL type (playlist or video)."""
-    url = url.lower()
-    if "youtube.com/playlist" in url:
-        return "playlist"
-    elif "youtube.com/watch" in url or "youtu.be/" in url:
-        return "video"
-    return "invalid"
+    """Determine URL type (playlist or video) without network access."""
+    parsed = urls.parse(url)
+    if parsed is None:
+        return "invalid"
+    # Channel pages are downloaded like playlists
+    return "playlist" if parsed.is_playlist else "video"
 
 def validate_url(url: str) -> bool:
-    """Basic validation for YouTube URL."""
-    url = url.lower()
-    return "youtube.com/playlist" in url or "youtube.com/watch" in url or "youtu.be/" in url
+    """Check that url is a YouTube video, playlist or channel URL."""
+    return urls.parse(url) is not None
 
 def create_download_directory(path: str) -> None:
     """Create download directory if it doesn't exist."""
@@ -61,6 +70,15 @@ def format_size(bytes: int) -> str:
         bytes /= 1024
     return f"{bytes:.2f} GB"
 
+def format_duration(seconds: float) -> str:
+    """Convert seconds to a short "1h 02m" / "3m 20s" form."""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    return f"{minutes}m {seconds:02d}s"
+
 def clean_filename(filename: str) -> str:
     """Clean filename to remove invalid characters."""
     return "".join(char for char in filename if char.isalnum() or char in (' ', '-', '_', '.'))
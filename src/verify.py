@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+from . import config
+from . import utils
+
+# ffprobe codec names expected for each audio output format
+AUDIO_CODECS = {
+    'mp3': ('mp3',),
+    'm4a': ('aac', 'alac'),
+    'aac': ('aac',),
+    'wav': ('pcm_',)
+}
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def probe(path: str, ffprobe_path: str) -> dict:
+    result = subprocess.run(
+        [ffprobe_path, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        capture_output=True, text=True, timeout=config.VERIFY_PROBE_TIMEOUT
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ffprobe exited with {result.returncode}")
+    return json.loads(result.stdout or '{}')
+
+def _read_manifest(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+@contextmanager
+def _manifest_lock(path: str):
+    """Exclusive lock on path + '.lock', held across processes (e.g. sharded workers)."""
+    with open(path + '.lock', 'a+b') as lock_file:
+        try:
+            import fcntl
+        except ImportError:
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            return
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+class OutputVerifier:
+    """Checks finished outputs with ffprobe on a worker pool.
+
+    Each output directory gets a manifest recording size, mtime, SHA-256 and
+    the probe results of every verified file. A file whose size and mtime
+    still match its manifest entry is not probed or hashed again. Other
+    processes may verify into the same directory (sharded workers), so
+    finish() merges this run's entries into the manifest on disk under a
+    file lock instead of overwriting it.
+    """
+
+    def __init__(self, ffprobe_path: Optional[str] = None, workers: Optional[int] = None):
+        self.ffprobe_path = ffprobe_path or utils.get_ffprobe_path()
+        if not self.ffprobe_path:
+            raise RuntimeError("ffprobe not found")
+        self._executor = ThreadPoolExecutor(max_workers=workers or config.VERIFY_WORKERS)
+        self._lock = threading.Lock()
+        self._manifests = {}
+        # Names verified by this run, per directory; only these are written back
+        self._updated = {}
+        self._futures = []
+        self.results = []
+
+    def _manifest(self, directory: str) -> dict:
+        with self._lock:
+            if directory not in self._manifests:
+                path = os.path.join(directory, config.VERIFY_MANIFEST_NAME)
+                self._manifests[directory] = _read_manifest(path)
+                self._updated[directory] = set()
+            return self._manifests[directory]
+
+    def submit(self, path: str, duration: Optional[float] = None,
+               audio_only: bool = False, audio_format: Optional[str] = None):
+        """Queue path for verification against the expected duration and streams."""
+        expected = {'duration': duration, 'audio_only': audio_only, 'audio_format': audio_format}
+        future = self._executor.submit(self._verify, path, expected)
+        self._futures.append(future)
+        return future
+
+    def _verify(self, path: str, expected: dict) -> dict:
+        directory, name = os.path.split(os.path.abspath(path))
+        manifest = self._manifest(directory)
+        stat = os.stat(path)
+
+        with self._lock:
+            cached = manifest.get(name)
+        if (cached and cached.get('size') == stat.st_size
+                and cached.get('mtime_ns') == stat.st_mtime_ns
+                and cached.get('expected') == expected):
+            result = dict(cached, path=path, cached=True)
+            self.results.append(result)
+            return result
+
+        problems = []
+        streams = []
+        duration = None
+        try:
+            info = probe(path, self.ffprobe_path)
+            streams = [
+                {'type': s.get('codec_type'), 'codec': s.get('codec_name')}
+                for s in info.get('streams', [])
+            ]
+            duration = float(info.get('format', {}).get('duration') or 0) or None
+        except Exception as e:
+            problems.append(f"ffprobe failed: {str(e)}")
+
+        if not problems:
+            problems.extend(self._check(streams, duration, expected))
+
+        entry = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_checksum(path),
+            'duration': duration,
+            'streams': streams,
+            'expected': expected,
+            'ok': not problems,
+            'problems': problems
+        }
+        with self._lock:
+            manifest[name] = entry
+            self._updated[directory].add(name)
+        result = dict(entry, path=path, cached=False)
+        self.results.append(result)
+        return result
+
+    def _check(self, streams: list, duration: Optional[float], expected: dict) -> list:
+        problems = []
+        audio_codecs = [s['codec'] or '' for s in streams if s['type'] == 'audio']
+        if not audio_codecs:
+            problems.append("no audio stream")
+        if not expected['audio_only'] and not any(s['type'] == 'video' for s in streams):
+            problems.append("no video stream")
+
+        allowed = AUDIO_CODECS.get((expected.get('audio_format') or '').lower())
+        if expected['audio_only'] and allowed and audio_codecs:
+            if not any(codec.startswith(allowed) for codec in audio_codecs):
+                problems.append(f"unexpected audio codec {audio_codecs[0]}")
+
+        if expected.get('duration') and duration:
+            tolerance = max(config.VERIFY_DURATION_TOLERANCE, expected['duration'] * 0.01)
+            if abs(duration - expected['duration']) > tolerance:
+                problems.append(f"duration {duration:.1f}s, expected {expected['duration']:.1f}s")
+        elif expected.get('duration'):
+            problems.append("duration unknown")
+        return problems
+
+    def finish(self) -> list:
+        """Wait for queued checks, write the manifests and return all results."""
+        for future in self._futures:
+            try:
+                future.result()
+            except OSError as e:
+                print(f"Error verifying output: {str(e)}")
+        self._futures = []
+        self._executor.shutdown(wait=True)
+
+        with self._lock:
+            for directory, manifest in self._manifests.items():
+                if self._updated[directory]:
+                    self._write_manifest(directory, manifest, self._updated[directory])
+        return self.results
+
+    def _write_manifest(self, directory: str, manifest: dict, names: set):
+        path = os.path.join(directory, config.VERIFY_MANIFEST_NAME)
+        tmp_path = None
+        try:
+            with _manifest_lock(path):
+                # Keep what other processes wrote since this run read the manifest
+                merged = _read_manifest(path)
+                merged.update((name, manifest[name]) for name in names)
+                # Unique per writer, also across hosts sharing the directory
+                tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, path)
+                tmp_path = None
+        except OSError as e:
+            print(f"Error writing manifest {path}: {str(e)}")
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,147 @@
+import pickle
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from . import config
+from . import prefetch
+from . import utils
+from .entries import PlaylistEntry
+
+class MetadataCache:
+    """Bounded cache of playlist enumerations and info dicts, shared by warm-up and downloaders.
+
+    Info dicts are the expensive part (hundreds of KB each), so at most
+    max_infos are kept, oldest first out. Entries are handed over only once
+    (take_*), and an info dict whose signed URLs are about to expire is
+    dropped instead of returned.
+    """
+
+    def __init__(self, max_infos: Optional[int] = None):
+        self.max_infos = config.WARMUP_MAX_INFOS if max_infos is None else max_infos
+        self._lock = threading.Lock()
+        self._infos = OrderedDict()
+        self._playlists = {}
+        self.hits = 0
+
+    def put_info(self, url: str, info: dict):
+        with self._lock:
+            self._infos[url] = info
+            self._infos.move_to_end(url)
+            while len(self._infos) > self.max_infos:
+                self._infos.popitem(last=False)
+
+    def has_info(self, url: str) -> bool:
+        with self._lock:
+            return url in self._infos
+
+    def take_info(self, url: str) -> Optional[dict]:
+        with self._lock:
+            info = self._infos.pop(url, None)
+        if info is None or prefetch.is_stale(info):
+            return None
+        self.hits += 1
+        return info
+
+    def infos_by_id(self) -> dict:
+        """Cached info dicts by video id, without handing them over (e.g. for size estimates)"""
+        with self._lock:
+            return {info['id']: info for info in self._infos.values() if info.get('id')}
+
+    def put_playlist(self, url: str, title: Optional[str], playlist_entries: List[PlaylistEntry]):
+        with self._lock:
+            self._playlists = {url: (title, playlist_entries)}
+
+    def take_playlist(self, url: str):
+        """(title, fresh entries) for a cached enumeration of url, or None"""
+        with self._lock:
+            cached = self._playlists.pop(url, None)
+        if cached is None:
+            return None
+        title, playlist_entries = cached
+        self.hits += 1
+        return title, [
+            PlaylistEntry(entry.index, entry.id, entry.title, entry.duration)
+            for entry in playlist_entries
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._infos.clear()
+            self._playlists = {}
+
+    def export(self) -> dict:
+        """Move everything cached into plain data that can be sent to a worker process"""
+        with self._lock:
+            infos, self._infos = self._infos, OrderedDict()
+            playlists, self._playlists = self._playlists, {}
+        state = {'infos': [], 'playlists': playlists}
+        for url, info in infos.items():
+            # e.g. yt-dlp's __post_extractor callback
+            info = {key: value for key, value in info.items() if not callable(value)}
+            try:
+                pickle.dumps(info)
+            except Exception:
+                continue
+            state['infos'].append((url, info))
+        return state
+
+    @classmethod
+    def restore(cls, state: dict) -> 'MetadataCache':
+        cache = cls()
+        for url, info in state['infos']:
+            cache.put_info(url, info)
+        cache._playlists = dict(state['playlists'])
+        return cache
+
+class WarmUp(threading.Thread):
+    """Resolves what a download of url will need first, before Download is pressed.
+
+    A playlist is enumerated and the info dicts of its first items are
+    resolved; a single video just gets its info dict. Results go into a
+    MetadataCache that the downloader reads. stop() lets the current step
+    finish and keeps its result (the download takes over from there);
+    cancel() discards whatever is still in flight, e.g. when the URL changes.
+    """
+
+    def __init__(self, downloader, cache: MetadataCache, items: Optional[int] = None):
+        super().__init__(name='warm-up', daemon=True)
+        self.downloader = downloader
+        self.cache = cache
+        self.items = config.WARMUP_ITEMS if items is None else items
+        self._stopped = threading.Event()
+        self._cancelled = threading.Event()
+
+    def run(self):
+        try:
+            url = self.downloader.url
+            if utils.get_url_type(url) != "playlist":
+                self._resolve(self.downloader._single_video_url())
+                return
+
+            playlist_entries = self.downloader._get_playlist_entries()
+            if self._cancelled.is_set():
+                return
+            self.cache.put_playlist(url, self.downloader.playlist_title, playlist_entries)
+            for entry in playlist_entries[:self.items]:
+                if self._stopped.is_set():
+                    break
+                video_url = self.downloader._video_url(entry)
+                # Format detection usually resolved the first one already
+                if not self.cache.has_info(video_url):
+                    self._resolve(video_url)
+        except Exception as e:
+            print(f"Error warming up {self.downloader.url}: {str(e)}")
+        finally:
+            self.downloader.sessions.close()
+
+    def _resolve(self, url: str):
+        info = self.downloader._extract_video_info(url)
+        if not self._cancelled.is_set():
+            self.cache.put_info(url, info)
+
+    def stop(self):
+        self._stopped.set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._stopped.set()
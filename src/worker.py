@@ -0,0 +1,215 @@
+import multiprocessing
+import os
+import signal
+import subprocess
+import threading
+from typing import Optional
+from . import config
+
+# Messages from the worker: (kind, *args)
+PROGRESS = 'progress'   # progress, status, thumbnail, speed
+ENTRIES = 'entries'     # list of PlaylistEntry
+ITEMS = 'items'         # {index: fields}
+DONE = 'done'
+ERROR = 'error'         # message
+# Commands to the worker
+PAUSE = 'pause'
+STOP = 'stop'
+
+class _Outbox:
+    """Coalesces worker messages and sends them every WORKER_SEND_INTERVAL.
+
+    Only the latest progress value and the latest fields per playlist item
+    are kept between sends, so a burst of yt-dlp progress hooks costs the
+    GUI process one small message instead of hundreds.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._messages = []
+        self._progress = None
+        self._items = {}
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='worker-outbox', daemon=True)
+        self._thread.start()
+
+    def progress(self, progress: int, status: str, thumbnail: str, speed: float):
+        with self._lock:
+            if progress < 0:
+                # Status messages are all shown, so they are not coalesced
+                self._messages.append((PROGRESS, progress, status, thumbnail, speed))
+            else:
+                self._progress = (PROGRESS, progress, status, thumbnail, speed)
+
+    def entries(self, playlist_entries):
+        with self._lock:
+            self._messages.append((ENTRIES, list(playlist_entries)))
+            self._items = {}
+
+    def item(self, index: int, fields: dict):
+        with self._lock:
+            pending = self._items.get(index)
+            if pending is None:
+                self._items[index] = dict(fields)
+            else:
+                pending.update(fields)
+
+    def send(self, *message):
+        """Send message after everything pending (e.g. the final one)."""
+        with self._lock:
+            self._flush_locked()
+            self.conn.send(message)
+
+    def _flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        messages, self._messages = self._messages, []
+        if self._progress is not None:
+            messages.append(self._progress)
+            self._progress = None
+        if self._items:
+            messages.append((ITEMS, self._items))
+            self._items = {}
+        for message in messages:
+            self.conn.send(message)
+
+    def _run(self):
+        while not self._closed.wait(config.WORKER_SEND_INTERVAL):
+            try:
+                self._flush()
+            except (OSError, EOFError):
+                return
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+
+def _listen(conn, downloader):
+    """Apply commands from the GUI process until the pipe closes."""
+    while True:
+        try:
+            command = conn.recv()
+        except (OSError, EOFError):
+            downloader.stop()
+            return
+        if command == PAUSE:
+            downloader.toggle_pause()
+        elif command == STOP:
+            downloader.stop()
+            return
+
+def run_download(conn, url: str, options: dict, is_playlist: bool, cache_state: Optional[dict] = None):
+    """Worker process entry point: run one download and report over conn."""
+    if hasattr(os, 'setpgrp'):
+        # Own process group, so stopping the worker also takes down its ffmpeg children
+        os.setpgrp()
+    from .downloader import PlaylistDownloader, VideoDownloader
+    from .warmup import MetadataCache
+
+    outbox = _Outbox(conn)
+    try:
+        downloader_class = PlaylistDownloader if is_playlist else VideoDownloader
+        downloader = downloader_class(url, **options)
+        downloader.progress_callback = outbox.progress
+        downloader.entries_callback = outbox.entries
+        downloader.item_callback = outbox.item
+        if cache_state:
+            downloader.metadata_cache = MetadataCache.restore(cache_state)
+        threading.Thread(target=_listen, args=(conn, downloader), name='worker-commands', daemon=True).start()
+
+        if is_playlist:
+            downloader.download_playlist()
+        else:
+            downloader.download()
+        outbox.send(DONE)
+    except Exception as e:
+        outbox.send(ERROR, str(e))
+    finally:
+        outbox.close()
+        conn.close()
+
+class DownloadProcess:
+    """A download running in a child process, driven from the GUI process.
+
+    The child runs the downloader and sends coalesced progress over a pipe;
+    the GUI side only unpickles a few small messages per interval, so
+    yt-dlp's parsing and hooks never hold the GUI process's GIL. stop()
+    asks the child to cancel and kills its whole process group (its process
+    tree on Windows) if it does not exit in time, which is safe where
+    terminating a thread is not.
+    """
+
+    def __init__(self, url: str, options: dict, is_playlist: bool, cache_state: Optional[dict] = None):
+        # spawn: a forked copy of a Qt process with running threads is not safe
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=run_download, args=(child_conn, url, options, is_playlist, cache_state),
+            name='download-worker', daemon=True
+        )
+        self._child_conn = child_conn
+        self.is_paused = False
+
+    def start(self):
+        self.process.start()
+        # The child holds its own copy now; EOF on our end then means the child is gone
+        self._child_conn.close()
+
+    def messages(self, timeout: float = 0.1):
+        """Yield messages until the child finishes; yields nothing on quiet intervals."""
+        while True:
+            try:
+                if self.conn.poll(timeout):
+                    message = self.conn.recv()
+                    yield message
+                    if message[0] in (DONE, ERROR):
+                        return
+                elif not self.process.is_alive():
+                    yield (ERROR, f"Download process exited with code {self.process.exitcode}")
+                    return
+            except (OSError, EOFError):
+                self.process.join(1)
+                yield (ERROR, f"Download process exited with code {self.process.exitcode}")
+                return
+
+    def toggle_pause(self) -> bool:
+        self._command(PAUSE)
+        self.is_paused = not self.is_paused
+        return self.is_paused
+
+    def _command(self, command: str):
+        try:
+            self.conn.send(command)
+        except (OSError, EOFError):
+            pass
+
+    def stop(self, timeout: Optional[float] = None):
+        """Cancel the download; kill the worker if it has not exited after timeout seconds."""
+        self._command(STOP)
+        self.process.join(config.WORKER_STOP_TIMEOUT if timeout is None else timeout)
+        if self.process.is_alive():
+            self._kill()
+        self.conn.close()
+
+    def _kill(self):
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                self.process.kill()
+        elif os.name == 'nt':
+            # No process groups on Windows; taskkill /T walks the worker's child tree.
+            # Children already orphaned by an exited worker are not reached.
+            try:
+                subprocess.run(['taskkill', '/T', '/F', '/PID', str(self.process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+            except (OSError, subprocess.SubprocessError):
+                pass
+            if self.process.is_alive():
+                self.process.kill()
+        else:
+            self.process.kill()
+        self.process.join(5)
@@ -0,0 +1,16 @@
+import shutil
+
+import pytest
+
+from src import entries
+
+pytestmark = pytest.mark.skipif(not shutil.which('ffmpeg'), reason="ffmpeg not installed")
+
+
+def test_resident_memory_stays_flat_as_playlist_grows(tmp_path):
+    results = entries.benchmark(sizes=(100, 1500), items=5, output_root=str(tmp_path))
+
+    small, large = results[100], results[1500]
+    assert small['videos_downloaded'] == large['videos_downloaded'] == 5
+    # 15x the entries may only cost a few MB on top of the small run
+    assert large['rss_mb'] - small['rss_mb'] < 8
@@ -0,0 +1,25 @@
+from src import estimate, urls
+from src.entries import PlaylistEntry
+from src.warmup import MetadataCache
+
+def _info(video_id, video_size, audio_size):
+    return {
+        'id': video_id,
+        'duration': 60,
+        'formats': [
+            {'format_id': '137', 'vcodec': 'avc1', 'acodec': 'none', 'height': 1080, 'filesize': video_size},
+            {'format_id': '140', 'vcodec': 'none', 'acodec': 'mp4a', 'abr': 128, 'filesize': audio_size},
+        ]
+    }
+
+def test_job_estimate_uses_infos_from_metadata_cache():
+    cache = MetadataCache()
+    cache.put_info(urls.video_url('aaaaaaaaaaa'), _info('aaaaaaaaaaa', 50_000_000, 1_000_000))
+    entries = [PlaylistEntry(1, 'aaaaaaaaaaa', duration=60), PlaylistEntry(2, 'bbbbbbbbbbb', duration=60)]
+
+    job_estimate = estimate.JobEstimate(entries, False, '1080p', cache.infos_by_id())
+
+    assert job_estimate.sizes[1] == 51_000_000
+    assert job_estimate.sizes[2] == estimate.estimate_duration_bytes(60, False, '1080p')
+    # Estimating does not hand the info over; the download still gets it
+    assert cache.take_info(urls.video_url('aaaaaaaaaaa'))['id'] == 'aaaaaaaaaaa'
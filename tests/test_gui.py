@@ -0,0 +1,39 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('PyQt6.QtWidgets')
+from PyQt6.QtCore import QCoreApplication
+
+from src import gui
+
+class SlowProcess:
+    """Stands in for worker.DownloadProcess whose worker needs killing after the stop timeout."""
+
+    def __init__(self):
+        self.stopped = threading.Event()
+
+    def stop(self):
+        time.sleep(1)
+        self.stopped.set()
+
+def test_stop_returns_before_the_worker_is_gone():
+    app = QCoreApplication.instance() or QCoreApplication([])
+    thread = gui.DownloaderThread('https://youtube.com/watch?v=abcdefghijk', '.', '720p', False, None, None)
+    thread.process = SlowProcess()
+    stopped = threading.Event()
+    thread.stopped.connect(stopped.set)
+
+    started = time.time()
+    thread.stop()
+    assert time.time() - started < 0.5
+    assert not thread.is_running
+
+    # stopped is delivered through the event loop, like to the main window
+    deadline = time.time() + 5
+    while not stopped.is_set() and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert stopped.is_set()
+    assert thread.process.stopped.is_set()
@@ -0,0 +1,33 @@
+import os
+import shutil
+
+import pytest
+
+from src import entries
+from src import library
+from src.downloader import PlaylistDownloader
+
+pytestmark = pytest.mark.skipif(not shutil.which('ffmpeg'), reason="ffmpeg not installed")
+
+
+def test_link_uses_the_recorded_file_name(tmp_path):
+    first = tmp_path / "first"
+    first.mkdir()
+    # yt-dlp renders the title from the full info dict: "/" becomes "⧸" and the title may differ
+    source = first / "004_AC⧸DC - Live (Remastered).mp4"
+    source.write_bytes(b'x' * 1000)
+
+    downloader = PlaylistDownloader("https://www.youtube.com/playlist?list=PLtest", str(tmp_path / "second"), '240p')
+    os.makedirs(downloader.output_path)
+    downloader.library = library.LibraryIndex(str(tmp_path / "library.db"))
+    entry = entries.PlaylistEntry(7, 'aaaaaaaaaaa', 'AC/DC - Live')
+    downloader.library.record_all(downloader._library_key(entry), entry.id, [str(source)])
+
+    try:
+        assert downloader._link_from_library(entry)
+    finally:
+        downloader.library.close()
+
+    assert entry.status == entries.LINKED
+    assert os.listdir(downloader.output_path) == ["007_AC⧸DC - Live (Remastered).mp4"]
+    assert downloader.dedup_report.items_linked == 1
@@ -0,0 +1,45 @@
+import math
+import shutil
+
+import pytest
+import yt_dlp
+
+from src import sections
+from src.downloader import PlaylistDownloader
+
+pytestmark = pytest.mark.skipif(not shutil.which('ffmpeg'), reason="ffmpeg not installed")
+
+INFO = {'id': 'aaaaaaaaaaa', 'title': 'Video', 'ext': 'mp4', 'extractor': 'youtube', 'webpage_url': 'x'}
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    return PlaylistDownloader("https://www.youtube.com/playlist?list=PLtest", str(tmp_path), '240p')
+
+
+def test_open_ended_section_without_duration_has_no_end_label(downloader):
+    selector = sections.SectionSelector(['*1:00-inf'])
+    assert selector.sections({'duration': None}) == [{'start_time': 60, 'end_time': math.inf}]
+
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        downloader._apply_sections(ydl, ['*1:00-inf'], '/out/%(title)s.%(ext)s')
+        # yt-dlp turns an end it cannot resolve into section_end=None
+        open_ended = ydl.prepare_filename({**INFO, 'section_start': 60, 'section_end': None})
+        closed = ydl.prepare_filename({**INFO, 'section_start': 60, 'section_end': 150.0})
+
+    assert open_ended == '/out/Video [60].mp4'
+    assert closed == '/out/Video [60-150].mp4'
+
+
+def test_open_ended_section_length_is_not_checked(downloader):
+    downloader.exact_cuts = True
+    checked = []
+    downloader._finish_output = lambda filepath, expected, *args: checked.append((filepath, expected))
+
+    downloader._finish_result({'requested_downloads': [
+        {'filepath': 'open.mp4', 'section_start': 60, 'section_end': None},
+        {'filepath': 'inf.mp4', 'section_start': 60, 'section_end': math.inf},
+        {'filepath': 'closed.mp4', 'section_start': 60, 'section_end': 150.0},
+    ]}, None)
+
+    assert checked == [('open.mp4', None), ('inf.mp4', None), ('closed.mp4', 90.0)]
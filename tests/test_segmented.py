@@ -0,0 +1,89 @@
+import email.utils
+import http.server
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from src import segmented
+
+DATA = os.urandom(1024 * 1024)
+
+class FlakyRangeHandler(http.server.BaseHTTPRequestHandler):
+    """Serves DATA by ranges; the first request is cut off halfway, or refused with server.refuse."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)', self.headers['Range']).groups())
+        end = min(end, len(DATA) - 1)
+        self.server.ranges.append((start, end))
+        if self.server.refuse:
+            status, retry_after = self.server.refuse
+            self.server.refuse = None
+            self.send_response(status)
+            self.send_header('Retry-After', retry_after)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(206)
+        self.send_header('Content-Range', f"bytes {start}-{end}/{len(DATA)}")
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        if self.server.cut and end > start:
+            self.server.cut = False
+            self.wfile.write(DATA[start:start + (end - start + 1) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(DATA[start:end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FlakyRangeHandler)
+    httpd.daemon_threads = True
+    httpd.ranges = []
+    httpd.cut = False
+    httpd.refuse = None
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/media"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_failed_range_resumes_from_last_byte_written(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(segmented.config, 'SEGMENTED_READ_SIZE', 16 * 1024)
+    monkeypatch.setattr(segmented.time, 'sleep', lambda seconds: None)
+    filename = str(tmp_path / 'media.bin')
+    downloader = segmented.SegmentedDownloader(server.url, filename, connections=1,
+                                               segment_size=len(DATA))
+    downloader.probe()
+    server.ranges.clear()
+    server.cut = True
+    assert downloader.download() == len(DATA)
+
+    with open(filename, 'rb') as f:
+        assert f.read() == DATA
+    assert downloader.range_retries == 1
+    # Bytes received before the cut are neither fetched nor counted twice
+    assert server.ranges == [(0, len(DATA) - 1), (len(DATA) // 2, len(DATA) - 1)]
+    assert downloader.downloaded_bytes == len(DATA)
+
+def test_throttled_range_honours_http_date_retry_after(server, tmp_path):
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+    server.refuse = (429, retry_at)
+    downloader = segmented.SegmentedDownloader(server.url, str(tmp_path / 'media.bin'))
+    with pytest.raises(segmented.Throttled) as raised:
+        downloader._open_range(0, 99)
+    assert raised.value.status == 429
+    assert 25 < raised.value.retry_after <= 30
+
+def test_benchmark_splits_throttled_connections():
+    results = segmented.benchmark(size=2 * 1024 * 1024, rate=2 * 1024 * 1024, connections=4)
+    single, parallel = results['connections_1'], results['connections_4']
+    assert single['intact'] and parallel['intact']
+    assert parallel['seconds'] < single['seconds'] / 2
@@ -0,0 +1,50 @@
+import multiprocessing
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from src import config, downloader, fixtures, ledger, urls, utils
+
+FFMPEG = shutil.which('ffmpeg')
+PLAYLIST_URL = urls.playlist_url('PLsynthetic')
+VIDEOS = 12
+
+pytestmark = [
+    pytest.mark.skipif(not FFMPEG, reason="needs ffmpeg"),
+    # Workers inherit the patched settings below through fork
+    pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason="needs the fork start method"),
+]
+
+@pytest.fixture
+def playlist_store(tmp_path):
+    store = fixtures.FixtureStore(str(tmp_path / 'fixtures'))
+    video_path, audio_path = fixtures.make_media(FFMPEG, str(tmp_path), height=240, duration=1)
+    fixtures.synthetic_playlist(store, PLAYLIST_URL, VIDEOS, video_path, audio_path, height=240, duration=1)
+    return store
+
+def test_workers_share_a_fake_playlist(playlist_store, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'get_ffmpeg_path', lambda: FFMPEG)
+    monkeypatch.setattr(config, 'VERIFY_OUTPUTS', False)
+    monkeypatch.setattr(config, 'LIBRARY_DEDUP', False)
+    monkeypatch.setattr(config, 'LEDGER_POLL_INTERVAL', 0.2)
+    ledger_path = str(tmp_path / 'playlist.ledger')
+    output_path = str(tmp_path / 'downloads')
+
+    exit_codes = downloader.start_shard_workers(
+        PLAYLIST_URL, ledger_path, 3, output_path=output_path, resolution='240p',
+        fixtures_path=playlist_store.path
+    )
+
+    assert exit_codes == [0, 0, 0]
+    work_ledger = ledger.WorkLedger(ledger_path)
+    try:
+        assert work_ledger.counts() == {ledger.DONE: VIDEOS}
+    finally:
+        work_ledger.close()
+    with sqlite3.connect(ledger_path) as conn:
+        workers = conn.execute("SELECT COUNT(DISTINCT worker) FROM items").fetchone()[0]
+    assert workers > 1
+    outputs = sorted(name for name in os.listdir(output_path) if name.endswith('.mp4'))
+    assert outputs == [f"{index:03d}_Synthetic video {index}.mp4" for index in range(1, VIDEOS + 1)]
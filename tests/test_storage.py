@@ -0,0 +1,76 @@
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from src import storage
+
+@pytest.fixture
+def s3():
+    with storage.LocalS3Server() as server:
+        yield server
+
+def _backend(server, **kwargs):
+    return storage.S3Backend(server.url, 'library', server.access_key, server.secret_key,
+                             prefix='music', **kwargs)
+
+def _write(path, size):
+    data = os.urandom(size)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+def test_single_put_uploads_and_removes_local_file(s3, tmp_path):
+    path = str(tmp_path / 'song.m4a')
+    data = _write(path, 1000)
+    backend = _backend(s3)
+
+    backend.submit(path, 'album/song.m4a')
+
+    assert backend.finish() == ['music/album/song.m4a']
+    assert s3.objects['/library/music/album/song.m4a'] == data
+    assert not os.path.exists(path)
+
+def test_large_file_goes_up_as_multipart_upload(s3, tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    data = _write(path, 200 * 1024 + 17)
+    backend = _backend(s3, part_size=64 * 1024, part_workers=3)
+
+    backend.submit(path, 'video.mp4')
+
+    assert backend.finish() == ['music/video.mp4']
+    assert s3.objects['/library/music/video.mp4'] == data
+    parts = [query['partNumber'] for method, _, query in s3.requests if method == 'PUT' and 'partNumber' in query]
+    assert sorted(parts, key=int) == ['1', '2', '3', '4']
+    assert not s3.httpd.uploads
+
+def test_slow_down_responses_are_retried(s3, tmp_path):
+    path = str(tmp_path / 'song.m4a')
+    data = _write(path, 1000)
+    s3.fail(503, count=2)
+    backend = _backend(s3)
+
+    backend.submit(path, 'song.m4a')
+
+    assert backend.finish() == ['music/song.m4a']
+    assert s3.objects['/library/music/song.m4a'] == data
+    assert [method for method, _, _ in s3.requests] == ['PUT', 'PUT', 'PUT', 'HEAD']
+
+def test_failed_verification_keeps_local_file(s3, tmp_path):
+    path = str(tmp_path / 'video.mp4')
+    _write(path, 1000)
+    verification = Future()
+    verification.set_result({'ok': False, 'problems': ['no video stream']})
+    backend = _backend(s3)
+
+    backend.submit(path, 'video.mp4', after=verification)
+
+    assert backend.finish() == []
+    assert not s3.objects
+    assert os.path.exists(path)
+
+def test_wrong_credentials_are_rejected(s3):
+    client = storage.S3Client(s3.url, s3.access_key, 'not-the-secret')
+    with pytest.raises(storage.StorageError, match='403'):
+        client.request('PUT', '/library/song.m4a', body=b'data')
+    assert len(s3.requests) == 1
@@ -0,0 +1,27 @@
+from src import entries, subscriptions
+from src.entries import PlaylistEntry
+
+URL = 'https://youtube.com/playlist?list=PLtest'
+
+class InterruptedDownloader:
+    """Finishes the first preset entry, then fails like a cancelled or crashed run."""
+
+    def download_playlist(self):
+        self.preset_entries[0].status = entries.DONE
+        raise Exception("Playlist download failed: cancelled")
+
+def test_finished_entries_are_recorded_when_the_run_fails(tmp_path):
+    scheduler = subscriptions.SubscriptionScheduler([], state_path=str(tmp_path / 'state.sqlite'))
+    subscription = subscriptions.Subscription(URL)
+    new_entries = [PlaylistEntry(1, 'aaaaaaaaaaa'), PlaylistEntry(2, 'bbbbbbbbbbb')]
+    result = subscriptions.CheckResult('Test', new_entries, ['aaaaaaaaaaa', 'bbbbbbbbbbb'], 2, 2)
+    try:
+        scheduler._download(subscription, InterruptedDownloader(), result)
+
+        assert scheduler.store.known_ids(URL) == {'aaaaaaaaaaa'}
+        assert scheduler.store.last_index(URL) == 1
+        # The unfinished entry is picked up by the next full check
+        assert scheduler.store.snapshot(URL) is None
+        assert not subscription.running
+    finally:
+        scheduler.close()
@@ -0,0 +1,94 @@
+import http.server
+import os
+import threading
+import time
+
+import pytest
+import yt_dlp
+from yt_dlp.downloader.http import HttpFD
+
+from src import throttle
+
+PAYLOAD = os.urandom(64 * 1024)
+
+class RateLimitedHandler(http.server.BaseHTTPRequestHandler):
+    """Answers the first `server.refusals` requests with `server.status`, then serves PAYLOAD."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.refusals > 0:
+            self.server.refusals -= 1
+            self.send_response(self.server.status)
+            self.send_header('Retry-After', str(self.server.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RateLimitedHandler)
+    httpd.daemon_threads = True
+    httpd.requests = 0
+    httpd.refusals = 0
+    httpd.status = 503
+    httpd.retry_after = 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/file.bin"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_yt_dlp_retries_sleep_through_limiter(server, tmp_path):
+    server.refusals = 2
+    limiter = throttle.AdaptiveLimiter('test', 8)
+    params = {
+        'quiet': True, 'noprogress': True, 'retries': 5,
+        'retry_sleep_functions': {'http': limiter.retry_sleep}
+    }
+    target = str(tmp_path / 'file.bin')
+    with yt_dlp.YoutubeDL(params) as ydl:
+        downloader = HttpFD(ydl, ydl.params)
+        assert downloader.download(target, {'url': server.url, 'http_headers': {}})
+
+    with open(target, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert server.requests == 3
+    # Both retries were congestion signals; the cooldown merges them into one decrease
+    assert limiter.limit == 4
+
+def test_retry_sleep_backs_off_and_honours_pause():
+    limiter = throttle.AdaptiveLimiter('test', 8)
+    assert limiter.retry_sleep(n=0) == 0.25
+    assert limiter.retry_sleep(n=3) == 2.0
+    limiter.on_throttle(retry_after=10)
+    assert limiter.retry_sleep(n=0) > 9
+
+def test_rate_limited_request_pauses_limiter(server):
+    server.refusals = 1
+    server.status = 429
+    server.retry_after = 2
+    limiter = throttle.AdaptiveLimiter('test', 8)
+    with yt_dlp.YoutubeDL({'quiet': True}) as ydl:
+        with pytest.raises(yt_dlp.networking.exceptions.HTTPError):
+            with limiter.request():
+                ydl.urlopen(server.url).read()
+        assert limiter.throttled == 1
+        assert limiter.limit == 4
+        assert 1 < limiter.pause_remaining() <= 2
+
+        # New requests wait out the Retry-After pause before they are sent
+        started = time.time()
+        with limiter.request():
+            assert ydl.urlopen(server.url).read() == PAYLOAD
+        assert time.time() - started >= 1
+    assert server.requests == 2
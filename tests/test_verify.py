@@ -0,0 +1,72 @@
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from src import config, verify
+
+pytestmark = pytest.mark.skipif(os.name != 'posix', reason="uses a shell script as ffprobe")
+
+PROBE_OUTPUT = {'streams': [{'codec_type': 'audio', 'codec_name': 'aac'}], 'format': {'duration': '1.0'}}
+
+@pytest.fixture
+def ffprobe(tmp_path):
+    path = tmp_path / 'ffprobe'
+    path.write_text(f"#!/bin/sh\necho '{json.dumps(PROBE_OUTPUT)}'\n")
+    path.chmod(0o755)
+    return str(path)
+
+def _make_outputs(directory, prefix, count):
+    paths = []
+    for number in range(count):
+        path = os.path.join(directory, f"{prefix}{number}.m4a")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(1024))
+        paths.append(path)
+    return paths
+
+def _verify_shard(ffprobe, directory, prefix, count):
+    verifier = verify.OutputVerifier(ffprobe, workers=2)
+    for path in _make_outputs(directory, prefix, count):
+        verifier.submit(path, 1.0, audio_only=True, audio_format='m4a')
+    verifier.finish()
+
+def _manifest(directory):
+    with open(os.path.join(directory, config.VERIFY_MANIFEST_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+def test_finish_merges_entries_written_by_another_verifier(ffprobe, tmp_path):
+    directory = str(tmp_path / 'out')
+    os.makedirs(directory)
+    first = verify.OutputVerifier(ffprobe)
+    second = verify.OutputVerifier(ffprobe)
+    [a] = _make_outputs(directory, 'a', 1)
+    [b] = _make_outputs(directory, 'b', 1)
+
+    first.submit(a, 1.0, audio_only=True, audio_format='m4a').result()
+    second.submit(b, 1.0, audio_only=True, audio_format='m4a').result()
+    second.finish()
+    # first read the manifest before second wrote b; it must not drop b
+    first.finish()
+
+    manifest = _manifest(directory)
+    assert sorted(manifest) == ['a0.m4a', 'b0.m4a']
+    assert all(entry['ok'] for entry in manifest.values())
+
+def test_sharded_processes_share_one_manifest(ffprobe, tmp_path):
+    directory = str(tmp_path / 'out')
+    os.makedirs(directory)
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=_verify_shard, args=(ffprobe, directory, f"w{worker}-", 5))
+        for worker in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+    assert len(_manifest(directory)) == 20
+    assert not [name for name in os.listdir(directory) if name.endswith('.tmp')]